@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Database startup benchmark: time to open the store database on first run,
+on a normal restart, and with the old create-everything-every-launch path.
+"""
+
+import sys
+import os
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+from database.models import DatabaseModels
+from database.customer_search import CustomerSearchIndex
+
+def legacy_startup(db_path):
+    """Open the database the way every launch did before the schema version check"""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    DatabaseModels.create_tables(conn)
+    DatabaseModels.create_indexes(conn)
+    DatabaseModels.create_default_data(conn)
+    conn.commit()
+    CustomerSearchIndex.index_missing_customers(conn)
+    conn.close()
+    return (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Database open time at app startup")
+    parser.add_argument("--runs", type=int, default=20, help="restarts to time")
+    parser.add_argument("--customers", type=int, default=10000, help="customers in the store database")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print(f"DATABASE STARTUP (ms, {args.customers} customers)")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, "bench_startup.db")
+        
+        first_run = DatabaseManager(db_path)
+        print(f"{'first run':<20} {first_run.startup_timings['total']:>10.2f}")
+        
+        conn = first_run.get_connection()
+        for number in range(args.customers):
+            cursor = conn.execute('INSERT INTO customers (name, phone) VALUES (?, ?)',
+                                  (f"Customer {number}", f"555{number:07d}"))
+            CustomerSearchIndex.index_customer(cursor, cursor.lastrowid, f"Customer {number}", f"555{number:07d}")
+        conn.commit()
+        conn.close()
+        
+        restarts = [DatabaseManager(db_path).startup_timings['total'] for _ in range(args.runs)]
+        print(f"{'restart':<20} {statistics.median(restarts):>10.2f}")
+        
+        legacy = [legacy_startup(db_path) for _ in range(args.runs)]
+        print(f"{'restart (legacy)':<20} {statistics.median(legacy):>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Sale write throughput benchmark: one commit per sale vs group commit.
+Runs concurrent checkout producers against a scratch database and reports sales/sec.
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+import threading
+import time
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+from database.group_commit import GroupCommitWriter
+
+CART_ITEMS = [
+    {'product_id': 1, 'quantity': 2, 'unit_price': 2.50},
+    {'product_id': 3, 'quantity': 1, 'unit_price': 4.50}
+]
+TOTAL_AMOUNT = 9.50
+
+def run_producers(create_sale, producers, sales_per_producer):
+    """Run concurrent producers and return (sales/sec, failed sales)"""
+    failures = []
+    start_barrier = threading.Barrier(producers + 1)
+    
+    def producer():
+        start_barrier.wait()
+        for _ in range(sales_per_producer):
+            try:
+                create_sale(1, 1, TOTAL_AMOUNT, 'cash', CART_ITEMS)
+            except Exception as e:
+                failures.append(e)
+    
+    threads = [threading.Thread(target=producer) for _ in range(producers)]
+    for thread in threads:
+        thread.start()
+    
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    completed = producers * sales_per_producer - len(failures)
+    return completed / elapsed, len(failures)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sale write throughput at 1, 4 and 16 producers")
+    parser.add_argument("--sales", type=int, default=200, help="sales per producer")
+    parser.add_argument("--producers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--dir", default=None, help="directory for the scratch database (use a real disk to measure fsync)")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("SALE WRITE THROUGHPUT (sales/sec)")
+    print("=" * 60)
+    print(f"{'producers':>10} {'per-sale commit':>18} {'group commit':>15} {'speedup':>9}")
+    
+    with tempfile.TemporaryDirectory(dir=args.dir) as scratch:
+        for producers in args.producers:
+            db_manager = DatabaseManager(os.path.join(scratch, f"bench_{producers}.db"))
+            
+            direct_rate, direct_failed = run_producers(db_manager.create_sale, producers, args.sales)
+            
+            writer = GroupCommitWriter(db_manager)
+            group_rate, group_failed = run_producers(writer.create_sale, producers, args.sales)
+            writer.stop()
+            
+            line = f"{producers:>10} {direct_rate:>18.0f} {group_rate:>15.0f} {group_rate / direct_rate:>8.1f}x"
+            if direct_failed or group_failed:
+                line += f"  (failed: {direct_failed} per-sale, {group_failed} group)"
+            print(line)
+
+if __name__ == "__main__":
+    main()
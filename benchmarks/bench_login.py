@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Login benchmark: time of a password login with each hashing profile, of
+the first PIN switch of a session and of later (cached) PIN switches,
+next to the old unsalted SHA-256 login.
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+import statistics
+import tempfile
+import time
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+from database.auth import KDF_PROFILES, PasswordHasher
+
+class LegacyHasher(PasswordHasher):
+    """Leaves unsalted hashes in place, to time the old login"""
+    
+    def needs_rehash(self, stored):
+        return False
+
+def timed(function, runs):
+    """Median and max time of calls to function, in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Login and cashier switch latency")
+    parser.add_argument("--runs", type=int, default=20, help="logins to time per case")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as scratch:
+        db_manager = DatabaseManager(os.path.join(scratch, "bench_login.db"))
+        cashier = db_manager.authenticate_user("cashier", "cashier123")
+        print(f"Device profile: {db_manager.passwords.iterations} iterations "
+              f"(target {db_manager.passwords.target_ms} ms)")
+        
+        print("=" * 60)
+        print("LOGIN LATENCY (ms)")
+        print("=" * 60)
+        print(f"{'case':<34} {'median':>10} {'max':>10}")
+        
+        def set_password_hash(password_hash):
+            conn = db_manager.get_connection()
+            conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, cashier['id']))
+            conn.commit()
+            conn.close()
+        
+        db_manager.passwords = LegacyHasher()
+        set_password_hash(hashlib.sha256("cashier123".encode()).hexdigest())
+        median, worst = timed(lambda: db_manager.authenticate_user("cashier", "cashier123"), args.runs)
+        print(f"{'password (unsalted sha256)':<34} {median:>10.2f} {worst:>10.2f}")
+        
+        for name, iterations in KDF_PROFILES.items():
+            db_manager.passwords = PasswordHasher(iterations=iterations)
+            set_password_hash(db_manager.passwords.hash("cashier123"))
+            median, worst = timed(lambda: db_manager.authenticate_user("cashier", "cashier123"), args.runs)
+            print(f"{'password (' + name + ')':<34} {median:>10.2f} {worst:>10.2f}")
+        
+        db_manager.set_user_pin(cashier['id'], "2468")
+        
+        def first_switch():
+            db_manager.authenticate_user("cashier", "cashier123")
+            started = time.perf_counter()
+            db_manager.switch_user("cashier", "2468")
+            return (time.perf_counter() - started) * 1000
+        
+        first = [first_switch() for _ in range(args.runs)]
+        print(f"{'PIN switch (first of session)':<34} {statistics.median(first):>10.2f} {max(first):>10.2f}")
+        
+        median, worst = timed(lambda: db_manager.switch_user("cashier", "2468"), args.runs * 50)
+        print(f"{'PIN switch (cached)':<34} {median:>10.3f} {worst:>10.3f}")
+
+if __name__ == "__main__":
+    main()
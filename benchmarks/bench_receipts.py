@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Receipt rendering benchmark: batch-render a day's receipts from the database.
+Reports receipts/sec for text, ESC/POS and (when reportlab is installed) PDF.
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+from utils.receipt_renderer import ReceiptRenderer
+
+def create_day_of_sales(db_manager, count):
+    """Create a day's worth of sales with a few items each"""
+    sales = [
+        {
+            'sale_number': f"BENCH{number:06d}",
+            'user_id': 1,
+            'customer_id': 1,
+            'total_amount': 14.50,
+            'payment_method': ('cash', 'eftpos')[number % 2],
+            'items': [
+                {'product_id': 1, 'quantity': 2, 'unit_price': 2.50},
+                {'product_id': 2, 'quantity': 1, 'unit_price': 3.00},
+                {'product_id': 5, 'quantity': 1, 'unit_price': 6.50}
+            ]
+        }
+        for number in range(count)
+    ]
+    db_manager.create_sales(sales)
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch receipt rendering throughput")
+    parser.add_argument("--sales", type=int, default=1000, help="sales in the day")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("RECEIPT RENDERING THROUGHPUT (receipts/sec)")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as scratch:
+        db_manager = DatabaseManager(os.path.join(scratch, "bench_receipts.db"))
+        create_day_of_sales(db_manager, args.sales)
+        renderer = ReceiptRenderer(db_manager)
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        
+        started = time.perf_counter()
+        records = renderer.get_records_for_day(today)
+        elapsed = time.perf_counter() - started
+        print(f"{'load from database':<20} {len(records) / elapsed:>10.0f}")
+        
+        formats = [("text", renderer.render_text), ("escpos", renderer.render_escpos)]
+        try:
+            import reportlab
+            formats.append(("pdf", renderer.render_pdf))
+        except ImportError:
+            print(f"{'pdf':<20} {'skipped (reportlab not installed)':>10}")
+        
+        for name, render in formats:
+            started = time.perf_counter()
+            for record in records:
+                render(record)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<20} {len(records) / elapsed:>10.0f}")
+        
+        # Reprints go through get_sale_details one sale at a time
+        sale_ids = [sale[0] for sale in db_manager.get_sales_report(today, today)][:200]
+        started = time.perf_counter()
+        for sale_id in sale_ids:
+            renderer.render_sale(sale_id)
+        elapsed = time.perf_counter() - started
+        print(f"{'reprint (text)':<20} {len(sale_ids) / elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
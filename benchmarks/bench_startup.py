@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: time from launching the app process to the login screen
+being drawn, with screens built on demand (lazy) and all built up front (eager).
+Needs Kivy, KivyMD and a display.
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+
+# Add the project root to Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+def show_login_screen(eager):
+    """Run the app until the login screen has been drawn once, then print the time"""
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+    
+    from kivy.clock import Clock
+    from main import SCREENS, StorePOSApp
+    
+    class StartupApp(StorePOSApp):
+        def build(self):
+            root = super().build()
+            if eager:
+                for name in SCREENS:
+                    self.get_screen(name)
+            return root
+        
+        def on_start(self):
+            # Scheduled callbacks run after the first frame has been drawn
+            Clock.schedule_once(self.report, 0)
+        
+        def report(self, dt):
+            print(f"LOGIN_SCREEN_SHOWN {time.time():.6f}", flush=True)
+            self.stop()
+    
+    StartupApp().run()
+
+def time_to_login_screen(eager, work_dir):
+    """Launch the app in a fresh process and return the seconds until the login screen showed"""
+    command = [sys.executable, os.path.abspath(__file__), "--child"]
+    if eager:
+        command.append("--eager")
+    
+    started = time.time()
+    result = subprocess.run(command, cwd=work_dir, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("LOGIN_SCREEN_SHOWN "):
+            return float(line.split()[1]) - started
+    
+    error = result.stderr.strip().splitlines()
+    raise RuntimeError(f"The app exited without showing the login screen: {error[-1] if error else 'no output'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to login screen")
+    parser.add_argument("--runs", type=int, default=5, help="app launches per mode")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        show_login_screen(args.eager)
+        return
+    
+    print("=" * 60)
+    print("TIME TO LOGIN SCREEN (ms)")
+    print("=" * 60)
+    print(f"{'screens':<10} {'min':>10} {'median':>10} {'max':>10}")
+    
+    for name, eager in (("lazy", False), ("eager", True)):
+        timings = []
+        for _ in range(args.runs):
+            # Every launch starts from an empty store, like a first run
+            with tempfile.TemporaryDirectory() as work_dir:
+                timings.append(time_to_login_screen(eager, work_dir) * 1000)
+        
+        print(f"{name:<10} {min(timings):>10.0f} {statistics.median(timings):>10.0f} {max(timings):>10.0f}")
+
+if __name__ == "__main__":
+    main()
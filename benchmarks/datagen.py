@@ -0,0 +1,208 @@
+"""
+Synthetic store data for benchmarks: a product catalog, customers with
+search entries, years of sales and dinau (loan) ledgers with repayments.
+The same scale and seed always produce the same store.
+"""
+
+import sys
+import os
+import random
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+from database.customer_search import CustomerSearchIndex
+
+StoreScale = namedtuple("StoreScale", ["products", "customers", "days", "sales_per_day", "dinau_share"])
+StoreData = namedtuple("StoreData", ["db_path", "scale", "seed", "barcodes", "product_names",
+                                     "customer_ids", "customer_names", "sale_count", "first_day", "last_day"])
+
+SCALES = {
+    "small": StoreScale(products=500, customers=1000, days=90, sales_per_day=40, dinau_share=0.15),
+    "medium": StoreScale(products=5000, customers=20000, days=730, sales_per_day=80, dinau_share=0.15),
+    "large": StoreScale(products=20000, customers=100000, days=1095, sales_per_day=200, dinau_share=0.15),
+}
+
+# Generated history ends on a fixed day so reruns produce identical databases
+LAST_DAY = date(2025, 6, 30)
+
+CATEGORIES = ["Groceries", "Beverages", "Snacks", "Household", "Personal Care", "Frozen", "Bakery"]
+BRANDS = ["Island", "Pacific", "Golden", "Harbour", "Sunrise", "Coral", "Highland", "Lagoon"]
+GOODS = ["Rice", "Flour", "Sugar", "Tinned Fish", "Corned Beef", "Noodles", "Biscuits", "Cola",
+         "Orange Juice", "Coffee", "Tea", "Soap", "Washing Powder", "Kerosene", "Butter", "Bread",
+         "Chicken Wings", "Mackerel", "Cooking Oil", "Salt", "Matches", "Batteries", "Candles"]
+SIZES = ["100g", "250g", "500g", "1kg", "2kg", "5kg", "330ml", "1L", "2L", "6 pack", "12 pack"]
+FIRST_NAMES = ["Mary", "John", "Grace", "Peter", "Ruth", "James", "Anna", "Joseph", "Esther", "David",
+               "Lina", "Tomasi", "Seini", "Kapi", "Mele", "Sione", "Hana", "Wari", "Kila", "Naomi"]
+LAST_NAMES = ["Smith", "Kaupa", "Tapa", "Lee", "Wong", "Morea", "Namaliu", "Kila", "Siaosi", "Brown",
+              "Taufa", "Oala", "Vele", "Kuman", "Peni", "Hau", "Aisi", "Baru", "Toua", "Mano"]
+
+SALE_BATCH_SIZE = 500
+
+def generate_store(db_path, scale="small", seed=42):
+    """Create a store database filled with generated data and return what benchmarks need to query it"""
+    if isinstance(scale, str):
+        scale = SCALES[scale]
+    rng = random.Random(seed)
+    db_manager = DatabaseManager(db_path)
+    
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN')
+    
+    # Most products have plenty of stock so sales never run out; a few are
+    # kept low and out of the generated sales for the low stock report
+    products = []
+    for number in range(scale.products):
+        barcode = f"93{number:011d}"
+        name = f"{rng.choice(BRANDS)} {rng.choice(GOODS)} {rng.choice(SIZES)} #{number}"
+        cost_price = round(rng.uniform(0.5, 40.0), 2)
+        price = round(cost_price * rng.uniform(1.1, 1.6), 2)
+        low_stock = rng.random() < 0.05
+        stock = rng.randint(0, 4) if low_stock else 1000000
+        products.append((barcode, name, "", rng.choice(CATEGORIES), price, cost_price, stock, 5))
+    
+    cursor.executemany('''
+        INSERT INTO products (barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', products)
+    
+    customer_ids = []
+    customer_names = []
+    for number in range(scale.customers):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {number}"
+        phone = f"7{rng.randint(0, 9999999):07d}"
+        cursor.execute('INSERT INTO customers (name, phone) VALUES (?, ?)', (name, phone))
+        CustomerSearchIndex.index_customer(cursor, cursor.lastrowid, name, phone)
+        customer_ids.append(cursor.lastrowid)
+        customer_names.append(name)
+    
+    conn.commit()
+    
+    cursor.execute('''
+        SELECT id, price FROM products
+        WHERE barcode LIKE '93%' AND stock_quantity >= 1000000
+        ORDER BY id
+    ''')
+    saleable = cursor.fetchall()
+    conn.close()
+    
+    # A regular walk-in trade plus a smaller group of dinau customers
+    dinau_customers = customer_ids[:max(1, len(customer_ids) // 10)]
+    balances = {}
+    payments = []
+    sales = []
+    first_day = LAST_DAY - timedelta(days=scale.days - 1)
+    
+    for offset in range(scale.days):
+        day = first_day + timedelta(days=offset)
+        count = max(1, int(scale.sales_per_day * rng.uniform(0.7, 1.3)))
+        opening = datetime(day.year, day.month, day.day, 7, 0, 0)
+        
+        for number, second in enumerate(sorted(rng.randint(0, 13 * 3600) for _ in range(count))):
+            items = []
+            for product_id, price in rng.sample(saleable, min(len(saleable), rng.randint(1, 6))):
+                items.append({'product_id': product_id, 'quantity': rng.randint(1, 3), 'unit_price': price})
+            total = round(sum(item['quantity'] * item['unit_price'] for item in items), 2)
+            
+            if rng.random() < scale.dinau_share:
+                customer_id = rng.choice(dinau_customers)
+                payment_method = 'dinau'
+                balances[customer_id] = balances.get(customer_id, 0) + total
+            else:
+                customer_id = rng.choice(customer_ids) if rng.random() < 0.3 else 1
+                payment_method = rng.choice(['cash', 'cash', 'eftpos'])
+            
+            sales.append({
+                'sale_number': f"GEN{day:%Y%m%d}{number:05d}",
+                'user_id': 2,
+                'customer_id': customer_id,
+                'total_amount': total,
+                'payment_method': payment_method,
+                'items': items,
+                'created_at': (opening + timedelta(seconds=second)).strftime('%Y-%m-%d %H:%M:%S')
+            })
+        
+        # Dinau customers pay back part of what they owe now and then
+        for customer_id in dinau_customers:
+            owed = balances.get(customer_id, 0)
+            if owed > 0 and rng.random() < 0.1:
+                amount = round(min(owed, owed * rng.uniform(0.3, 1.0) + 5), 2)
+                balances[customer_id] = owed - amount
+                payments.append((customer_id, 'payment', amount, "Dinau payment", 2,
+                                 f"{day.isoformat()} 20:30:00"))
+        
+        if len(sales) >= SALE_BATCH_SIZE:
+            _insert_sales(db_manager, sales)
+            sales = []
+    
+    if sales:
+        _insert_sales(db_manager, sales)
+    
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO dinau_transactions (customer_id, transaction_type, amount, description, user_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', payments)
+    
+    # Paid off customers have their dinau sales settled, as process_dinau_payment does
+    settled = [(customer_id,) for customer_id, owed in balances.items() if owed <= 0.005]
+    cursor.executemany('''
+        UPDATE sales SET is_dinau_settled = 1
+        WHERE customer_id = ? AND payment_method = 'dinau'
+    ''', settled)
+    conn.commit()
+    cursor.execute('SELECT COUNT(*) FROM sales')
+    sale_count = cursor.fetchone()[0]
+    conn.close()
+    
+    return StoreData(
+        db_path=db_path,
+        scale=scale,
+        seed=seed,
+        barcodes=[product[0] for product in products],
+        product_names=[product[1] for product in products],
+        customer_ids=customer_ids,
+        customer_names=customer_names,
+        sale_count=sale_count,
+        first_day=first_day,
+        last_day=LAST_DAY
+    )
+
+def load_store(db_path, scale="small", seed=42):
+    """Describe a store generated earlier with the same scale and seed, without changing it"""
+    if isinstance(scale, str):
+        scale = SCALES[scale]
+    
+    conn = DatabaseManager(db_path).get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT barcode, name FROM products WHERE barcode LIKE '93%' ORDER BY id")
+    products = cursor.fetchall()
+    cursor.execute('SELECT id, name FROM customers WHERE id > 1 ORDER BY id')
+    customers = cursor.fetchall()
+    cursor.execute('SELECT COUNT(*) FROM sales')
+    sale_count = cursor.fetchone()[0]
+    conn.close()
+    
+    return StoreData(
+        db_path=db_path,
+        scale=scale,
+        seed=seed,
+        barcodes=[row[0] for row in products],
+        product_names=[row[1] for row in products],
+        customer_ids=[row[0] for row in customers],
+        customer_names=[row[1] for row in customers],
+        sale_count=sale_count,
+        first_day=LAST_DAY - timedelta(days=scale.days - 1),
+        last_day=LAST_DAY
+    )
+
+def _insert_sales(db_manager, sales):
+    """Insert a batch of generated sales, failing loudly if any was rejected"""
+    for result in db_manager.create_sales(sales):
+        if isinstance(result, Exception):
+            raise result
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Multi-till stress test: several till processes selling from one shared
+database with limited stock. Checks that no product is oversold and that
+every sale is accounted for, and reports checkout throughput per interval.
+Exits with status 1 if stock was oversold or lost.
+"""
+
+import sys
+import os
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+from database.concurrency import InsufficientStockError, is_busy
+
+def run_till(till_id, db_path, product_ids, seconds, interval, start, results):
+    """Till process: sell random carts until time is up, then report what happened"""
+    db_manager = DatabaseManager(db_path, till_id=till_id)
+    rng = random.Random(till_id)
+    buckets = [0] * (int(seconds / interval) + 1)
+    counts = {'sales': 0, 'shortages': 0, 'busy': 0, 'errors': 0}
+    
+    start.wait()
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        cart_items = [
+            {'product_id': product_id, 'quantity': rng.randint(1, 3), 'unit_price': 1.0}
+            for product_id in rng.sample(product_ids, rng.randint(1, 3))
+        ]
+        total_amount = sum(item['quantity'] * item['unit_price'] for item in cart_items)
+        
+        try:
+            db_manager.create_sale(1, 1, total_amount, 'cash', cart_items)
+            counts['sales'] += 1
+        except InsufficientStockError:
+            counts['shortages'] += 1
+        except sqlite3.OperationalError as e:
+            counts['busy' if is_busy(e) else 'errors'] += 1
+        except Exception:
+            counts['errors'] += 1
+        
+        buckets[min(int((time.perf_counter() - started) / interval), len(buckets) - 1)] += 1
+    
+    results.put((till_id, counts, buckets))
+
+def stock_levels(db_manager, product_ids):
+    """Current stock of each product"""
+    return {product[0]: product[7] for product in db_manager.get_products_by_ids(product_ids)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent tills selling from limited stock")
+    parser.add_argument("--tills", type=int, default=4, help="till processes")
+    parser.add_argument("--seconds", type=float, default=10, help="how long the tills sell")
+    parser.add_argument("--interval", type=float, default=1.0, help="throughput interval in seconds")
+    parser.add_argument("--products", type=int, default=10, help="products on sale")
+    parser.add_argument("--stock", type=int, default=2000, help="starting stock of each product")
+    parser.add_argument("--dir", default=None, help="directory for the scratch database (use a real disk to measure fsync)")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(dir=args.dir) as scratch:
+        db_path = os.path.join(scratch, "stress_tills.db")
+        db_manager = DatabaseManager(db_path)
+        product_ids = [
+            db_manager.add_product(f"98{n:011d}", f"Stress Product {n}", None, "Stress", 1.0, 0.5, args.stock)
+            for n in range(args.products)
+        ]
+        initial = stock_levels(db_manager, product_ids)
+        
+        results = multiprocessing.Queue()
+        start = multiprocessing.Event()
+        tills = [
+            multiprocessing.Process(target=run_till, args=(
+                till_id, db_path, product_ids, args.seconds, args.interval, start, results
+            ))
+            for till_id in range(1, args.tills + 1)
+        ]
+        for till in tills:
+            till.start()
+        start.set()
+        
+        reports = [results.get() for _ in tills]
+        for till in tills:
+            till.join()
+        
+        totals = {'sales': 0, 'shortages': 0, 'busy': 0, 'errors': 0}
+        checkouts = [0] * len(reports[0][2])
+        for till_id, counts, buckets in sorted(reports):
+            for key in totals:
+                totals[key] += counts[key]
+            checkouts = [a + b for a, b in zip(checkouts, buckets)]
+        # The last bucket only holds the checkouts finishing after the deadline
+        checkouts = checkouts[:-1] or checkouts
+        
+        final = stock_levels(db_manager, product_ids)
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM sales WHERE user_id = 1 AND customer_id = 1')
+        saved_sales = cursor.fetchone()[0]
+        cursor.execute('SELECT product_id, SUM(quantity) FROM sale_items GROUP BY product_id')
+        sold = dict(cursor.fetchall())
+        conn.close()
+    
+    print("=" * 60)
+    print(f"MULTI-TILL STRESS ({args.tills} tills, {args.seconds:g}s, "
+          f"{args.products} products x {args.stock} stock)")
+    print("=" * 60)
+    print(f"sales: {totals['sales']}  refused (no stock): {totals['shortages']}  "
+          f"busy: {totals['busy']}  errors: {totals['errors']}")
+    
+    rates = [count / args.interval for count in checkouts]
+    print(f"checkouts/sec per {args.interval:g}s interval: " + " ".join(f"{rate:.0f}" for rate in rates))
+    if len(rates) > 1 and statistics.mean(rates):
+        print(f"min {min(rates):.0f}  median {statistics.median(rates):.0f}  max {max(rates):.0f}  "
+              f"variation {statistics.pstdev(rates) / statistics.mean(rates):.0%}")
+    
+    problems = []
+    negative = [product_id for product_id, stock in final.items() if stock < 0]
+    if negative:
+        problems.append(f"negative stock for products {negative}")
+    mismatched = [product_id for product_id in product_ids
+                  if initial[product_id] - final[product_id] != sold.get(product_id, 0)]
+    if mismatched:
+        problems.append(f"stock does not match sales for products {mismatched}")
+    if saved_sales != totals['sales']:
+        problems.append(f"{totals['sales']} sales completed but {saved_sales} saved")
+    
+    if problems:
+        for problem in problems:
+            print(f"FAILED: {problem}")
+        sys.exit(1)
+    print(f"OK: no oversell, {sum(sold.values())} items sold, {sum(final.values())} left")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: latency of the DatabaseManager methods behind checkout,
+search, reports and dinau balances on a generated store. Results are
+written as JSON (p50/p95/p99 per benchmark) and can be compared with the
+results of an earlier commit to catch regressions.
+    
+    python benchmarks/suite.py --scale medium --output before.json
+    python benchmarks/suite.py --scale medium --compare before.json
+
+Latencies vary between machines and with load, so only compare results
+from the same machine, run while it is otherwise idle.
+"""
+
+import sys
+import os
+import argparse
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Add the project root to Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from database.database_manager import DatabaseManager
+from benchmarks.datagen import SCALES, generate_store, load_store
+
+Benchmark = namedtuple("Benchmark", ["name", "run", "iterations"])
+
+BENCHMARKS = []
+
+def benchmark(name, iterations=200):
+    """Register a function run(db_manager, data, rng) as one timed call of a benchmark"""
+    def register(run):
+        BENCHMARKS.append(Benchmark(name, run, iterations))
+        return run
+    return register
+
+def random_cart(db_manager, data, rng, lines=3):
+    """Look up a few products by barcode the way the cashier screen builds a cart"""
+    cart = []
+    for barcode in rng.sample(data.barcodes, lines * 2):
+        product = db_manager.get_product_by_barcode(barcode)
+        # The few low stock products run out, and a sale cannot oversell
+        if product[7] < 1:
+            continue
+        cart.append({'product_id': product[0], 'quantity': 1, 'unit_price': product[5]})
+        if len(cart) == lines:
+            break
+    return cart
+
+def random_day(data, rng):
+    """A day within the generated sales history"""
+    return (data.first_day + timedelta(days=rng.randrange((data.last_day - data.first_day).days + 1))).isoformat()
+
+# Checkout
+
+@benchmark("authenticate_user", iterations=10)
+def bench_authenticate_user(db_manager, data, rng):
+    db_manager.authenticate_user("cashier", "cashier123")
+
+@benchmark("get_product_by_barcode", iterations=1000)
+def bench_get_product_by_barcode(db_manager, data, rng):
+    db_manager.get_product_by_barcode(rng.choice(data.barcodes))
+
+@benchmark("create_sale")
+def bench_create_sale(db_manager, data, rng):
+    cart = random_cart(db_manager, data, rng)
+    total = sum(item['unit_price'] for item in cart)
+    db_manager.create_sale(2, 1, total, 'cash', cart)
+
+@benchmark("create_sale_dinau")
+def bench_create_sale_dinau(db_manager, data, rng):
+    cart = random_cart(db_manager, data, rng)
+    total = sum(item['unit_price'] for item in cart)
+    db_manager.create_sale(2, rng.choice(data.customer_ids), total, 'dinau', cart)
+
+@benchmark("create_sales_batch_20", iterations=50)
+def bench_create_sales(db_manager, data, rng):
+    sales = []
+    for _ in range(20):
+        cart = random_cart(db_manager, data, rng)
+        sales.append({
+            'sale_number': db_manager.generate_sale_number() + f"-{rng.randrange(10 ** 9):09d}",
+            'user_id': 2,
+            'customer_id': 1,
+            'total_amount': sum(item['unit_price'] for item in cart),
+            'payment_method': 'cash',
+            'items': cart
+        })
+    db_manager.create_sales(sales)
+
+# Search
+
+@benchmark("search_products")
+def bench_search_products(db_manager, data, rng):
+    db_manager.search_products(rng.choice(data.product_names).split()[1])
+
+@benchmark("search_customers")
+def bench_search_customers(db_manager, data, rng):
+    db_manager.search_customers(rng.choice(data.customer_names).split()[0][:3])
+
+@benchmark("search_customers_by_phone")
+def bench_search_customers_by_phone(db_manager, data, rng):
+    db_manager.search_customers(f"7{rng.randrange(1000):03d}")
+
+@benchmark("get_customer_by_id", iterations=1000)
+def bench_get_customer_by_id(db_manager, data, rng):
+    db_manager.get_customer_by_id(rng.choice(data.customer_ids))
+
+# Inventory
+
+@benchmark("get_all_products", iterations=50)
+def bench_get_all_products(db_manager, data, rng):
+    db_manager.get_all_products()
+
+@benchmark("get_low_stock_products", iterations=50)
+def bench_get_low_stock_products(db_manager, data, rng):
+    db_manager.get_low_stock_products()
+
+@benchmark("get_all_customers", iterations=50)
+def bench_get_all_customers(db_manager, data, rng):
+    db_manager.get_all_customers()
+
+@benchmark("update_product_stock")
+def bench_update_product_stock(db_manager, data, rng):
+    product = db_manager.get_product_by_barcode(rng.choice(data.barcodes))
+    db_manager.update_product_stock(product[0], product[7] + 1, 1, "Benchmark")
+
+@benchmark("update_customer")
+def bench_update_customer(db_manager, data, rng):
+    index = rng.randrange(len(data.customer_ids))
+    db_manager.update_customer(data.customer_ids[index], data.customer_names[index], f"7{rng.randrange(10 ** 7):07d}")
+
+# Customer history
+
+@benchmark("get_customer_purchase_history")
+def bench_get_customer_purchase_history(db_manager, data, rng):
+    db_manager.get_customer_purchase_history(rng.choice(data.customer_ids))
+
+@benchmark("get_customer_purchase_summary")
+def bench_get_customer_purchase_summary(db_manager, data, rng):
+    db_manager.get_customer_purchase_summary(rng.choice(data.customer_ids))
+
+@benchmark("get_customer_top_products")
+def bench_get_customer_top_products(db_manager, data, rng):
+    db_manager.get_customer_top_products(rng.choice(data.customer_ids))
+
+# Dinau balances
+
+@benchmark("get_customer_dinau_balance", iterations=1000)
+def bench_get_customer_dinau_balance(db_manager, data, rng):
+    db_manager.get_customer_dinau_balance(rng.choice(data.customer_ids))
+
+@benchmark("get_customer_dinau_balances_50")
+def bench_get_customer_dinau_balances(db_manager, data, rng):
+    db_manager.get_customer_dinau_balances(rng.sample(data.customer_ids, min(50, len(data.customer_ids))))
+
+@benchmark("get_customer_dinau_history")
+def bench_get_customer_dinau_history(db_manager, data, rng):
+    db_manager.get_customer_dinau_history(rng.choice(data.customer_ids))
+
+@benchmark("get_all_dinau_customers", iterations=50)
+def bench_get_all_dinau_customers(db_manager, data, rng):
+    db_manager.get_all_dinau_customers()
+
+@benchmark("get_unsettled_dinau_sales", iterations=50)
+def bench_get_unsettled_dinau_sales(db_manager, data, rng):
+    db_manager.get_unsettled_dinau_sales()
+
+@benchmark("process_dinau_payment")
+def bench_process_dinau_payment(db_manager, data, rng):
+    db_manager.process_dinau_payment(rng.choice(data.customer_ids), 1.0, 1, "Benchmark")
+
+# Reports
+
+@benchmark("get_sales_report_day")
+def bench_get_sales_report_day(db_manager, data, rng):
+    day = random_day(data, rng)
+    db_manager.get_sales_report(day, day)
+
+@benchmark("get_sales_report_month", iterations=50)
+def bench_get_sales_report_month(db_manager, data, rng):
+    end = random_day(data, rng)
+    start = (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=29)).date().isoformat()
+    db_manager.get_sales_report(start, end)
+
+@benchmark("get_sale_details")
+def bench_get_sale_details(db_manager, data, rng):
+    db_manager.get_sale_details(rng.randint(1, data.sale_count))
+
+@benchmark("get_sale_items_for_sales_day")
+def bench_get_sale_items_for_sales(db_manager, data, rng):
+    day = random_day(data, rng)
+    db_manager.get_sale_items_for_sales([sale[0] for sale in db_manager.get_sales_report(day, day)])
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def time_benchmark(bench, db_manager, data, seed, iterations=None, rounds=3):
+    """Run one benchmark and return its latency statistics in milliseconds
+    
+    The calls are timed in several rounds and the round with the lowest
+    median is kept, which filters out rounds slowed down by other work on
+    the machine.
+    """
+    # Every benchmark draws its own inputs, so selecting a subset with --only
+    # does not change what the others measure
+    rng = random.Random(f"{seed}-{bench.name}")
+    iterations = iterations or bench.iterations
+    
+    for _ in range(max(1, iterations // 10)):
+        bench.run(db_manager, data, rng)
+    
+    best = None
+    for _ in range(rounds):
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter_ns()
+            bench.run(db_manager, data, rng)
+            latencies.append((time.perf_counter_ns() - started) / 1e6)
+        
+        latencies.sort()
+        if best is None or percentile(latencies, 0.50) < percentile(best, 0.50):
+            best = latencies
+    
+    return {
+        "iterations": iterations,
+        "rounds": rounds,
+        "p50_ms": round(percentile(best, 0.50), 4),
+        "p95_ms": round(percentile(best, 0.95), 4),
+        "p99_ms": round(percentile(best, 0.99), 4),
+        "mean_ms": round(statistics.fmean(best), 4)
+    }
+
+def git_commit():
+    """Short hash of the checked out commit, if this is a git checkout"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def prepare_store(scale, seed, data_dir, work_dir):
+    """Get a fresh copy of the generated store, generating it only once per data directory"""
+    pristine = os.path.join(data_dir, f"store_{scale}_{seed}.db")
+    if not os.path.exists(pristine):
+        print(f"Generating {scale} store (seed {seed})...")
+        started = time.perf_counter()
+        partial = pristine + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        generate_store(partial, scale, seed)
+        os.replace(partial, pristine)
+        print(f"Generated in {time.perf_counter() - started:.1f} s")
+    
+    # Write benchmarks change the store, so every run starts from a copy
+    db_path = os.path.join(work_dir, "bench_store.db")
+    shutil.copyfile(pristine, db_path)
+    return db_path
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Compare median latencies with a baseline; returns (name, baseline p50, p50, ratio, status) rows"""
+    rows = []
+    for name, current in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            rows.append((name, None, current["p50_ms"], None, "new"))
+            continue
+        
+        # Tail latencies are too noisy on a shared machine to gate on
+        change = current["p50_ms"] - before["p50_ms"]
+        if current["p50_ms"] > before["p50_ms"] * (1 + threshold) and change >= min_delta_ms:
+            status = "REGRESSION"
+        elif current["p50_ms"] * (1 + threshold) < before["p50_ms"] and -change >= min_delta_ms:
+            status = "faster"
+        else:
+            status = "ok"
+        
+        ratio = current["p50_ms"] / before["p50_ms"] if before["p50_ms"] else None
+        rows.append((name, before["p50_ms"], current["p50_ms"], ratio, status))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="DatabaseManager latency benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="size of the generated store")
+    parser.add_argument("--seed", type=int, default=42, help="seed for the store and benchmark inputs")
+    parser.add_argument("--iterations", type=int, help="timed calls per round (default per benchmark)")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds per benchmark; the fastest is reported")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--data-dir", help="keep generated stores here to reuse them between runs")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with a results JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="slowdown ratio above which a benchmark regressed (default 0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args()
+    
+    selected = [bench for bench in BENCHMARKS if not args.only or any(part in bench.name for part in args.only)]
+    if not selected:
+        parser.error("no benchmark matches --only")
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data_dir or work_dir
+        os.makedirs(data_dir, exist_ok=True)
+        db_path = prepare_store(args.scale, args.seed, data_dir, work_dir)
+        
+        db_manager = DatabaseManager(db_path)
+        data = load_store(db_path, args.scale, args.seed)
+        
+        results = {
+            "meta": {
+                "scale": args.scale,
+                "seed": args.seed,
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "created_at": datetime.now().isoformat(timespec="seconds")
+            },
+            "results": {}
+        }
+        
+        print("=" * 72)
+        print(f"BENCHMARKS ({args.scale} store, seed {args.seed}, ms)")
+        print("=" * 72)
+        print(f"{'benchmark':<34} {'p50':>8} {'p95':>8} {'p99':>8} {'calls':>8}")
+        for bench in selected:
+            stats = time_benchmark(bench, db_manager, data, args.seed, args.iterations, args.rounds)
+            results["results"][bench.name] = stats
+            print(f"{bench.name:<34} {stats['p50_ms']:>8.3f} {stats['p95_ms']:>8.3f} "
+                  f"{stats['p99_ms']:>8.3f} {stats['iterations']:>8}")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        
+        meta = baseline.get("meta", {})
+        print(f"\nCompared with {meta.get('commit') or args.compare} "
+              f"({meta.get('scale')} store, seed {meta.get('seed')})")
+        if (meta.get("scale"), meta.get("seed")) != (args.scale, args.seed):
+            print("Warning: the baseline was run on a different store")
+        
+        rows = compare(results, baseline, args.threshold, args.min_delta_ms)
+        print(f"{'benchmark':<34} {'before':>8} {'after':>8} {'ratio':>8}  status")
+        for name, before, after, ratio, status in rows:
+            before_text = f"{before:>8.3f}" if before is not None else f"{'-':>8}"
+            ratio_text = f"{ratio:>8.2f}" if ratio is not None else f"{'-':>8}"
+            print(f"{name:<34} {before_text} {after:>8.3f} {ratio_text}  {status}")
+        
+        regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import glob
+import os
+import re
+import time
+from datetime import date
+
+# History tables moved to the archives; sale items go with their sale
+ARCHIVED_TABLES = ("sales", "sale_items", "inventory_movements", "dinau_transactions")
+
+class SalesArchive:
+    """Closed periods of sales history, moved to one archive database per year
+    
+    archive() moves sales, their items, inventory movements and dinau
+    transactions from before a cutoff into <db>_archive_<year>.db, so the
+    live database (and every query on it) only holds recent history. Dinau
+    loans stay live until the customer's dinau transactions before the
+    cutoff net to zero, so balances never need the archives.
+    
+    Rows are moved in batches of batch_size in two steps, each committing
+    to one file only: copy into the archive, then delete from the live
+    database the rows the archive now has. A crash in between leaves rows
+    in both, which the next run cleans up; no row is ever in neither.
+    
+    Connections opened with DatabaseManager.get_connection(history=True)
+    attach the archives and get TEMP views all_sales, all_sale_items,
+    all_inventory_movements and all_dinau_transactions, the UNION ALL of the
+    live table and its archives, for reports that span periods. SQLite
+    attaches at most 10 databases by default, so about a decade of yearly
+    archives.
+    """
+    
+    def __init__(self, db_manager, batch_size=500, pause=0.01):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.pause = pause
+        self.prefix = os.path.splitext(db_manager.db_path)[0] + "_archive_"
+        # Column lists of the live and archive tables, for the views
+        self._columns = {}
+        # Archive years, with the modification time of their directory when listed
+        self._years = None
+    
+    def archive_path(self, year):
+        """Path of the archive database of a year"""
+        return f"{self.prefix}{year}.db"
+    
+    def years(self):
+        """Years that have an archive database, oldest first
+        
+        The list is kept until a file is added to or removed from the
+        database's directory (e.g. by archive() on another till), so
+        history connections do not list the directory every time.
+        """
+        try:
+            listed_at = os.stat(os.path.dirname(self.prefix) or ".").st_mtime_ns
+        except OSError:
+            listed_at = None
+        if self._years is not None and self._years[0] == listed_at:
+            return list(self._years[1])
+        
+        pattern = re.compile(re.escape(os.path.basename(self.prefix)) + r"(\d{4})\.db$")
+        years = []
+        for path in glob.glob(glob.escape(self.prefix) + "[0-9][0-9][0-9][0-9].db"):
+            match = pattern.match(os.path.basename(path))
+            if match:
+                years.append(int(match.group(1)))
+        self._years = (listed_at, sorted(years))
+        return list(self._years[1])
+    
+    def refresh(self):
+        """Forget the cached list of archive years"""
+        self._years = None
+    
+    def attach(self, conn):
+        """Attach the archives to a connection and create the all_* history views"""
+        years = self.years()
+        for year in years:
+            conn.execute(f'ATTACH DATABASE ? AS archive_{year}', (self.archive_path(year),))
+        
+        for table in ARCHIVED_TABLES:
+            columns = self._table_columns(conn, "main", table)
+            parts = [f'SELECT {", ".join(columns)} FROM main.{table}']
+            for year in years:
+                present = self._table_columns(conn, f"archive_{year}", table)
+                # Archives made before a column was added have NULL in it
+                selected = [column if column in present else f"NULL AS {column}" for column in columns]
+                parts.append(f'SELECT {", ".join(selected)} FROM archive_{year}.{table}')
+            conn.execute(f'CREATE TEMP VIEW IF NOT EXISTS all_{table} AS ' + " UNION ALL ".join(parts))
+    
+    def _table_columns(self, conn, schema, table):
+        """Columns of a table in the live database or an attached archive, cached per file"""
+        key = (schema, table)
+        if key not in self._columns:
+            self._columns[key] = [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})').fetchall()]
+        return self._columns[key]
+    
+    @staticmethod
+    def cutoff_for(months, today=None):
+        """First day of the month months before today's month: whole months are archived"""
+        today = today or date.today()
+        month_index = today.year * 12 + today.month - 1 - months
+        return date(month_index // 12, month_index % 12 + 1, 1).isoformat()
+    
+    def archive(self, months=12, before=None):
+        """Move history from before the cutoff (or the date before) to the archives
+        
+        Returns the number of rows moved per table.
+        """
+        cutoff = before or self.cutoff_for(months)
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        moved = {table: 0 for table in ARCHIVED_TABLES}
+        attached = set()
+        
+        def attach(year):
+            if year not in attached:
+                cursor.execute(f'ATTACH DATABASE ? AS archive_{year}', (self.archive_path(year),))
+                self._create_tables(cursor, f"archive_{year}")
+                attached.add(year)
+            return f"archive_{year}"
+        
+        try:
+            # Finish moves interrupted between their copy and delete steps
+            for year in self.years():
+                self._delete_archived(conn, attach(year))
+            
+            # Customers whose dinau loans and payments before the cutoff net to zero
+            cursor.execute('DROP TABLE IF EXISTS temp.closed_customers')
+            cursor.execute('''
+                CREATE TEMP TABLE closed_customers AS
+                SELECT customer_id FROM dinau_transactions
+                WHERE created_at < ?
+                GROUP BY customer_id
+                HAVING ABS(SUM(CASE WHEN transaction_type = 'loan' THEN amount ELSE -amount END)) < 0.005
+                   AND customer_id NOT IN (
+                       SELECT customer_id FROM sales
+                       WHERE payment_method = 'dinau' AND is_dinau_settled = 0 AND created_at < ?
+                   )
+            ''', (cutoff, cutoff))
+            conn.commit()
+            
+            selections = {
+                "sales": '''
+                    created_at < :cutoff AND (payment_method != 'dinau'
+                        OR (is_dinau_settled = 1 AND customer_id IN (SELECT customer_id FROM temp.closed_customers)))
+                ''',
+                "inventory_movements": 'created_at < :cutoff',
+                "dinau_transactions": '''
+                    created_at < :cutoff AND customer_id IN (SELECT customer_id FROM temp.closed_customers)
+                '''
+            }
+            
+            for table, selection in selections.items():
+                while True:
+                    cursor.execute(f'''
+                        SELECT id, strftime('%Y', created_at) FROM main.{table}
+                        WHERE {selection}
+                        ORDER BY id
+                        LIMIT :limit
+                    ''', {"cutoff": cutoff, "limit": self.batch_size})
+                    batch = cursor.fetchall()
+                    if not batch:
+                        break
+                    
+                    by_year = {}
+                    for row_id, year in batch:
+                        by_year.setdefault(int(year), []).append(row_id)
+                    
+                    for year, ids in by_year.items():
+                        batch_started = time.perf_counter()
+                        counts = self._move(conn, attach(year), table, ids)
+                        for name, count in counts.items():
+                            moved[name] += count
+                        # Leave the database unlocked as long as the batch held it
+                        time.sleep(max(time.perf_counter() - batch_started, self.pause))
+            
+            cursor.execute('DROP TABLE IF EXISTS temp.closed_customers')
+            conn.commit()
+        finally:
+            conn.close()
+            self.refresh()
+        return moved
+    
+    def _create_tables(self, cursor, schema):
+        """Create the archived tables and their indexes in an archive, as in the live database"""
+        cursor.execute(f'''
+            SELECT type, name, tbl_name, sql FROM main.sqlite_master
+            WHERE tbl_name IN ({",".join("?" * len(ARCHIVED_TABLES))}) AND sql IS NOT NULL
+            ORDER BY type = 'index'
+        ''', ARCHIVED_TABLES)
+        
+        for kind, name, table, sql in cursor.fetchall():
+            # "CREATE TABLE sales (" becomes "CREATE TABLE IF NOT EXISTS archive_2024.sales ("
+            target = table if kind == "table" else name
+            statement = re.sub(
+                rf"^\s*CREATE\s+(UNIQUE\s+)?(TABLE|INDEX)\s+(IF\s+NOT\s+EXISTS\s+)?{re.escape(target)}\b",
+                lambda match: f"CREATE {match.group(1) or ''}{match.group(2)} IF NOT EXISTS {schema}.{target}",
+                sql, count=1, flags=re.IGNORECASE
+            )
+            cursor.execute(statement)
+        
+        # Columns added to the live tables since the archive was created
+        for table in ARCHIVED_TABLES:
+            live = cursor.execute(f'PRAGMA main.table_info({table})').fetchall()
+            present = {row[1] for row in cursor.execute(f'PRAGMA {schema}.table_info({table})').fetchall()}
+            for row in live:
+                if row[1] not in present:
+                    cursor.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {row[1]} {row[2]}')
+            self._columns.pop((schema, table), None)
+        cursor.connection.commit()
+    
+    def _move(self, conn, schema, table, ids):
+        """Copy rows (and a sale's items) to an archive, then delete them from the live database"""
+        placeholders = ",".join("?" * len(ids))
+        tables = [table] + (["sale_items"] if table == "sales" else [])
+        cursor = conn.cursor()
+        counts = {}
+        
+        try:
+            # Step 1: only the archive file is written
+            cursor.execute('BEGIN')
+            for name in tables:
+                key = "sale_id" if name == "sale_items" else "id"
+                columns = ", ".join(self._table_columns(conn, "main", name))
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO {schema}.{name} ({columns})
+                    SELECT {columns} FROM main.{name} WHERE {key} IN ({placeholders})
+                ''', ids)
+                counts[name] = cursor.rowcount
+            conn.commit()
+            
+            # Step 2: only the live file is written
+            cursor.execute('BEGIN IMMEDIATE')
+            for name in reversed(tables):
+                key = "sale_id" if name == "sale_items" else "id"
+                cursor.execute(f'''
+                    DELETE FROM main.{name}
+                    WHERE {key} IN ({placeholders})
+                      AND id IN (SELECT id FROM {schema}.{name} WHERE {key} IN ({placeholders}))
+                ''', ids + ids)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        return counts
+    
+    def _delete_archived(self, conn, schema):
+        """Delete live rows that an interrupted move already copied to an archive"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for table in ("sale_items", "sales", "inventory_movements", "dinau_transactions"):
+                # Only archived rows from the lowest live id up can still be live, so the scan starts there
+                cursor.execute(f'''
+                    DELETE FROM main.{table}
+                    WHERE id IN (
+                        SELECT id FROM {schema}.{table}
+                        WHERE id >= (SELECT COALESCE(MIN(id), 0) FROM main.{table})
+                    )
+                ''')
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def main():
+    from .database_manager import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Move closed periods of sales history to yearly archives")
+    parser.add_argument("--db", default="store_pos.db")
+    parser.add_argument("--months", type=int, default=12, help="keep this many whole months live")
+    parser.add_argument("--before", default=None, help="archive history before this date (YYYY-MM-DD) instead")
+    args = parser.parse_args()
+    
+    archive = SalesArchive(DatabaseManager(args.db))
+    started = time.perf_counter()
+    moved = archive.archive(args.months, args.before)
+    print(f"Archived in {time.perf_counter() - started:.1f}s: " +
+          ", ".join(f"{count} {table}" for table, count in moved.items()))
+    print(f"Archives: {', '.join(archive.archive_path(year) for year in archive.years()) or 'none'}")
+
+if __name__ == "__main__":
+    main()
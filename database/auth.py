@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+# PBKDF2-HMAC-SHA256 iterations by device class; the hasher uses the
+# strongest one that stays within its time budget on the device
+KDF_PROFILES = {
+    "low": 60000,
+    "standard": 150000,
+    "high": 310000
+}
+
+ALGORITHM = "pbkdf2_sha256"
+
+class PasswordHasher:
+    """Salted PBKDF2 hashes for passwords and PINs
+    
+    Hashes are stored as pbkdf2_sha256$<iterations>$<salt>$<hash> and keep
+    their own cost, so a database moved to another device still verifies.
+    Unsalted SHA-256 hashes from older databases still verify and are
+    reported by needs_rehash, to be replaced at the next login.
+    """
+    
+    def __init__(self, iterations=None, target_ms=150):
+        self.target_ms = target_ms
+        self._iterations = iterations
+    
+    @property
+    def iterations(self):
+        """Iterations for new hashes, calibrated on first use"""
+        if self._iterations is None:
+            self._iterations = self.calibrate()
+        return self._iterations
+    
+    def calibrate(self):
+        """Pick the strongest profile whose hash takes at most target_ms on this device"""
+        sample = 10000
+        started = time.perf_counter()
+        hashlib.pbkdf2_hmac("sha256", b"calibration", b"0" * 16, sample)
+        per_iteration_ms = (time.perf_counter() - started) * 1000 / sample
+        
+        affordable = [iterations for iterations in KDF_PROFILES.values()
+                      if iterations * per_iteration_ms <= self.target_ms]
+        return max(affordable) if affordable else KDF_PROFILES["low"]
+    
+    def hash(self, secret):
+        """Hash a password or PIN with a new random salt"""
+        salt = os.urandom(16)
+        digest = hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), salt, self.iterations)
+        return "$".join([ALGORITHM, str(self.iterations),
+                         base64.b64encode(salt).decode("ascii"), base64.b64encode(digest).decode("ascii")])
+    
+    def verify(self, secret, stored):
+        """Check a password or PIN against a stored hash"""
+        if not stored:
+            return False
+        
+        if "$" not in stored:
+            # Unsalted SHA-256 of older databases
+            legacy = hashlib.sha256(secret.encode("utf-8")).hexdigest()
+            return hmac.compare_digest(legacy, stored)
+        
+        try:
+            algorithm, iterations, salt, digest = stored.split("$")
+            if algorithm != ALGORITHM:
+                return False
+            expected = base64.b64decode(digest)
+            actual = hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), base64.b64decode(salt), int(iterations))
+        except ValueError:
+            return False
+        return hmac.compare_digest(expected, actual)
+    
+    def needs_rehash(self, stored):
+        """Whether a stored hash is weaker than what this device would create"""
+        parts = stored.split("$")
+        return len(parts) != 4 or parts[0] != ALGORITHM or int(parts[1]) < self.iterations
+    
+    def dummy_verify(self, secret):
+        """Spend the time of a verification, so unknown usernames are not told apart by timing"""
+        hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), b"0" * 16, self.iterations)
+
+class SessionCache:
+    """Users verified by password on this till, who can switch back in by PIN
+    
+    A session starts at password login and lasts ttl seconds. The first PIN
+    switch of a session is checked against the stored PIN hash; after that
+    the PIN is checked against an HMAC under a key that only exists in this
+    process, which takes microseconds. Too many wrong PINs end the session,
+    and the user has to log in with their password again.
+    """
+    
+    def __init__(self, ttl=12 * 3600, max_pin_failures=5):
+        self.ttl = ttl
+        self.max_pin_failures = max_pin_failures
+        self._key = os.urandom(32)
+        self._sessions = {}
+        self._lock = threading.Lock()
+    
+    def start(self, user):
+        """Start or renew the session of a user who logged in with their password"""
+        with self._lock:
+            self._sessions[user['username']] = {
+                'user': dict(user),
+                'expires': time.monotonic() + self.ttl,
+                'pin': None,
+                'failures': 0
+            }
+    
+    def get(self, username):
+        """Get the user of a live session, or None"""
+        with self._lock:
+            session = self._live(username)
+            return dict(session['user']) if session else None
+    
+    def check_pin(self, username, pin):
+        """Check a PIN against the session: True, False, or None when not known yet"""
+        with self._lock:
+            session = self._live(username)
+            if session is None or session['pin'] is None:
+                return None
+            return hmac.compare_digest(session['pin'], self._mac(pin))
+    
+    def remember_pin(self, username, pin):
+        """Keep a verified PIN for fast checks during the session"""
+        with self._lock:
+            session = self._live(username)
+            if session:
+                session['pin'] = self._mac(pin)
+                session['failures'] = 0
+    
+    def pin_failed(self, username):
+        """Count a wrong PIN, ending the session after too many"""
+        with self._lock:
+            session = self._live(username)
+            if session:
+                session['failures'] += 1
+                if session['failures'] >= self.max_pin_failures:
+                    del self._sessions[username]
+    
+    def end(self, username):
+        """End a user's session"""
+        with self._lock:
+            self._sessions.pop(username, None)
+    
+    def clear(self):
+        """End all sessions"""
+        with self._lock:
+            self._sessions.clear()
+    
+    def _live(self, username):
+        """The session of a user if it has not expired (lock held)"""
+        session = self._sessions.get(username)
+        if session and session['expires'] < time.monotonic():
+            del self._sessions[username]
+            return None
+        return session
+    
+    def _mac(self, pin):
+        return hmac.new(self._key, pin.encode("utf-8"), hashlib.sha256).digest()
@@ -0,0 +1,346 @@
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+BackupResult = namedtuple("BackupResult", ["path", "size", "compressed_size", "pages", "restarts", "duration_ms",
+                                           "archives"], defaults=((),))
+
+class BackupError(Exception):
+    """A backup could not be made, or a backup file is damaged"""
+
+class _Restarted(Exception):
+    """The source kept changing under a stepped backup"""
+
+class BackupManager:
+    """Online backups of the store database while the tills keep selling
+    
+    The database is copied with the SQLite backup API, pages_per_step pages
+    at a time with a pause in between, so checkout gets the disk (and, for a
+    database not in WAL mode, the lock) between steps. A write from another
+    connection restarts a stepped backup; after max_restarts the rest is
+    copied in one step, which in WAL mode still does not block writers.
+    
+    Each copy passes PRAGMA integrity_check before it is gzipped to a
+    timestamped file in backup_dir, next to a .sha256 file of the archive.
+    The newest keep_last backups are kept, plus the newest of each day for
+    keep_days days; older ones are deleted.
+    
+    The yearly sales archives (<db>_archive_<year>.db) are backed up the same
+    way next to the database, each under its own name and retention. An
+    archive only changes when sales are archived, so one that has not
+    changed since its newest backup is not copied again.
+    """
+    
+    def __init__(self, db_manager, backup_dir="backups", pages_per_step=1024, pause=0.05,
+                 max_restarts=3, keep_last=7, keep_days=30):
+        self.db_manager = db_manager
+        self.backup_dir = backup_dir
+        self.pages_per_step = pages_per_step
+        self.pause = pause
+        self.max_restarts = max_restarts
+        self.keep_last = keep_last
+        self.keep_days = keep_days
+        self.stem = os.path.splitext(os.path.basename(db_manager.db_path))[0]
+        
+        self._lock = threading.Lock()
+        self._waiting_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._waiting = []
+        self._thread = None
+    
+    def backup(self):
+        """Make a verified, compressed backup now and apply the retention policy
+        
+        The result's archives lists the backups of sales archives made with it.
+        """
+        with self._lock:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            started = time.perf_counter()
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            path, size, compressed_size, pages, restarts = self._backup_file(self.stem, stamp)
+            
+            archives = []
+            for year, archive_path in self.archive_paths():
+                stem = self.archive_stem(year)
+                if not self._changed_since_backup(stem, archive_path):
+                    continue
+                archive_started = time.perf_counter()
+                archives.append(BackupResult(*self._backup_file(stem, stamp, archive_path),
+                                             (time.perf_counter() - archive_started) * 1000))
+            
+            self.prune()
+            return BackupResult(path, size, compressed_size, pages, restarts,
+                                (time.perf_counter() - started) * 1000, archives)
+    
+    def archive_paths(self):
+        """The sales archives of the database, as (year, path)"""
+        archive = self.db_manager.archive
+        return [(year, archive.archive_path(year)) for year in archive.years()]
+    
+    def archive_stem(self, year):
+        """Backup name stem of the sales archive of year"""
+        return f"{self.stem}_archive_{year}"
+    
+    def _changed_since_backup(self, stem, source_path):
+        """Whether a file was modified after its newest backup (or has none)"""
+        backups = self.find_backups(self.backup_dir, stem)
+        if not backups:
+            return True
+        return datetime.fromtimestamp(os.path.getmtime(source_path)) >= backups[0][0]
+    
+    def _backup_file(self, stem, stamp, source_path=None):
+        """Copy, check and gzip one database file; returns (path, size, compressed_size, pages, restarts)"""
+        name = f"{stem}-{stamp}.db"
+        copy_path = os.path.join(self.backup_dir, f".{name}.tmp")
+        path = os.path.join(self.backup_dir, name + ".gz")
+        
+        try:
+            pages, restarts = self._copy(copy_path, source_path)
+            size = os.path.getsize(copy_path)
+            compressed_size = self._compress(copy_path, path)
+        finally:
+            for leftover in (copy_path, path + ".part"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        return path, size, compressed_size, pages, restarts
+    
+    def _copy(self, copy_path, source_path=None):
+        """Copy the database (or the file at source_path) with the backup API and check the copy
+        
+        Returns (pages, restarts).
+        """
+        source = self.db_manager.get_connection() if source_path is None else sqlite3.connect(source_path)
+        target = sqlite3.connect(copy_path)
+        progress = {'remaining': None, 'restarts': 0, 'pages': 0}
+        
+        def step(status, remaining, pages):
+            if progress['remaining'] is not None and remaining > progress['remaining']:
+                progress['restarts'] += 1
+                if progress['restarts'] > self.max_restarts:
+                    raise _Restarted()
+            progress['remaining'], progress['pages'] = remaining, pages
+            if remaining:
+                time.sleep(self.pause)
+        
+        try:
+            try:
+                source.backup(target, pages=self.pages_per_step, progress=step)
+            except _Restarted:
+                source.backup(target)
+            
+            result = target.execute('PRAGMA integrity_check').fetchall()
+            if result != [("ok",)]:
+                raise BackupError(f"Backup copy failed the integrity check: {result[:5]}")
+            pages = target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        return pages, progress['restarts']
+    
+    def _compress(self, copy_path, path):
+        """Gzip the checked copy to path, atomically, and write its checksum file"""
+        digest = hashlib.sha256()
+        part_path = path + ".part"
+        
+        with open(copy_path, "rb") as source, open(part_path, "wb") as raw:
+            with gzip.GzipFile(filename=os.path.basename(path)[:-3], mode="wb", fileobj=raw) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            raw.flush()
+            os.fsync(raw.fileno())
+        
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        os.replace(part_path, path)
+        
+        # Same format as sha256sum, so a backup can be checked with `sha256sum -c`
+        with open(path + ".sha256", "w", encoding="utf-8") as f:
+            f.write(f"{digest.hexdigest()}  {os.path.basename(path)}\n")
+        return os.path.getsize(path)
+    
+    def list_backups(self):
+        """Backups of this database, newest first, as (taken_at, path)"""
+        return self.find_backups(self.backup_dir, self.stem)
+    
+    @staticmethod
+    def find_backups(backup_dir, stem):
+        """Backups in backup_dir of the database named stem, newest first, as (taken_at, path)"""
+        pattern = re.compile(re.escape(stem) + r"-(\d{8}-\d{6}-\d{6})\.db\.gz$")
+        backups = []
+        if os.path.isdir(backup_dir):
+            for name in os.listdir(backup_dir):
+                match = pattern.match(name)
+                if match:
+                    taken_at = datetime.strptime(match.group(1), "%Y%m%d-%H%M%S-%f")
+                    backups.append((taken_at, os.path.join(backup_dir, name)))
+        return sorted(backups, reverse=True)
+    
+    def prune(self):
+        """Delete backups outside the retention policy; returns the deleted paths"""
+        deleted = self._prune(self.list_backups())
+        for year, archive_path in self.archive_paths():
+            deleted.extend(self._prune(self.find_backups(self.backup_dir, self.archive_stem(year))))
+        return deleted
+    
+    def _prune(self, backups):
+        """Delete the backups of one database that are outside the retention policy"""
+        keep = {path for taken_at, path in backups[:self.keep_last]}
+        
+        cutoff = datetime.now() - timedelta(days=self.keep_days)
+        days = set()
+        for taken_at, path in backups:
+            if taken_at >= cutoff and taken_at.date() not in days:
+                days.add(taken_at.date())
+                keep.add(path)
+        
+        deleted = []
+        for taken_at, path in backups:
+            if path not in keep:
+                for file_path in (path, path + ".sha256"):
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                deleted.append(path)
+        return deleted
+    
+    @staticmethod
+    def verify(path):
+        """Check a backup against its checksum file and SQLite's integrity check"""
+        checksum_path = path + ".sha256"
+        if os.path.exists(checksum_path):
+            with open(checksum_path, encoding="utf-8") as f:
+                expected = f.read().split()[0]
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != expected:
+                raise BackupError(f"{path} does not match its checksum")
+        
+        copy_path = path + ".verify"
+        try:
+            BackupManager.restore(path, copy_path)
+            conn = sqlite3.connect(copy_path)
+            try:
+                result = conn.execute('PRAGMA integrity_check').fetchall()
+            finally:
+                conn.close()
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            raise BackupError(f"{path} cannot be read: {e}") from e
+        finally:
+            if os.path.exists(copy_path):
+                os.remove(copy_path)
+        
+        if result != [("ok",)]:
+            raise BackupError(f"{path} failed the integrity check: {result[:5]}")
+        return True
+    
+    @staticmethod
+    def restore(path, db_path):
+        """Decompress a backup to db_path, which must not exist yet"""
+        if os.path.exists(db_path):
+            raise BackupError(f"{db_path} already exists; restore to a new path and swap it in with the app closed")
+        with gzip.open(path, "rb") as source, open(db_path, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+    
+    def start(self, interval=24 * 3600, check_every=3600):
+        """Back up in the background whenever the newest backup is older than interval seconds"""
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, args=(interval, check_every), name="backup", daemon=True)
+        self._thread.start()
+    
+    def backup_now(self, on_done=None):
+        """Ask the background thread for a backup; on_done gets the BackupResult or the error"""
+        with self._waiting_lock:
+            self._waiting.append(on_done)
+        self._wake.set()
+    
+    def stop(self, timeout=None):
+        """Stop the background thread (a running backup is finished first)"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self, interval, check_every):
+        """Backup thread: back up when asked or when the last backup is too old"""
+        while not self._stopping:
+            with self._waiting_lock:
+                waiting, self._waiting = self._waiting, []
+            backups = self.list_backups()
+            due = not backups or (datetime.now() - backups[0][0]).total_seconds() >= interval
+            
+            if waiting or due:
+                try:
+                    result = self.backup()
+                except Exception as e:
+                    print(f"Error backing up database: {e}")
+                    result = e
+                for on_done in waiting:
+                    if on_done:
+                        on_done(result)
+            
+            self._wake.wait(check_every)
+            self._wake.clear()
+
+def main():
+    from .database_manager import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Back up the store database while the tills are running")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="make a backup now")
+    create.add_argument("--db", default="store_pos.db")
+    create.add_argument("--dir", default="backups")
+    create.add_argument("--keep-last", type=int, default=7)
+    create.add_argument("--keep-days", type=int, default=30)
+    listing = commands.add_parser("list", help="list backups")
+    listing.add_argument("--db", default="store_pos.db")
+    listing.add_argument("--dir", default="backups")
+    verify = commands.add_parser("verify", help="check a backup file")
+    verify.add_argument("path")
+    restore = commands.add_parser("restore", help="decompress a backup to a new database file")
+    restore.add_argument("path")
+    restore.add_argument("db_path")
+    args = parser.parse_args()
+    
+    try:
+        if args.command == "create":
+            backups = BackupManager(DatabaseManager(args.db), args.dir,
+                                    keep_last=args.keep_last, keep_days=args.keep_days)
+            result = backups.backup()
+            print(f"Backed up {args.db} to {result.path}: {result.pages} pages, "
+                  f"{result.size / 1024:.0f} KB -> {result.compressed_size / 1024:.0f} KB "
+                  f"in {result.duration_ms:.0f} ms ({result.restarts} restarts)")
+            for archive in result.archives:
+                print(f"Backed up sales archive to {archive.path}: {archive.pages} pages")
+        elif args.command == "list":
+            stem = os.path.splitext(os.path.basename(args.db))[0]
+            # The database's backups, then those of each of its sales archives
+            stems = {stem}
+            if os.path.isdir(args.dir):
+                pattern = re.compile(re.escape(stem) + r"_archive_\d{4}(?=-)")
+                stems.update(match.group(0) for match in map(pattern.match, os.listdir(args.dir)) if match)
+            for backup_stem in sorted(stems):
+                for taken_at, path in BackupManager.find_backups(args.dir, backup_stem):
+                    print(f"{taken_at:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) / 1024:>10.0f} KB  {path}")
+        elif args.command == "verify":
+            BackupManager.verify(args.path)
+            print(f"{args.path} is OK")
+        else:
+            BackupManager.restore(args.path, args.db_path)
+            print(f"Restored {args.path} to {args.db_path}")
+    except BackupError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
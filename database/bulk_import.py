@@ -0,0 +1,185 @@
+import csv
+import json
+import math
+import os
+from collections import namedtuple
+from .events import CatalogChanged
+
+ImportResult = namedtuple("ImportResult", ["inserted", "updated", "rejected"])
+RejectedRow = namedtuple("RejectedRow", ["row_number", "reason", "row"])
+
+class ProductImporter:
+    """Bulk product import from CSV, JSON or JSON Lines supplier price lists
+    
+    Rows are streamed and validated in chunks, and each chunk is upserted by
+    barcode with executemany. The whole file is one transaction, so a failed
+    import leaves the catalog untouched; invalid rows are skipped and
+    reported instead of failing the import.
+    """
+    
+    # Columns a price list may provide, in upsert parameter order; barcode, name and price are required
+    COLUMNS = ["barcode", "name", "description", "category", "price", "cost_price",
+               "stock_quantity", "min_stock_level"]
+    NUMERIC_COLUMNS = {"price": float, "cost_price": float, "stock_quantity": int, "min_stock_level": int}
+    
+    # Common supplier spellings of the column names
+    COLUMN_ALIASES = {
+        "sku": "barcode", "ean": "barcode", "upc": "barcode",
+        "product": "name", "product_name": "name",
+        "selling_price": "price", "sell_price": "price",
+        "cost": "cost_price",
+        "stock": "stock_quantity", "quantity": "stock_quantity", "qty": "stock_quantity",
+        "min_stock": "min_stock_level"
+    }
+    
+    def __init__(self, db_manager, chunk_size=5000):
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+    
+    def import_file(self, path):
+        """Import a .csv, .json or .jsonl price list"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                return self.import_rows(csv.DictReader(f))
+        if extension == ".jsonl":
+            with open(path, encoding='utf-8') as f:
+                return self.import_rows(json.loads(line) for line in f if line.strip())
+        if extension == ".json":
+            with open(path, encoding='utf-8') as f:
+                return self.import_rows(json.load(f))
+        raise ValueError(f"Unsupported price list format: {extension}")
+    
+    def import_rows(self, rows):
+        """Validate and upsert an iterable of row dicts"""
+        if self.db_manager.hub is not None:
+            # New products would get ids of this till's own, not the hub's
+            raise ValueError("This till syncs its catalog from the store hub: import price lists there")
+        
+        inserted = updated = 0
+        rejected = []
+        
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            # Every product touched by one import shares one catalog version
+            version = self.db_manager.bump_data_version(cursor, "catalog")
+            
+            chunk = {}
+            for row_number, row in enumerate(rows, start=1):
+                product, reason = self.validate_row(row)
+                if reason:
+                    rejected.append(RejectedRow(row_number, reason, row))
+                    continue
+                
+                # A barcode repeated within a chunk keeps its last row
+                chunk[product["barcode"]] = tuple(product.get(column) for column in self.COLUMNS)
+                
+                if len(chunk) >= self.chunk_size:
+                    chunk_inserted, chunk_updated = self._upsert_chunk(cursor, chunk, version)
+                    inserted += chunk_inserted
+                    updated += chunk_updated
+                    chunk = {}
+            
+            if chunk:
+                chunk_inserted, chunk_updated = self._upsert_chunk(cursor, chunk, version)
+                inserted += chunk_inserted
+                updated += chunk_updated
+            
+            conn.commit()
+            conn.close()
+            self.db_manager.changes.publish([CatalogChanged(version)])
+            return ImportResult(inserted, updated, rejected)
+            
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            raise e
+    
+    def validate_row(self, row):
+        """Normalize a row; returns (product, None) or (None, reason)"""
+        if not isinstance(row, dict):
+            return None, "not a product record"
+        
+        product = {}
+        for key, value in row.items():
+            if key is None:
+                continue
+            column = key.strip().lower().replace(" ", "_")
+            column = self.COLUMN_ALIASES.get(column, column)
+            if column in self.COLUMNS:
+                value = value.strip() if isinstance(value, str) else value
+                if value not in ("", None):
+                    product[column] = value
+        
+        if not product.get("barcode"):
+            return None, "missing barcode"
+        if not product.get("name"):
+            return None, "missing name"
+        if "price" not in product:
+            return None, "missing price"
+        
+        product["barcode"] = str(product["barcode"])
+        for column, convert in self.NUMERIC_COLUMNS.items():
+            if column in product:
+                try:
+                    product[column] = convert(product[column])
+                except (TypeError, ValueError):
+                    return None, f"invalid {column}: {product[column]!r}"
+                # float() accepts "nan" and "inf", which compare as not negative
+                if not math.isfinite(product[column]):
+                    return None, f"invalid {column}: {product[column]!r}"
+                if product[column] < 0:
+                    return None, f"negative {column}"
+        
+        return product, None
+    
+    def _upsert_chunk(self, cursor, chunk, version):
+        """Upsert one chunk of products by barcode; returns (inserted, updated)"""
+        barcodes = list(chunk)
+        existing = 0
+        for start in range(0, len(barcodes), 500):
+            part = barcodes[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            cursor.execute(f'SELECT COUNT(*) FROM products WHERE barcode IN ({placeholders})', part)
+            existing += cursor.fetchone()[0]
+        
+        # Optional columns left blank keep the product's current value. Stock
+        # is only set for new products; existing stock changes go through
+        # stock takes and receiving so they are recorded as movements
+        cursor.executemany('''
+            INSERT INTO products (barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level, version)
+            VALUES (?1, ?2, ?3, ?4, ?5, ?6, COALESCE(?7, 0), COALESCE(?8, 5), ?9)
+            ON CONFLICT(barcode) DO UPDATE SET
+                name = ?2,
+                description = COALESCE(?3, description),
+                category = COALESCE(?4, category),
+                price = ?5,
+                cost_price = COALESCE(?6, cost_price),
+                min_stock_level = COALESCE(?8, min_stock_level),
+                updated_at = CURRENT_TIMESTAMP,
+                is_active = 1,
+                version = ?9
+        ''', [values + (version,) for values in chunk.values()])
+        
+        return len(chunk) - existing, existing
+    
+    @staticmethod
+    def write_rejects(path, rejected):
+        """Write rejected rows with their row number and reason to a CSV file"""
+        fieldnames = ["row_number", "reason"]
+        for reject in rejected:
+            for key in (reject.row if isinstance(reject.row, dict) else {}):
+                if key is not None and key not in fieldnames:
+                    fieldnames.append(key)
+        
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            for reject in rejected:
+                row = reject.row if isinstance(reject.row, dict) else {}
+                writer.writerow({"row_number": reject.row_number, "reason": reject.reason,
+                                 **{key: value for key, value in row.items() if key is not None}})
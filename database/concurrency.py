@@ -0,0 +1,39 @@
+import random
+import sqlite3
+import time
+from collections import namedtuple
+
+StockShortage = namedtuple("StockShortage", ["product_id", "name", "requested", "available"])
+
+class InsufficientStockError(Exception):
+    """A sale needs more stock than is left, e.g. because another till sold it first"""
+    
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__("Not enough stock: " + ", ".join(
+            f"{shortage.name or shortage.product_id} ({shortage.available} left, {shortage.requested} needed)"
+            for shortage in shortages
+        ))
+
+def is_busy(error):
+    """Whether an error means another connection holds the database lock"""
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in str(error) or "busy" in str(error)
+    )
+
+def retry_on_busy(work, retries=4, delay=0.05, max_delay=1.0):
+    """Run work(), retrying with jittered exponential backoff while the database is busy
+    
+    SQLite's busy timeout already waits for the lock inside each attempt;
+    this covers tills that gave up waiting, e.g. during a long report or
+    checkpoint on another till. work must roll back what it started.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return work()
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt == retries:
+                raise
+        # Jitter keeps tills that collided from retrying in lockstep
+        time.sleep(delay * random.uniform(0.5, 1.5))
+        delay = min(delay * 2, max_delay)
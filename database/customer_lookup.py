@@ -0,0 +1,125 @@
+from utils.lru_cache import LRUCache
+from .customer_search import CustomerSearchIndex
+from .events import CustomerChanged, DinauPayment, SaleCreated
+
+class CustomerLookup:
+    """Fast customer picking for the till
+    
+    Keeps the customers recently served at this till and their dinau
+    balances in memory. Searches answer from the recent customers first and
+    only fill up from the indexed customer search; balances are read in one
+    batch query and cached until a dinau sale or payment invalidates them.
+    The customers data version is checked once per search, when the picker
+    opens, and recent customer rows are dropped if it moved on, so edits
+    made on other tills are not shown stale; edits made through this till
+    drop the rows right away through the change feed.
+    """
+    
+    def __init__(self, db_manager, recent_capacity=50, balance_capacity=500):
+        self.db_manager = db_manager
+        self.recent = LRUCache(recent_capacity)
+        self.balances = LRUCache(balance_capacity)
+        self.customers_version = None
+    
+    def drop_stale(self):
+        """Forget the recent customer rows if any customer changed since they were cached"""
+        version = self.db_manager.get_data_version("customers")
+        if version != self.customers_version:
+            self.recent.clear()
+            self.customers_version = version
+    
+    def remember(self, customer):
+        """Mark a customer row as recently served"""
+        self.drop_stale()
+        self.recent.put(customer[0], customer)
+    
+    def recent_customers(self, limit=10):
+        """Get the most recently served customers"""
+        return self.recent.values()[:limit]
+    
+    def start_search(self, limit=10):
+        """Begin a customer search: drop stale rows once, then get the recently served customers"""
+        self.drop_stale()
+        return self.recent_customers(limit)
+    
+    def search(self, search_term, limit=20):
+        """Find customers for a search term, recently served ones first
+        
+        Called on every keystroke, so the cached rows are not checked against
+        the data version here; start_search does that when the picker opens.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return self.recent_customers(limit)
+        
+        results = [customer for customer in self.recent.values()
+                   if self.matches(customer, search_term)]
+        
+        if len(results) < limit:
+            seen = {customer[0] for customer in results}
+            for customer in self.db_manager.search_customers(search_term, limit):
+                if customer[0] not in seen:
+                    results.append(customer)
+                    seen.add(customer[0])
+        
+        return results[:limit]
+    
+    @staticmethod
+    def matches(customer, search_term):
+        """Check a customer row against a search term without the database"""
+        name, phone = customer[1], customer[2]
+        
+        if CustomerSearchIndex.is_phone_query(search_term):
+            digits = CustomerSearchIndex.phone_digits(search_term)
+            return CustomerSearchIndex.phone_digits(phone).startswith(digits)
+        
+        name_words = CustomerSearchIndex.normalize_name(name).split()
+        query_words = CustomerSearchIndex.normalize_name(search_term).split()
+        return bool(query_words) and all(
+            any(name_word.startswith(query_word) for name_word in name_words)
+            for query_word in query_words
+        )
+    
+    def get_balance(self, customer_id):
+        """Get a customer's outstanding dinau balance"""
+        return self.get_balances([customer_id])[customer_id]
+    
+    def get_balances(self, customer_ids):
+        """Get outstanding dinau balances for several customers at once"""
+        balances = {}
+        missing = []
+        
+        for customer_id in customer_ids:
+            balance = self.balances.get(customer_id)
+            if balance is None:
+                missing.append(customer_id)
+            else:
+                balances[customer_id] = balance
+        
+        if missing:
+            for customer_id, balance in self.db_manager.get_customer_dinau_balances(missing).items():
+                self.balances.put(customer_id, balance)
+                balances[customer_id] = balance
+        
+        return balances
+    
+    def invalidate_balance(self, customer_id):
+        """Forget a cached balance after a dinau sale or payment"""
+        self.balances.pop(customer_id)
+    
+    def invalidate_customer(self, customer_id):
+        """Forget everything cached about a customer"""
+        self.recent.pop(customer_id)
+        self.balances.pop(customer_id)
+    
+    def watch(self, changes):
+        """Keep the caches current from a database change feed"""
+        changes.subscribe(self.on_changes, (SaleCreated, DinauPayment, CustomerChanged))
+    
+    def on_changes(self, events):
+        """Drop cached data made stale by committed changes"""
+        for event in events:
+            if isinstance(event, CustomerChanged):
+                self.invalidate_customer(event.customer_id)
+            elif isinstance(event, DinauPayment) or event.payment_method == 'dinau':
+                self.invalidate_balance(event.customer_id)
@@ -0,0 +1,225 @@
+import re
+
+class CustomerSearchIndex:
+    """Word, trigram and phone number index for fast customer lookup
+    
+    Every customer has a customer_search row (normalized name and phone
+    digits) and one customer_name_words row per word of the name. Typo
+    tolerance works on the vocabulary of distinct name words through
+    name_word_trigrams, so fuzzy matching scales with the number of
+    different words rather than the number of customers.
+    """
+    
+    # Most vocabulary words a single search word expands to
+    MAX_WORD_EXPANSIONS = 8
+    
+    # Lowest trigram similarity for a vocabulary word to count as a typo match
+    MIN_WORD_SIMILARITY = 0.3
+    
+    @staticmethod
+    def normalize_name(name):
+        """Lowercase a name and collapse punctuation and whitespace"""
+        return " ".join(re.sub(r"[^\w]+", " ", (name or "").lower()).split())
+    
+    @staticmethod
+    def phone_digits(phone):
+        """Strip everything but digits from a phone number"""
+        return re.sub(r"\D", "", phone or "")
+    
+    @staticmethod
+    def trigrams(word):
+        """Get the set of padded trigrams of a single word"""
+        padded = f"  {word} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    
+    @staticmethod
+    def is_phone_query(search_term):
+        """Check whether a search term looks like a phone number"""
+        stripped = re.sub(r"[\s+()\-]", "", search_term)
+        return stripped.isdigit()
+    
+    @staticmethod
+    def index_customer(cursor, customer_id, name, phone):
+        """Add or refresh a customer's search entries"""
+        name_norm = CustomerSearchIndex.normalize_name(name)
+        words = set(name_norm.split())
+        
+        cursor.execute('DELETE FROM customer_name_words WHERE customer_id = ?', (customer_id,))
+        cursor.execute('''
+            INSERT OR REPLACE INTO customer_search (customer_id, name_norm, phone_digits)
+            VALUES (?, ?, ?)
+        ''', (customer_id, name_norm, CustomerSearchIndex.phone_digits(phone)))
+        cursor.executemany('''
+            INSERT INTO customer_name_words (word, customer_id)
+            VALUES (?, ?)
+        ''', [(word, customer_id) for word in words])
+        
+        # Grow the word vocabulary; words are never removed, a stale word
+        # simply no longer leads to any customer
+        for word in words:
+            trigrams = CustomerSearchIndex.trigrams(word)
+            cursor.executemany('''
+                INSERT OR IGNORE INTO name_word_trigrams (trigram, word, trigram_count)
+                VALUES (?, ?, ?)
+            ''', [(trigram, word, len(trigrams)) for trigram in trigrams])
+    
+    @staticmethod
+    def remove_customer(cursor, customer_id):
+        """Drop a customer from the search index"""
+        cursor.execute('DELETE FROM customer_name_words WHERE customer_id = ?', (customer_id,))
+        cursor.execute('DELETE FROM customer_search WHERE customer_id = ?', (customer_id,))
+    
+    @staticmethod
+    def index_missing_customers(conn):
+        """Index active customers that have no search entries yet"""
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT c.id, c.name, c.phone
+            FROM customers c
+            LEFT JOIN customer_search cs ON cs.customer_id = c.id
+            WHERE cs.customer_id IS NULL AND c.is_active = 1
+        ''')
+        missing = cursor.fetchall()
+        
+        for customer_id, name, phone in missing:
+            CustomerSearchIndex.index_customer(cursor, customer_id, name, phone)
+        
+        conn.commit()
+        return len(missing)
+    
+    @staticmethod
+    def expand_word(cursor, word):
+        """Map a search word to similar vocabulary words with a match score"""
+        expansions = {}
+        
+        # Words starting with the search word; the word-initial trigram
+        # (" la" for "la...") narrows the range scan to the right words
+        padded = f"  {word}"
+        start_trigram = padded[1:4] if len(word) >= 2 else padded[0:3]
+        cursor.execute('''
+            SELECT word FROM name_word_trigrams
+            WHERE trigram = ? AND word >= ? AND word < ?
+            ORDER BY length(word)
+            LIMIT ?
+        ''', (start_trigram, word, word + "\uffff", CustomerSearchIndex.MAX_WORD_EXPANSIONS))
+        for (candidate,) in cursor.fetchall():
+            expansions[candidate] = 1.0 if candidate == word else 0.9
+        
+        # Misspellings: vocabulary words sharing enough trigrams
+        if len(word) >= 3:
+            trigrams = CustomerSearchIndex.trigrams(word)
+            placeholders = ",".join("?" * len(trigrams))
+            cursor.execute(f'''
+                SELECT word, COUNT(*) * 1.0 / (? + MAX(trigram_count) - COUNT(*)) as similarity
+                FROM name_word_trigrams
+                WHERE trigram IN ({placeholders})
+                GROUP BY word
+                HAVING similarity >= ?
+                ORDER BY similarity DESC
+                LIMIT ?
+            ''', (len(trigrams), *trigrams, CustomerSearchIndex.MIN_WORD_SIMILARITY,
+                  CustomerSearchIndex.MAX_WORD_EXPANSIONS))
+            for candidate, similarity in cursor.fetchall():
+                expansions.setdefault(candidate, 0.8 * similarity)
+        
+        return expansions
+    
+    @staticmethod
+    def search(cursor, search_term, limit=50):
+        """Get the ids of the customers best matching a search term, best first"""
+        if CustomerSearchIndex.is_phone_query(search_term):
+            digits = CustomerSearchIndex.phone_digits(search_term)
+            cursor.execute('''
+                SELECT customer_id FROM customer_search
+                WHERE phone_digits >= ? AND phone_digits < ?
+                ORDER BY phone_digits
+                LIMIT ?
+            ''', (digits, digits + ":", limit))
+            return [row[0] for row in cursor.fetchall()]
+        
+        query_words = CustomerSearchIndex.normalize_name(search_term).split()
+        expansions = [CustomerSearchIndex.expand_word(cursor, word) for word in query_words]
+        expansions = [expansion for expansion in expansions if expansion]
+        
+        if not expansions:
+            return []
+        
+        matches = CustomerSearchIndex.match_all_words(cursor, expansions, limit)
+        if matches or len(expansions) == 1:
+            return matches
+        
+        return CustomerSearchIndex.match_most_words(cursor, expansions, limit)
+    
+    @staticmethod
+    def posting_count(cursor, words, cap=1000):
+        """Count (up to cap) the customers having any of the given name words"""
+        placeholders = ",".join("?" * len(words))
+        cursor.execute(f'''
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM customer_name_words WHERE word IN ({placeholders}) LIMIT ?
+            )
+        ''', (*words, cap))
+        return cursor.fetchone()[0]
+    
+    @staticmethod
+    def match_all_words(cursor, expansions, limit):
+        """Find customers matching every search word, best driver word first
+        
+        The search word with the fewest customers drives the lookup and the
+        other words are probed per candidate, so the cost is bounded by the
+        rarest word and the LIMIT instead of by every matching customer.
+        """
+        if len(expansions) > 1:
+            expansions = sorted(expansions, key=lambda e: CustomerSearchIndex.posting_count(cursor, list(e)))
+        driver, others = expansions[0], expansions[1:]
+        
+        conditions = ""
+        other_params = []
+        for expansion in others:
+            placeholders = ",".join("?" * len(expansion))
+            conditions += f'''
+                AND EXISTS (
+                    SELECT 1 FROM customer_name_words o
+                    WHERE o.word IN ({placeholders}) AND o.customer_id = d.customer_id
+                )'''
+            other_params.extend(expansion)
+        
+        matches = []
+        for word, score in sorted(driver.items(), key=lambda item: item[1], reverse=True):
+            cursor.execute(f'''
+                SELECT d.customer_id FROM customer_name_words d
+                WHERE d.word = ? {conditions}
+                LIMIT ?
+            ''', (word, *other_params, limit - len(matches)))
+            matches.extend(row[0] for row in cursor.fetchall() if row[0] not in matches)
+            if len(matches) >= limit:
+                break
+        
+        return matches
+    
+    @staticmethod
+    def match_most_words(cursor, expansions, limit):
+        """Rank customers by how many search words they match, then by closeness"""
+        terms = [
+            (position, word, score)
+            for position, expansion in enumerate(expansions)
+            for word, score in expansion.items()
+        ]
+        
+        values = ",".join("(?, ?, ?)" for _ in terms)
+        cursor.execute(f'''
+            WITH terms(position, word, score) AS (VALUES {values})
+            SELECT customer_id
+            FROM (
+                SELECT w.customer_id, t.position, MAX(t.score) as score
+                FROM terms t
+                JOIN customer_name_words w ON w.word = t.word
+                GROUP BY w.customer_id, t.position
+            )
+            GROUP BY customer_id
+            ORDER BY COUNT(*) DESC, SUM(score) DESC
+            LIMIT ?
+        ''', (*[value for term in terms for value in term], limit))
+        
+        return [row[0] for row in cursor.fetchall()]
@@ -1,57 +1,421 @@
 import sqlite3
-import hashlib
+from collections import namedtuple
 from datetime import datetime
 import os
+import threading
+import time
 from .models import DatabaseModels
+from .migrations import MigrationRunner
+from .customer_search import CustomerSearchIndex
+from .query_stats import QueryStats, TimedConnection, timed_methods, untimed
+from .auth import PasswordHasher, SessionCache
+from .concurrency import InsufficientStockError, StockShortage, retry_on_busy
+from .archive import SalesArchive
+from .events import (
+    CatalogChanged, ChangeFeed, CustomerChanged, DinauPayment, ProductChanged, SaleCreated, StockChanged
+)
 
+MergeResult = namedtuple("MergeResult", ["merged", "conflicts"])
+MergeConflict = namedtuple("MergeConflict", ["table", "id", "uid", "reason"])
+
+@timed_methods
 class DatabaseManager:
     """Database manager for handling all database operations"""
     
-    def __init__(self, db_path="store_pos.db"):
+    # Sale numbers handed out in this process (see generate_sale_number)
+    _sale_number_lock = threading.Lock()
+    _last_sale_stamp = None
+    _sale_sequence = 0
+    
+    # Several tills on one machine can share the database file: WAL lets
+    # them read while one of them writes. A database on a network share
+    # needs "DELETE" instead, as WAL only works on a local disk.
+    journal_mode = "WAL"
+    # Seconds a connection waits for another till's write lock
+    busy_timeout = 5.0
+    # Free pages can be returned to the file system a few at a time
+    # (database/maintenance.py). Only applies to a new database file.
+    auto_vacuum = "INCREMENTAL"
+    
+    # Tables that can be synced with changes_since, with their data version
+    # counter and the columns sent. Rows keep their id on every database.
+    DELTA_TABLES = {
+        "products": ("catalog", ["id", "uid", "barcode", "name", "description", "category", "price",
+                                 "cost_price", "stock_quantity", "min_stock_level", "is_active"]),
+        "customers": ("customers", ["id", "uid", "name", "phone", "email", "address", "is_active"])
+    }
+    # Columns by which a row from before its database synced is recognised
+    # as the hub's row with the same id (see apply_changes)
+    SAME_ROW_COLUMNS = {
+        "products": ("barcode",),
+        "customers": ("name", "phone")
+    }
+    
+    def __init__(self, db_path="store_pos.db", till_id=None):
         self.db_path = db_path
+        # Set on each till sharing a database, to keep their sale numbers apart
+        self.till_id = till_id
+        # Set by the SyncClient of a till with its own database: products
+        # and customers are then added, changed and deleted at the store
+        # hub, so every till has the hub's ids and details
+        self.hub = None
+        # Committed changes are published here for caches and screens
+        self.changes = ChangeFeed()
+        # Latency of every method, statement and connection open, with a slow query log
+        self.stats = QueryStats()
+        # Password and PIN hashing, and the users verified on this till
+        self.passwords = PasswordHasher()
+        self.sessions = SessionCache()
+        # Sales history of closed periods, in yearly archive databases
+        self.archive = SalesArchive(self)
         self.init_database()
     
     def init_database(self):
         """Initialize database and create tables"""
+        started = time.perf_counter()
+        conn = self.get_connection()
+        if self.auto_vacuum:
+            conn.execute(f'PRAGMA auto_vacuum={self.auto_vacuum}')
+        if self.journal_mode:
+            conn.execute(f'PRAGMA journal_mode={self.journal_mode}').fetchall()
+        connected = time.perf_counter()
+        
+        # Nothing to do beyond one query each when the schema is current
+        self.schema_upgraded = DatabaseModels.ensure_schema(conn)
+        checked = time.perf_counter()
+        self.migrations_applied = MigrationRunner(conn).run()
+        migrated = time.perf_counter()
+        
+        # Customers added before the search index existed
+        if self.schema_upgraded:
+            CustomerSearchIndex.index_missing_customers(conn)
+        conn.close()
+        finished = time.perf_counter()
+        
+        # Startup cost in milliseconds, for profiling cold starts on slow devices
+        self.startup_timings = {
+            "connect": (connected - started) * 1000,
+            "schema": (checked - connected) * 1000,
+            "migrations": (migrated - checked) * 1000,
+            "search_index": (finished - migrated) * 1000,
+            "total": (finished - started) * 1000
+        }
+    
+    @untimed
+    def get_connection(self, history=False):
+        """Get database connection
+        
+        A history connection also reads the archived sales: it has the views
+        all_sales, all_sale_items, all_inventory_movements and
+        all_dinau_transactions over the live tables and the archives.
+        """
+        if not self.stats.enabled:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        else:
+            started = time.perf_counter()
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, factory=TimedConnection)
+            conn.stats = self.stats
+            self.stats.record_connect((time.perf_counter() - started) * 1000)
+        
+        if history:
+            self.archive.attach(conn)
+        return conn
+    
+    # Data versions: 'catalog' and 'customers' advance on every product or
+    # customer change and the changed row stores the new value; 'stock'
+    # advances when stock quantities change. A cache that remembers the
+    # version it was loaded at is stale exactly when the counter moved on.
+    def bump_data_version(self, cursor, name):
+        """Advance a data version counter in the current transaction and return the new value"""
+        cursor.execute('UPDATE data_versions SET version = version + 1 WHERE name = ?', (name,))
+        cursor.execute('SELECT version FROM data_versions WHERE name = ?', (name,))
+        return cursor.fetchone()[0]
+    
+    def get_data_version(self, name):
+        """Get the current value of a data version counter"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT version FROM data_versions WHERE name = ?', (name,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else 0
+    
+    def get_data_versions(self):
+        """Get all data version counters as a dict"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT name, version FROM data_versions')
+        versions = dict(cursor.fetchall())
+        conn.close()
+        return versions
+    
+    def changes_since(self, table, version, limit=None):
+        """Get the rows of a delta table changed after a data version
+        
+        Returns a dict with the table, its columns, the changed rows (deleted
+        ones have is_active 0) oldest first, the version to ask from next
+        time, and whether more rows are left. A page never splits the rows
+        of one version, so it can hold a few more than limit.
+        """
+        counter, columns = self.DELTA_TABLES[table]
         conn = self.get_connection()
-        DatabaseModels.create_tables(conn)
-        DatabaseModels.create_default_data(conn)
+        cursor = conn.cursor()
+        
+        # One read transaction, so the returned version matches the rows
+        cursor.execute('BEGIN')
+        cursor.execute('SELECT version FROM data_versions WHERE name = ?', (counter,))
+        current = cursor.fetchone()[0]
+        
+        select = f'SELECT {", ".join(columns)}, version FROM {table}'
+        if limit is None:
+            cursor.execute(f'{select} WHERE version > ? ORDER BY version, id', (version,))
+        else:
+            cursor.execute(f'{select} WHERE version > ? ORDER BY version, id LIMIT ?', (version, limit))
+        rows = cursor.fetchall()
+        
+        more = limit is not None and len(rows) == limit
+        if more:
+            last_version, last_id = rows[-1][-1], rows[-1][0]
+            cursor.execute(f'{select} WHERE version = ? AND id > ? ORDER BY id', (last_version, last_id))
+            rows.extend(cursor.fetchall())
+            cursor.execute(f'SELECT 1 FROM {table} WHERE version > ? LIMIT 1', (last_version,))
+            more = cursor.fetchone() is not None
+            current = last_version if more else current
+        
+        conn.rollback()
         conn.close()
+        return {
+            'table': table,
+            'columns': columns,
+            'rows': [list(row[:-1]) for row in rows],
+            'version': current,
+            'more': more
+        }
+    
+    def apply_changes(self, deltas):
+        """Merge deltas from changes_since of the hub, all in one transaction
+        
+        Rows are inserted or updated by id and get a new local version; a
+        local row is only updated with a delta row that has its uid. A row
+        from before this database synced (and so without the hub's uid) is
+        taken for the delta row with its id if it has the same barcode
+        (products) or name and phone (customers), and gets its uid. Other
+        delta rows whose id, uid or barcode is held by a different local
+        row are refused and returned as conflicts; the rest of the deltas
+        are still merged. Stock quantities are only taken for new products;
+        existing stock is kept, as it moves with sales and movements.
+        Returns a MergeResult with the number of rows merged per table and
+        the conflicts.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        events = []
+        merged = {}
+        conflicts = []
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            for delta in deltas:
+                table = delta['table']
+                counter, columns = self.DELTA_TABLES[table]
+                if delta['columns'] != columns:
+                    raise ValueError(f"Delta of {table} has columns {delta['columns']}")
+                merged.setdefault(table, 0)
+                if not delta['rows']:
+                    continue
+                
+                kept = {"id", "stock_quantity"}
+                updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in kept)
+                upsert = f'''
+                    INSERT INTO {table} ({", ".join(columns)}, version)
+                    VALUES ({", ".join("?" * len(columns))}, ?)
+                    ON CONFLICT(id) DO UPDATE SET {updates}, version = excluded.version
+                '''
+                
+                # One catalog version for the whole delta, as for a bulk import
+                version = self.bump_data_version(cursor, counter) if table == "products" else None
+                for row in delta['rows']:
+                    values = dict(zip(columns, row))
+                    reason = self._merge_conflict(cursor, table, values)
+                    if reason:
+                        conflicts.append(MergeConflict(table, values['id'], values['uid'], reason))
+                        continue
+                    
+                    merged[table] += 1
+                    if table == "products":
+                        cursor.execute(upsert, list(row) + [version])
+                        continue
+                    
+                    version = self.bump_data_version(cursor, counter)
+                    cursor.execute(upsert, list(row) + [version])
+                    if values['is_active']:
+                        CustomerSearchIndex.index_customer(cursor, values['id'], values['name'], values['phone'])
+                    else:
+                        CustomerSearchIndex.remove_customer(cursor, values['id'])
+                    events.append(CustomerChanged(values['id'], version, not values['is_active']))
+                
+                if table == "products":
+                    events.append(CatalogChanged(version))
+            
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            raise e
+        
+        self.changes.publish(events)
+        return MergeResult(merged, conflicts)
     
-    def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+    def _merge_conflict(self, cursor, table, values):
+        """Why a delta row cannot be merged into this database, or None"""
+        kind = table[:-1]
+        cursor.execute(f'SELECT id FROM {table} WHERE uid = ?', (values['uid'],))
+        row = cursor.fetchone()
+        if row and row[0] != values['id']:
+            return f"{kind} {values['uid']} has id {row[0]} here"
+        
+        if not row:
+            same_row = self.SAME_ROW_COLUMNS[table]
+            cursor.execute(f'SELECT {", ".join(same_row)} FROM {table} WHERE id = ?', (values['id'],))
+            local = cursor.fetchone()
+            if local and list(local) != [values[column] for column in same_row]:
+                return f"{kind} {values['id']} is a different {kind} here: {', '.join(map(str, local))}"
+        
+        if table == "products":
+            cursor.execute('SELECT id FROM products WHERE barcode = ? AND id != ?', (values['barcode'], values['id']))
+            row = cursor.fetchone()
+            if row:
+                return f"barcode {values['barcode']} belongs to product {row[0]} here"
+        return None
     
     # User management methods
     def authenticate_user(self, username, password):
-        """Authenticate user login"""
+        """Authenticate user login and start their session on this till"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
         cursor.execute('''
-            SELECT id, username, role, full_name FROM users 
-            WHERE username = ? AND password_hash = ? AND is_active = 1
-        ''', (username, password_hash))
+            SELECT id, username, role, full_name, password_hash FROM users 
+            WHERE username = ? AND is_active = 1
+        ''', (username,))
         
         user = cursor.fetchone()
+        if not user:
+            conn.close()
+            self.passwords.dummy_verify(password)
+            return None
+        
+        if not self.passwords.verify(password, user[4]):
+            conn.close()
+            return None
+        
+        # Replace unsalted or weaker hashes now that the password is known
+        if self.passwords.needs_rehash(user[4]):
+            try:
+                cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+                               (self.passwords.hash(password), user[0]))
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Error upgrading password hash: {e}")
         conn.close()
         
-        if user:
-            return {
-                'id': user[0],
-                'username': user[1],
-                'role': user[2],
-                'full_name': user[3]
-            }
-        return None
+        user_data = {
+            'id': user[0],
+            'username': user[1],
+            'role': user[2],
+            'full_name': user[3]
+        }
+        self.sessions.start(user_data)
+        return user_data
+    
+    def switch_user(self, username, pin):
+        """Switch back to a user who logged in with their password this session, by PIN
+        
+        Returns the user data, or None when the PIN is wrong or the user has
+        no session. Only the first switch of a session reads the stored PIN
+        hash; later ones are checked in memory.
+        """
+        user_data = self.sessions.get(username)
+        if user_data is None:
+            return None
+        
+        if not self._check_pin(user_data, pin):
+            self.sessions.pin_failed(username)
+            return None
+        return user_data
+    
+    def login(self, username, secret):
+        """Log a user in by password, or by PIN when they have a session on this till
+        
+        An all-digit secret is tried as the PIN first, but only for a user
+        with a live session and a PIN set. A wrong PIN counts against the
+        session only when the secret is not the password either.
+        """
+        user_data = self.sessions.get(username) if secret.isdigit() else None
+        pin_ok = self._check_pin(user_data, secret) if user_data else None
+        if pin_ok:
+            return user_data
+        
+        user_data = self.authenticate_user(username, secret)
+        if user_data is None and pin_ok is False:
+            self.sessions.pin_failed(username)
+        return user_data
+    
+    def _check_pin(self, user_data, pin):
+        """Check a session user's PIN: True, False, or None when they have no PIN"""
+        verified = self.sessions.check_pin(user_data['username'], pin)
+        if verified is not None:
+            return verified
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT pin_hash FROM users WHERE id = ? AND is_active = 1', (user_data['id'],))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not (row and row[0]):
+            return None
+        verified = self.passwords.verify(pin, row[0])
+        if verified:
+            self.sessions.remember_pin(user_data['username'], pin)
+        return verified
+    
+    def set_user_pin(self, user_id, pin):
+        """Set the PIN a user switches back in with (4 to 8 digits)"""
+        if not (pin.isdigit() and 4 <= len(pin) <= 8):
+            raise ValueError("PIN must be 4 to 8 digits")
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('UPDATE users SET pin_hash = ? WHERE id = ?', (self.passwords.hash(pin), user_id))
+            updated = cursor.rowcount > 0
+            cursor.execute('SELECT username FROM users WHERE id = ?', (user_id,))
+            user = cursor.fetchone()
+            conn.commit()
+            conn.close()
+            
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            raise e
+        
+        if updated:
+            self.sessions.remember_pin(user[0], pin)
+        return updated
     
     def create_user(self, username, password, role, full_name):
         """Create new user"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        password_hash = self.passwords.hash(password)
         try:
             cursor.execute('''
                 INSERT INTO users (username, password_hash, role, full_name)
@@ -81,23 +445,89 @@ class DatabaseManager:
     
     # Product management methods
     def add_product(self, barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level=5):
-        """Add new product"""
+        """Add new product (at the store hub on a sync till); returns None if the barcode is taken"""
+        if self.hub is not None:
+            return self.hub.add_product(barcode, name, description, category, price, cost_price,
+                                        stock_quantity, min_stock_level)
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
+            version = self.bump_data_version(cursor, "catalog")
             cursor.execute('''
-                INSERT INTO products (barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level))
+                INSERT INTO products (barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level, version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level, version))
             conn.commit()
             product_id = cursor.lastrowid
             conn.close()
+            self.changes.publish([ProductChanged(product_id, version, False)])
             return product_id
         except sqlite3.IntegrityError:
+            conn.rollback()
             conn.close()
             return None
     
+    def update_product(self, product_id, barcode, name, description, category, price, cost_price, min_stock_level):
+        """Update a product's details (stock is changed with update_product_stock)
+        
+        Returns False if the product does not exist or the barcode is taken.
+        """
+        if self.hub is not None:
+            return self.hub.update_product(product_id, barcode, name, description, category, price, cost_price,
+                                           min_stock_level)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            version = self.bump_data_version(cursor, "catalog")
+            cursor.execute('''
+                UPDATE products
+                SET barcode = ?, name = ?, description = ?, category = ?, price = ?, cost_price = ?,
+                    min_stock_level = ?, version = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND is_active = 1
+            ''', (barcode, name, description, category, price, cost_price, min_stock_level, version, product_id))
+            
+            if cursor.rowcount == 0:
+                conn.rollback()
+                conn.close()
+                return False
+            
+            conn.commit()
+            conn.close()
+            self.changes.publish([ProductChanged(product_id, version, False)])
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            conn.close()
+            return False
+    
+    def delete_product(self, product_id):
+        """Soft delete a product; its sales history is kept"""
+        if self.hub is not None:
+            return self.hub.delete_product(product_id)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        version = self.bump_data_version(cursor, "catalog")
+        cursor.execute('''
+            UPDATE products SET is_active = 0, version = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND is_active = 1
+        ''', (version, product_id))
+        
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return False
+        
+        conn.commit()
+        conn.close()
+        self.changes.publish([ProductChanged(product_id, version, True)])
+        return True
+    
     def get_product_by_barcode(self, barcode):
         """Get product by barcode"""
         conn = self.get_connection()
@@ -156,32 +586,86 @@ class DatabaseManager:
         conn.close()
         return products
     
-    def update_product_stock(self, product_id, new_quantity, user_id, reason="Manual adjustment"):
-        """Update product stock quantity"""
+    def get_products_by_ids(self, product_ids):
+        """Get several active products by id"""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return []
+        
         conn = self.get_connection()
         cursor = conn.cursor()
+        products = []
         
-        # Get current stock
-        cursor.execute('SELECT stock_quantity FROM products WHERE id = ?', (product_id,))
-        current_stock = cursor.fetchone()[0]
+        for start in range(0, len(product_ids), 500):
+            part = product_ids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            cursor.execute(f'''
+                SELECT id, barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level
+                FROM products WHERE id IN ({placeholders}) AND is_active = 1
+            ''', part)
+            products.extend(cursor.fetchall())
         
-        # Update stock
-        cursor.execute('''
-            UPDATE products SET stock_quantity = ?, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = ?
-        ''', (new_quantity, product_id))
-        
-        # Record inventory movement
-        movement_type = "adjustment"
-        quantity_change = new_quantity - current_stock
+        conn.close()
+        return products
+    
+    def update_product_stock(self, product_id, new_quantity, user_id, reason="Manual adjustment",
+                             expected_quantity=None):
+        """Update product stock quantity
         
-        cursor.execute('''
-            INSERT INTO inventory_movements (product_id, movement_type, quantity, reason, user_id)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (product_id, movement_type, quantity_change, reason, user_id))
+        With expected_quantity, the update only happens if the stock is still
+        that quantity, i.e. no other till sold or counted the product since it
+        was read; returns False if it was changed.
+        """
+        def attempt():
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                # Hold the write lock from the read, so a sale cannot slip in between
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                # Get current stock
+                cursor.execute('SELECT stock_quantity FROM products WHERE id = ?', (product_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValueError(f"Product {product_id} does not exist")
+                current_stock = row[0]
+                
+                if expected_quantity is not None and current_stock != expected_quantity:
+                    conn.rollback()
+                    conn.close()
+                    return None
+                
+                # Update stock
+                cursor.execute('''
+                    UPDATE products SET stock_quantity = ?, updated_at = CURRENT_TIMESTAMP 
+                    WHERE id = ?
+                ''', (new_quantity, product_id))
+                version = self.bump_data_version(cursor, "stock")
+                
+                # Record inventory movement
+                movement_type = "adjustment"
+                quantity_change = new_quantity - current_stock
+                
+                cursor.execute('''
+                    INSERT INTO inventory_movements (product_id, movement_type, quantity, reason, user_id)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (product_id, movement_type, quantity_change, reason, user_id))
+                
+                conn.commit()
+                conn.close()
+                return version
+                
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                raise e
         
-        conn.commit()
-        conn.close()
+        version = retry_on_busy(attempt)
+        if version is None:
+            return False
+        self.changes.publish([StockChanged((product_id,), version)])
+        return True
     
     def get_low_stock_products(self):
         """Get products with stock below minimum level"""
@@ -201,35 +685,100 @@ class DatabaseManager:
     
     # Customer management methods
     def add_customer(self, name, phone="", email="", address=""):
-        """Add new customer"""
+        """Add new customer (at the store hub on a sync till)"""
+        if self.hub is not None:
+            return self.hub.add_customer(name, phone, email, address)
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        version = self.bump_data_version(cursor, "customers")
         cursor.execute('''
-            INSERT INTO customers (name, phone, email, address)
-            VALUES (?, ?, ?, ?)
-        ''', (name, phone, email, address))
+            INSERT INTO customers (name, phone, email, address, version)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (name, phone, email, address, version))
         
-        conn.commit()
         customer_id = cursor.lastrowid
+        CustomerSearchIndex.index_customer(cursor, customer_id, name, phone)
+        
+        conn.commit()
         conn.close()
+        self.changes.publish([CustomerChanged(customer_id, version, False)])
         return customer_id
     
-    def search_customers(self, search_term):
-        """Search customers by name or phone"""
+    def update_customer(self, customer_id, name, phone="", email="", address=""):
+        """Update a customer's details; returns False if the customer does not exist"""
+        if self.hub is not None:
+            return self.hub.update_customer(customer_id, name, phone, email, address)
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        version = self.bump_data_version(cursor, "customers")
         cursor.execute('''
-            SELECT id, name, phone, email, address
-            FROM customers 
-            WHERE (name LIKE ? OR phone LIKE ?) AND is_active = 1
-            ORDER BY name
-        ''', (f'%{search_term}%', f'%{search_term}%'))
+            UPDATE customers SET name = ?, phone = ?, email = ?, address = ?, version = ?
+            WHERE id = ? AND is_active = 1
+        ''', (name, phone, email, address, version, customer_id))
         
-        customers = cursor.fetchall()
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return False
+        
+        CustomerSearchIndex.index_customer(cursor, customer_id, name, phone)
+        
+        conn.commit()
         conn.close()
-        return customers
+        self.changes.publish([CustomerChanged(customer_id, version, False)])
+        return True
+    
+    def delete_customer(self, customer_id):
+        """Soft delete a customer; their sales and dinau history are kept"""
+        if self.hub is not None:
+            return self.hub.delete_customer(customer_id)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        version = self.bump_data_version(cursor, "customers")
+        cursor.execute('''
+            UPDATE customers SET is_active = 0, version = ?
+            WHERE id = ? AND is_active = 1
+        ''', (version, customer_id))
+        
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return False
+        
+        CustomerSearchIndex.remove_customer(cursor, customer_id)
+        
+        conn.commit()
+        conn.close()
+        self.changes.publish([CustomerChanged(customer_id, version, True)])
+        return True
+    
+    def search_customers(self, search_term, limit=50):
+        """Search customers by name (typo tolerant) or phone number prefix"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        customer_ids = CustomerSearchIndex.search(cursor, search_term, limit)
+        if not customer_ids:
+            conn.close()
+            return []
+        
+        placeholders = ",".join("?" * len(customer_ids))
+        cursor.execute(f'''
+            SELECT id, name, phone, email, address, created_at
+            FROM customers
+            WHERE id IN ({placeholders}) AND is_active = 1
+        ''', customer_ids)
+        
+        # Keep the ranking order of the search index
+        customers_by_id = {customer[0]: customer for customer in cursor.fetchall()}
+        conn.close()
+        return [customers_by_id[customer_id] for customer_id in customer_ids if customer_id in customers_by_id]
     
     def get_all_customers(self):
         """Get all active customers"""
@@ -245,64 +794,438 @@ class DatabaseManager:
         conn.close()
         return customers
     
+    def get_customer_by_id(self, customer_id):
+        """Get customer by ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, name, phone, email, address, created_at
+            FROM customers WHERE id = ? AND is_active = 1
+        ''', (customer_id,))
+        
+        customer = cursor.fetchone()
+        conn.close()
+        return customer
+    
+    # Customer purchase history methods
+    def get_customer_purchase_history(self, customer_id, limit=20, before_sale_id=None):
+        """Get a page of a customer's purchases, newest first
+        
+        Pages are keyed on the sale id: pass the id of the last row of the
+        previous page as before_sale_id to fetch the next page.
+        """
+        conn = self.get_connection(history=True)
+        cursor = conn.cursor()
+        
+        query = '''
+            SELECT s.id, s.sale_number, s.total_amount, s.payment_method, s.created_at,
+                   (SELECT COUNT(*) FROM all_sale_items si WHERE si.sale_id = s.id) as item_count
+            FROM all_sales s
+            WHERE s.customer_id = ?
+        '''
+        params = [customer_id]
+        
+        if before_sale_id is not None:
+            query += ' AND s.id < ?'
+            params.append(before_sale_id)
+        
+        query += ' ORDER BY s.id DESC LIMIT ?'
+        params.append(limit)
+        
+        cursor.execute(query, params)
+        sales = cursor.fetchall()
+        conn.close()
+        return sales
+    
+    def get_customer_purchase_summary(self, customer_id):
+        """Get total spent and visit frequency for a customer"""
+        conn = self.get_connection(history=True)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT COUNT(*), SUM(total_amount), MIN(created_at), MAX(created_at),
+                   julianday(MAX(created_at)) - julianday(MIN(created_at))
+            FROM all_sales
+            WHERE customer_id = ?
+        ''', (customer_id,))
+        
+        sale_count, total_spent, first_purchase, last_purchase, span_days = cursor.fetchone()
+        conn.close()
+        
+        total_spent = total_spent or 0.0
+        
+        return {
+            'sale_count': sale_count,
+            'total_spent': total_spent,
+            'average_sale': total_spent / sale_count if sale_count else 0.0,
+            'first_purchase': first_purchase,
+            'last_purchase': last_purchase,
+            'avg_days_between_visits': span_days / (sale_count - 1) if sale_count > 1 else None
+        }
+    
+    def get_customer_top_products(self, customer_id, limit=5):
+        """Get the products a customer buys most, by quantity"""
+        conn = self.get_connection(history=True)
+        cursor = conn.cursor()
+        
+        # Aggregate on the covering indexes first, then look up product names
+        cursor.execute('''
+            SELECT p.id, p.name, t.total_quantity, t.total_spent
+            FROM (
+                SELECT si.product_id, SUM(si.quantity) as total_quantity, SUM(si.total_price) as total_spent
+                FROM all_sales s
+                JOIN all_sale_items si ON si.sale_id = s.id
+                WHERE s.customer_id = ?
+                GROUP BY si.product_id
+            ) t
+            JOIN products p ON p.id = t.product_id
+            ORDER BY t.total_quantity DESC, t.total_spent DESC
+            LIMIT ?
+        ''', (customer_id, limit))
+        
+        products = cursor.fetchall()
+        conn.close()
+        return products
+    
     # Sales management methods
+    def generate_sale_number(self):
+        """Generate a sale number that is unique even for sales in the same second"""
+        with DatabaseManager._sale_number_lock:
+            stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+            prefix = f"SALE{stamp}" if self.till_id is None else f"SALE{stamp}-T{self.till_id}"
+            if prefix != DatabaseManager._last_sale_stamp:
+                # Continue after sales saved this second by an earlier run
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*) FROM sales
+                    WHERE sale_number >= ? AND sale_number < ?
+                ''', (prefix, f"{prefix}."))
+                DatabaseManager._sale_sequence = cursor.fetchone()[0]
+                DatabaseManager._last_sale_stamp = prefix
+                conn.close()
+            
+            DatabaseManager._sale_sequence += 1
+            if DatabaseManager._sale_sequence == 1:
+                return prefix
+            return f"{prefix}-{DatabaseManager._sale_sequence}"
+    
     def create_sale(self, user_id, customer_id, total_amount, payment_method, cart_items, eftpos_receipt_path=None):
-        """Create new sale transaction"""
+        """Create new sale transaction
+        
+        Raises InsufficientStockError, and saves nothing, if a product does
+        not have enough stock left, e.g. because another till sold it first.
+        """
+        # Generate sale number
+        sale_number = self.generate_sale_number()
+        
+        def attempt():
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                events = []
+                cursor.execute('BEGIN IMMEDIATE')
+                sale_id = self._insert_sale(cursor, sale_number, user_id, customer_id, total_amount,
+                                            payment_method, cart_items, eftpos_receipt_path, events=events)
+                
+                conn.commit()
+                conn.close()
+                self.changes.publish(events)
+                return sale_id, sale_number
+                
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                raise e
+        
+        return retry_on_busy(attempt)
+    
+    def check_stock(self, cart_items, held=None):
+        """Get the shortages of a cart against the stock left, without writing anything
+        
+        held maps product ids to quantities already sold but not saved yet
+        (see SaleJournal.pending_quantities). This is a quick check at
+        checkout; the sale still takes its stock with a conditional update
+        when it is saved. Returns a list of StockShortage, empty if the
+        whole cart is in stock.
+        """
+        wanted = {}
+        for item in cart_items:
+            wanted[item['product_id']] = wanted.get(item['product_id'], 0) + item['quantity']
+        if not wanted:
+            return []
+        
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, name, stock_quantity FROM products
+            WHERE id IN ({",".join("?" * len(wanted))})
+        ''', list(wanted))
+        stock = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        conn.close()
         
-        # Generate sale number
-        sale_number = f"SALE{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        shortages = []
+        for product_id, quantity in wanted.items():
+            name, left = stock.get(product_id, (None, 0))
+            available = left - (held or {}).get(product_id, 0)
+            if quantity > available:
+                shortages.append(StockShortage(product_id, name, quantity, max(available, 0)))
+        return shortages
+    
+    def reserve_stock(self, cart_items):
+        """Take a cart's items out of stock ahead of saving the sale
         
-        try:
-            # Insert sale record
-            cursor.execute('''
-                INSERT INTO sales (sale_number, user_id, customer_id, total_amount, payment_method, eftpos_receipt_path, is_dinau_settled)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (sale_number, user_id, customer_id, total_amount, payment_method, eftpos_receipt_path, 1 if payment_method != 'dinau' else 0))
+        For sales saved later and journaled with stock_reserved (see
+        SaleJournal), so two tills cannot both sell the last item. Raises
+        InsufficientStockError and takes nothing if an item is short.
+        """
+        def attempt():
+            conn = self.get_connection()
+            cursor = conn.cursor()
             
-            sale_id = cursor.lastrowid
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                self._take_stock(cursor, cart_items)
+                version = self.bump_data_version(cursor, "stock")
+                
+                conn.commit()
+                conn.close()
+                return version
+                
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                raise e
+        
+        version = retry_on_busy(attempt)
+        product_ids = tuple(dict.fromkeys(item['product_id'] for item in cart_items))
+        self.changes.publish([StockChanged(product_ids, version)])
+    
+    def release_stock(self, cart_items, sale_number=None):
+        """Put back stock reserved for a sale that was not completed
+        
+        With a sale number the release is recorded in the same transaction,
+        and releasing that sale again puts nothing back. Returns whether
+        the stock was put back.
+        """
+        def attempt():
+            conn = self.get_connection()
+            cursor = conn.cursor()
             
-            # If payment method is dinau, record the loan transaction
-            if payment_method == 'dinau':
-                cursor.execute('''
-                    INSERT INTO dinau_transactions (customer_id, sale_id, transaction_type, amount, description, user_id)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (customer_id, sale_id, 'loan', total_amount, f"Goods on loan - Sale {sale_number}", user_id))
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                if sale_number is not None:
+                    cursor.execute('INSERT OR IGNORE INTO stock_releases (sale_number) VALUES (?)', (sale_number,))
+                    if cursor.rowcount == 0:
+                        conn.rollback()
+                        conn.close()
+                        return None
+                
+                cursor.executemany('''
+                    UPDATE products SET stock_quantity = stock_quantity + ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', [(item['quantity'], item['product_id']) for item in cart_items])
+                version = self.bump_data_version(cursor, "stock")
+                
+                conn.commit()
+                conn.close()
+                return version
+                
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                raise e
+        
+        version = retry_on_busy(attempt)
+        if version is None:
+            return False
+        product_ids = tuple(dict.fromkeys(item['product_id'] for item in cart_items))
+        self.changes.publish([StockChanged(product_ids, version)])
+        return True
+    
+    def create_sales(self, sales):
+        """Create several sales with a single commit, each sale atomic on its own
+        
+        Sales are dicts holding a sale_number, the create_sale arguments and
+        the cart as 'items'. Returns one result per sale: its sale id, or the
+        exception that rolled back just that sale.
+        """
+        def attempt():
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            results = []
+            events = []
             
-            # Insert sale items and update stock
-            for item in cart_items:
-                product_id = item['product_id']
-                quantity = item['quantity']
-                unit_price = item['unit_price']
-                total_price = quantity * unit_price
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
                 
-                # Insert sale item
-                cursor.execute('''
-                    INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, total_price)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (sale_id, product_id, quantity, unit_price, total_price))
+                for sale in sales:
+                    try:
+                        results.append(self._insert_sale_atomically(cursor, sale, events))
+                    except Exception as e:
+                        results.append(e)
                 
-                # Update product stock
-                cursor.execute('''
-                    UPDATE products SET stock_quantity = stock_quantity - ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (quantity, product_id))
+                conn.commit()
+                conn.close()
+                self.changes.publish(events)
+                return results
                 
-                # Record inventory movement
-                cursor.execute('''
-                    INSERT INTO inventory_movements (product_id, movement_type, quantity, reason, user_id)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (product_id, "out", -quantity, f"Sale {sale_number}", user_id))
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                raise e
+        
+        return retry_on_busy(attempt)
+    
+    def apply_journaled_sales(self, entries, oversell=False):
+        """Commit journaled sales in one transaction, skipping ones already applied
+        
+        Each sale runs in its own savepoint so a sale that cannot be applied
+        is rolled back on its own. With oversell, sales that already happened
+        elsewhere (a till's sales booked at the hub) take their stock even
+        below zero instead of failing. Returns the applied and the failed
+        entries; failed entries are paired with their error.
+        """
+        def attempt():
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            applied = []
+            failed = []
+            events = []
             
-            conn.commit()
-            conn.close()
-            return sale_id, sale_number
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                for entry in entries:
+                    cursor.execute('SELECT 1 FROM sales WHERE sale_number = ?', (entry['sale_number'],))
+                    if cursor.fetchone():
+                        continue
+                    
+                    try:
+                        self._insert_sale_atomically(cursor, entry, events, oversell)
+                        applied.append(entry)
+                    except Exception as e:
+                        failed.append((entry, e))
+                
+                conn.commit()
+                conn.close()
+                self.changes.publish(events)
+                return applied, failed
+                
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                raise e
+        
+        return retry_on_busy(attempt)
+    
+    def _insert_sale_atomically(self, cursor, sale, events=None, oversell=False):
+        """Insert a sale dict in its own savepoint so a failure leaves nothing behind"""
+        sale_events = []
+        cursor.execute('SAVEPOINT sale')
+        try:
+            sale_id = self._insert_sale(cursor, sale['sale_number'], sale['user_id'], sale['customer_id'],
+                                        sale['total_amount'], sale['payment_method'], sale['items'],
+                                        sale.get('eftpos_receipt_path'), sale.get('created_at'), sale_events,
+                                        sale.get('stock_reserved', False), oversell)
+        except Exception:
+            cursor.execute('ROLLBACK TO sale')
+            cursor.execute('RELEASE sale')
+            raise
+        
+        cursor.execute('RELEASE sale')
+        if events is not None:
+            events.extend(sale_events)
+        return sale_id
+    
+    def _insert_sale(self, cursor, sale_number, user_id, customer_id, total_amount, payment_method,
+                     cart_items, eftpos_receipt_path=None, created_at=None, events=None, stock_reserved=False,
+                     oversell=False):
+        """Insert a sale with its items, stock updates and dinau loan (no commit)
+        
+        The sale's change events are appended to events, to be published
+        once the transaction is committed. With stock_reserved, the items were
+        already taken out of stock by reserve_stock.
+        """
+        if not stock_reserved:
+            self._take_stock(cursor, cart_items, oversell)
+        
+        # Insert sale record
+        cursor.execute('''
+            INSERT INTO sales (sale_number, user_id, customer_id, total_amount, payment_method, eftpos_receipt_path, is_dinau_settled, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', (sale_number, user_id, customer_id, total_amount, payment_method, eftpos_receipt_path, 1 if payment_method != 'dinau' else 0, created_at))
+        
+        sale_id = cursor.lastrowid
+        
+        # If payment method is dinau, record the loan transaction
+        if payment_method == 'dinau':
+            cursor.execute('''
+                INSERT INTO dinau_transactions (customer_id, sale_id, transaction_type, amount, description, user_id, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', (customer_id, sale_id, 'loan', total_amount, f"Goods on loan - Sale {sale_number}", user_id, created_at))
+        
+        # Insert sale items and their stock movements
+        for item in cart_items:
+            product_id = item['product_id']
+            quantity = item['quantity']
+            unit_price = item['unit_price']
+            total_price = quantity * unit_price
             
-        except Exception as e:
-            conn.rollback()
-            conn.close()
-            raise e
+            # Insert sale item
+            cursor.execute('''
+                INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, total_price)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (sale_id, product_id, quantity, unit_price, total_price))
+            
+            # Record inventory movement
+            cursor.execute('''
+                INSERT INTO inventory_movements (product_id, movement_type, quantity, reason, user_id, created_at)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', (product_id, "out", -quantity, f"Sale {sale_number}", user_id, created_at))
+        
+        sale_events = [SaleCreated(sale_id, sale_number, customer_id, total_amount, payment_method)]
+        if cart_items and not stock_reserved:
+            version = self.bump_data_version(cursor, "stock")
+            product_ids = tuple(dict.fromkeys(item['product_id'] for item in cart_items))
+            sale_events.append(StockChanged(product_ids, version))
+        
+        if events is not None:
+            events.extend(sale_events)
+        return sale_id
+    
+    def _take_stock(self, cursor, cart_items, oversell=False):
+        """Take a cart's items out of stock, raising InsufficientStockError if any is short (no commit)
+        
+        Each update only applies while enough stock is left, so concurrent
+        tills cannot sell more than there is. The caller rolls back on error.
+        With oversell the stock is taken even below zero, for a sale that
+        already happened; the negative stock shows up in stock reports.
+        """
+        if oversell:
+            cursor.executemany('''
+                UPDATE products SET stock_quantity = stock_quantity - ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', [(item['quantity'], item['product_id']) for item in cart_items])
+            return
+        
+        shortages = []
+        for item in cart_items:
+            cursor.execute('''
+                UPDATE products SET stock_quantity = stock_quantity - ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND stock_quantity >= ?
+            ''', (item['quantity'], item['product_id'], item['quantity']))
+            
+            if cursor.rowcount == 0:
+                cursor.execute('SELECT name, stock_quantity FROM products WHERE id = ?', (item['product_id'],))
+                row = cursor.fetchone()
+                name, available = row if row else (None, 0)
+                shortages.append(StockShortage(item['product_id'], name, item['quantity'], available))
+        
+        if shortages:
+            raise InsufficientStockError(shortages)
     
     # Dinau (loan) management methods
     def get_customer_dinau_balance(self, customer_id):
@@ -322,17 +1245,41 @@ class DatabaseManager:
         
         return result[0] if result[0] else 0.0
     
+    def get_customer_dinau_balances(self, customer_ids):
+        """Get current dinau balances for several customers in one query"""
+        balances = {customer_id: 0.0 for customer_id in customer_ids}
+        if not balances:
+            return balances
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        placeholders = ",".join("?" * len(balances))
+        cursor.execute(f'''
+            SELECT customer_id,
+                SUM(CASE WHEN transaction_type = 'loan' THEN amount ELSE -amount END) as balance
+            FROM dinau_transactions
+            WHERE customer_id IN ({placeholders})
+            GROUP BY customer_id
+        ''', list(balances))
+        
+        for customer_id, balance in cursor.fetchall():
+            balances[customer_id] = balance or 0.0
+        
+        conn.close()
+        return balances
+    
     def get_customer_dinau_history(self, customer_id):
         """Get customer's dinau transaction history"""
-        conn = self.get_connection()
+        conn = self.get_connection(history=True)
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT dt.transaction_type, dt.amount, dt.description, dt.created_at,
                    u.full_name as processed_by, s.sale_number
-            FROM dinau_transactions dt
+            FROM all_dinau_transactions dt
             LEFT JOIN users u ON dt.user_id = u.id
-            LEFT JOIN sales s ON dt.sale_id = s.id
+            LEFT JOIN all_sales s ON dt.sale_id = s.id
             WHERE dt.customer_id = ?
             ORDER BY dt.created_at DESC
         ''', (customer_id,))
@@ -373,10 +1320,19 @@ class DatabaseManager:
                 VALUES (?, ?, ?, ?, ?)
             ''', (customer_id, 'payment', payment_amount, description, user_id))
             
-            # Check if any sales are now fully settled
-            current_balance = self.get_customer_dinau_balance(customer_id)
+            transaction_id = cursor.lastrowid
+            
+            # Check if any sales are now fully settled; the balance must be
+            # read in this transaction, which is the only one seeing the payment
+            cursor.execute('''
+                SELECT SUM(CASE WHEN transaction_type = 'loan' THEN amount ELSE -amount END)
+                FROM dinau_transactions
+                WHERE customer_id = ?
+            ''', (customer_id,))
+            current_balance = cursor.fetchone()[0] or 0.0
             
-            if current_balance <= 0:
+            # Allow for rounding in the sum of float amounts
+            if current_balance <= 0.005:
                 # Mark all unsettled sales as settled
                 cursor.execute('''
                     UPDATE sales 
@@ -385,8 +1341,8 @@ class DatabaseManager:
                 ''', (customer_id,))
             
             conn.commit()
-            transaction_id = cursor.lastrowid
             conn.close()
+            self.changes.publish([DinauPayment(customer_id, payment_amount)])
             return transaction_id
             
         except Exception as e:
@@ -415,13 +1371,13 @@ class DatabaseManager:
     
     def get_sales_report(self, start_date=None, end_date=None):
         """Get sales report for date range"""
-        conn = self.get_connection()
+        conn = self.get_connection(history=True)
         cursor = conn.cursor()
         
         query = '''
             SELECT s.id, s.sale_number, s.total_amount, s.payment_method, s.created_at,
                    u.full_name as cashier_name, c.name as customer_name
-            FROM sales s
+            FROM all_sales s
             LEFT JOIN users u ON s.user_id = u.id
             LEFT JOIN customers c ON s.customer_id = c.id
         '''
@@ -440,14 +1396,14 @@ class DatabaseManager:
     
     def get_sale_details(self, sale_id):
         """Get detailed information about a sale"""
-        conn = self.get_connection()
+        conn = self.get_connection(history=True)
         cursor = conn.cursor()
         
         # Get sale info
         cursor.execute('''
             SELECT s.sale_number, s.total_amount, s.payment_method, s.created_at,
                    u.full_name as cashier_name, c.name as customer_name
-            FROM sales s
+            FROM all_sales s
             LEFT JOIN users u ON s.user_id = u.id
             LEFT JOIN customers c ON s.customer_id = c.id
             WHERE s.id = ?
@@ -458,7 +1414,7 @@ class DatabaseManager:
         # Get sale items
         cursor.execute('''
             SELECT p.name, si.quantity, si.unit_price, si.total_price
-            FROM sale_items si
+            FROM all_sale_items si
             JOIN products p ON si.product_id = p.id
             WHERE si.sale_id = ?
         ''', (sale_id,))
@@ -467,3 +1423,27 @@ class DatabaseManager:
         conn.close()
         
         return sale_info, sale_items
+    
+    def get_sale_items_for_sales(self, sale_ids):
+        """Get the items of several sales in one query, keyed by sale id"""
+        items = {sale_id: [] for sale_id in sale_ids}
+        if not items:
+            return items
+        
+        conn = self.get_connection(history=True)
+        cursor = conn.cursor()
+        
+        placeholders = ",".join("?" * len(items))
+        cursor.execute(f'''
+            SELECT si.sale_id, p.name, si.quantity, si.unit_price, si.total_price
+            FROM all_sale_items si
+            JOIN products p ON si.product_id = p.id
+            WHERE si.sale_id IN ({placeholders})
+            ORDER BY si.sale_id, si.id
+        ''', list(items))
+        
+        for sale_id, name, quantity, unit_price, total_price in cursor.fetchall():
+            items[sale_id].append((name, quantity, unit_price, total_price))
+        
+        conn.close()
+        return items
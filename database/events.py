@@ -0,0 +1,121 @@
+import threading
+from collections import namedtuple
+
+# Change events, published by DatabaseManager after the change is committed.
+# Events of versioned data carry the data version counter value of their write.
+SaleCreated = namedtuple("SaleCreated", ["sale_id", "sale_number", "customer_id", "total_amount", "payment_method"])
+StockChanged = namedtuple("StockChanged", ["product_ids", "version"])
+ProductChanged = namedtuple("ProductChanged", ["product_id", "version", "deleted"])
+CatalogChanged = namedtuple("CatalogChanged", ["version"])
+CustomerChanged = namedtuple("CustomerChanged", ["customer_id", "version", "deleted"])
+DinauPayment = namedtuple("DinauPayment", ["customer_id", "amount"])
+
+# Data version counter advanced by each kind of versioned event
+EVENT_COUNTERS = {
+    StockChanged: "stock",
+    ProductChanged: "catalog",
+    CatalogChanged: "catalog",
+    CustomerChanged: "customers"
+}
+
+def advance_versions(versions, events):
+    """Advance loaded data versions past a batch of events
+    
+    Events at or below a loaded version were already part of the load and
+    are ignored. Returns the new versions, or None when the events skip a
+    version, i.e. some change was made without an event reaching this
+    subscriber (another process, or a write published out of order) and a
+    full reload is needed.
+    """
+    versions = dict(versions)
+    seen = {}
+    for event in events:
+        name = EVENT_COUNTERS.get(type(event))
+        if name in versions and event.version > versions[name]:
+            seen.setdefault(name, []).append(event.version)
+    
+    for name, numbers in seen.items():
+        start = versions[name] + 1
+        if sorted(numbers) != list(range(start, start + len(numbers))):
+            return None
+        versions[name] = start + len(numbers) - 1
+    return versions
+
+class ChangeFeed:
+    """In-process feed of committed data changes
+    
+    Subscribers are called with a list of events on the thread that made
+    the change, which may be a background writer; UI code should subscribe
+    through an EventCoalescer.
+    """
+    
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+    
+    def subscribe(self, callback, event_types=None):
+        """Call callback(events) for published events, optionally only of the given types"""
+        with self._lock:
+            self._subscribers.append((callback, tuple(event_types) if event_types else None))
+        return callback
+    
+    def unsubscribe(self, callback):
+        """Stop calling a subscriber"""
+        with self._lock:
+            self._subscribers = [subscriber for subscriber in self._subscribers if subscriber[0] != callback]
+    
+    def publish(self, events):
+        """Hand a list of committed change events to the subscribers"""
+        if not events:
+            return
+        
+        with self._lock:
+            subscribers = list(self._subscribers)
+        
+        for callback, event_types in subscribers:
+            selected = events if event_types is None else [event for event in events if isinstance(event, event_types)]
+            if not selected:
+                continue
+            
+            # A failing subscriber must not fail the write that was already committed
+            try:
+                callback(selected)
+            except Exception as e:
+                print(f"Error handling change events: {e}")
+
+def _schedule_next_frame(callback):
+    """Run a callback on the Kivy main thread before the next frame"""
+    from kivy.clock import Clock
+    Clock.schedule_once(callback, 0)
+
+class EventCoalescer:
+    """Collect events from any thread and hand them over once per frame
+    
+    A burst of changes (a group commit, a journal replay) results in one
+    callback with all events of the burst instead of one UI refresh each.
+    """
+    
+    def __init__(self, callback, schedule=None):
+        self.callback = callback
+        self.schedule = schedule or _schedule_next_frame
+        self._pending = []
+        self._scheduled = False
+        self._lock = threading.Lock()
+    
+    def __call__(self, events):
+        with self._lock:
+            self._pending.extend(events)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.schedule(self.flush)
+    
+    def flush(self, *args):
+        """Deliver the events collected since the last flush"""
+        with self._lock:
+            events = self._pending
+            self._pending = []
+            self._scheduled = False
+        
+        if events:
+            self.callback(events)
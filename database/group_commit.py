@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+class GroupCommitWriter:
+    """Coalesce concurrent sale writes into shared transactions
+    
+    Callers hand their sale to a single writer thread and wait for its
+    result. The writer commits everything queued while its previous commit
+    was running (up to max_batch) in one transaction, so concurrent
+    checkouts share one commit and one fsync while a lone checkout never
+    waits. A max_wait above zero additionally holds each batch open for
+    that many seconds. Each sale still has its own savepoint, so a failing
+    sale raises for its caller only.
+    """
+    
+    def __init__(self, db_manager, max_batch=64, max_wait=0.0):
+        self.db_manager = db_manager
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+    
+    def submit_sale(self, user_id, customer_id, total_amount, payment_method, cart_items, eftpos_receipt_path=None):
+        """Queue a sale and return a Future of (sale_id, sale_number)"""
+        sale = {
+            'sale_number': self.db_manager.generate_sale_number(),
+            'user_id': user_id,
+            'customer_id': customer_id,
+            'total_amount': total_amount,
+            'payment_method': payment_method,
+            'eftpos_receipt_path': eftpos_receipt_path,
+            'items': cart_items
+        }
+        future = Future()
+        
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("Group commit writer is stopped")
+            self._queue.append((sale, future))
+            self._condition.notify_all()
+        
+        return future
+    
+    def create_sale(self, user_id, customer_id, total_amount, payment_method, cart_items, eftpos_receipt_path=None):
+        """Create a sale as part of a group commit; same result as DatabaseManager.create_sale"""
+        return self.submit_sale(user_id, customer_id, total_amount, payment_method,
+                                cart_items, eftpos_receipt_path).result()
+    
+    def stop(self, timeout=None):
+        """Commit the queued sales and stop the writer thread"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+    
+    def _run(self):
+        """Writer thread: gather a batch of sales and commit it"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._stopping)
+                if not self._queue:
+                    return
+                
+                # Give sales finishing at about the same time a chance to join
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queue) < self.max_batch and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            
+            self._commit(batch)
+    
+    def _commit(self, batch):
+        """Commit one batch and hand each caller its own result"""
+        try:
+            results = self.db_manager.create_sales([sale for sale, future in batch])
+        except Exception as e:
+            for sale, future in batch:
+                future.set_exception(e)
+            return
+        
+        for (sale, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result((result, sale['sale_number']))
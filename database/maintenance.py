@@ -0,0 +1,297 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+MaintenanceRun = namedtuple("MaintenanceRun", ["task", "duration_ms", "slices", "pages_freed", "result"])
+
+# Tasks in the order they run, with how often each is due, in seconds
+TASK_INTERVALS = {
+    "analyze": 24 * 3600,
+    "vacuum": 3600,
+    "check": 7 * 24 * 3600
+}
+
+class MaintenanceScheduler:
+    """Database upkeep in short slices while the till is idle
+    
+    Three tasks keep a long-running store database healthy:
+    - analyze: ANALYZE one table at a time, with analysis_limit bounding
+      the rows read per index, so the query planner has statistics;
+    - vacuum: PRAGMA incremental_vacuum, vacuum_pages pages at a time, so
+      free pages (e.g. after archiving sales) go back to the file system;
+    - check: PRAGMA quick_check one table at a time.
+    
+    A task is due when its interval has passed since it last finished on
+    this database, by any till sharing it (see maintenance_runs). The
+    background thread looks every poll seconds; once there was no input
+    for idle_after seconds and can_run() allows it (e.g. no open cart), it
+    works through due tasks for about slice_ms and stops at the first step
+    after that or as soon as there is activity. An interrupted task
+    continues from where it stopped in the next idle slice.
+    
+    Each finished task is recorded in maintenance_runs and appended to
+    log_path as a JSON line with its time and the pages it freed.
+    """
+    
+    # Rows ANALYZE reads from each index; 0 reads them all
+    analysis_limit = 1000
+    
+    def __init__(self, db_manager, log_path=None, can_run=None, idle_after=60, poll=15, slice_ms=100,
+                 vacuum_pages=256, intervals=None):
+        self.db_manager = db_manager
+        self.log_path = log_path
+        self.can_run = can_run
+        self.idle_after = idle_after
+        self.poll = poll
+        self.slice_ms = slice_ms
+        self.vacuum_pages = vacuum_pages
+        self.intervals = dict(TASK_INTERVALS, **(intervals or {}))
+        
+        self._last_activity = time.monotonic()
+        # Task being worked on: (name, step generator, progress dict)
+        self._current = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+    
+    def touch(self):
+        """Note user activity; maintenance waits until the till is idle again"""
+        self._last_activity = time.monotonic()
+    
+    def is_idle(self):
+        """Whether there was no input for idle_after seconds and can_run() allows maintenance"""
+        if time.monotonic() - self._last_activity < self.idle_after:
+            return False
+        return self.can_run is None or bool(self.can_run())
+    
+    def due_tasks(self):
+        """Tasks whose interval has passed since they last finished, in run order"""
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        due = []
+        for task, interval in self.intervals.items():
+            cursor.execute('''
+                SELECT COUNT(*) FROM maintenance_runs
+                WHERE task = ? AND finished_at > datetime('now', ?)
+            ''', (task, f"-{interval} seconds"))
+            if not cursor.fetchone()[0]:
+                due.append(task)
+        
+        conn.close()
+        return due
+    
+    def run_slice(self):
+        """Work through due tasks for about slice_ms while idle; returns the runs finished"""
+        with self._lock:
+            started = time.perf_counter()
+            finished = []
+            worked = set()
+            
+            while (time.perf_counter() - started) * 1000 < self.slice_ms and self.is_idle():
+                if self._current is None:
+                    due = self.due_tasks()
+                    if not due:
+                        break
+                    progress = {'duration_ms': 0.0, 'slices': 0, 'pages_freed': 0, 'result': "ok"}
+                    self._current = (due[0], getattr(self, f"_{due[0]}")(progress), progress)
+                
+                task, steps, progress = self._current
+                if task not in worked:
+                    worked.add(task)
+                    progress['slices'] += 1
+                
+                step_started = time.perf_counter()
+                try:
+                    next(steps)
+                    done = False
+                except StopIteration:
+                    done = True
+                except Exception as e:
+                    progress['result'] = f"error: {e}"
+                    done = True
+                progress['duration_ms'] += (time.perf_counter() - step_started) * 1000
+                
+                if done:
+                    self._current = None
+                    finished.append(self._finish(task, progress))
+            
+            return finished
+    
+    def run(self, task):
+        """Run a task to the end now, whether it is due or not"""
+        with self._lock:
+            progress = {'duration_ms': 0.0, 'slices': 1, 'pages_freed': 0, 'result': "ok"}
+            started = time.perf_counter()
+            for _ in getattr(self, f"_{task}")(progress):
+                pass
+            progress['duration_ms'] = (time.perf_counter() - started) * 1000
+            return self._finish(task, progress)
+    
+    def _finish(self, task, progress):
+        """Record a finished task in maintenance_runs and the log"""
+        run = MaintenanceRun(task, progress['duration_ms'], progress['slices'],
+                             progress['pages_freed'], progress['result'])
+        
+        conn = self.db_manager.get_connection()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO maintenance_runs (task, finished_at, duration_ms, pages_freed, result)
+                VALUES (?, CURRENT_TIMESTAMP, ?, ?, ?)
+            ''', (task, run.duration_ms, run.pages_freed, run.result))
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if self.log_path:
+            event = dict(run._asdict(), duration_ms=round(run.duration_ms, 1),
+                         at=datetime.now().isoformat(timespec="seconds"))
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(event) + "\n")
+            except OSError as e:
+                print(f"Error writing maintenance log: {e}")
+        if task == "check" and run.result != "ok":
+            print(f"Database check found problems: {run.result}")
+        return run
+    
+    def _tables(self):
+        conn = self.db_manager.get_connection()
+        tables = [row[0] for row in conn.execute('''
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+            ORDER BY name
+        ''').fetchall()]
+        conn.close()
+        return tables
+    
+    def _analyze(self, progress):
+        """Update the planner statistics, one table per step"""
+        tables = self._tables()
+        for table in tables:
+            conn = self.db_manager.get_connection()
+            try:
+                conn.execute(f'PRAGMA analysis_limit = {int(self.analysis_limit)}').fetchall()
+                conn.execute(f'ANALYZE main."{table}"')
+                conn.commit()
+            finally:
+                conn.close()
+            yield
+        progress['result'] = f"{len(tables)} tables analyzed"
+    
+    def _vacuum(self, progress):
+        """Return free pages to the file system, vacuum_pages pages per step"""
+        conn = self.db_manager.get_connection()
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        conn.close()
+        
+        # 2 is INCREMENTAL; other databases need one full VACUUM to switch (see main())
+        if auto_vacuum != 2:
+            progress['result'] = f"{free_pages} free pages; incremental vacuum is not enabled"
+            return
+        
+        while free_pages:
+            conn = self.db_manager.get_connection()
+            try:
+                # execute() would step the pragma once, freeing a single page
+                conn.executescript(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})')
+                remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            finally:
+                conn.close()
+            progress['pages_freed'] += free_pages - remaining
+            if remaining >= free_pages:
+                break
+            free_pages = remaining
+            yield
+        
+        if progress['pages_freed']:
+            # In WAL mode the file only shrinks once the truncated pages are checkpointed
+            conn = self.db_manager.get_connection()
+            try:
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+            finally:
+                conn.close()
+        progress['result'] = f"{progress['pages_freed']} pages freed"
+    
+    def _check(self, progress):
+        """Check the database structure, one table and its indexes per step"""
+        problems = []
+        for table in self._tables():
+            conn = self.db_manager.get_connection()
+            try:
+                rows = conn.execute(f'PRAGMA quick_check("{table}")').fetchall()
+            finally:
+                conn.close()
+            if rows != [("ok",)]:
+                problems.extend(row[0] for row in rows)
+            yield
+        if problems:
+            progress['result'] = "; ".join(problems[:10])
+    
+    def start(self):
+        """Run due maintenance in the background whenever the till is idle"""
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=None):
+        """Stop the background thread (the current step is finished first)"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self):
+        """Maintenance thread: one slice per poll while the till is idle"""
+        while not self._stopping:
+            self._wake.wait(self.poll)
+            if self._stopping:
+                break
+            try:
+                self.run_slice()
+            except Exception as e:
+                print(f"Error running database maintenance: {e}")
+
+def enable_incremental_vacuum(db_path):
+    """Switch an existing database to incremental auto_vacuum with one full VACUUM
+    
+    The VACUUM rewrites the whole file, so run it with the tills closed.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        conn.close()
+
+def main():
+    from .database_manager import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Run database maintenance now")
+    parser.add_argument("--db", default="store_pos.db")
+    parser.add_argument("--task", action="append", choices=list(TASK_INTERVALS),
+                        help="task to run (repeatable); all by default")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch the database to incremental vacuum first (full VACUUM; close the tills)")
+    args = parser.parse_args()
+    
+    if args.enable_incremental_vacuum:
+        started = time.perf_counter()
+        enable_incremental_vacuum(args.db)
+        print(f"Incremental vacuum enabled in {time.perf_counter() - started:.1f}s")
+    
+    scheduler = MaintenanceScheduler(DatabaseManager(args.db))
+    for task in args.task or TASK_INTERVALS:
+        run = scheduler.run(task)
+        print(f"{run.task}: {run.result} in {run.duration_ms:.0f} ms")
+
+if __name__ == "__main__":
+    main()
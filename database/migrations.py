@@ -0,0 +1,301 @@
+import hashlib
+import re
+import time
+from collections import namedtuple
+from .models import DatabaseModels
+
+Migration = namedtuple("Migration", ["version", "name", "kind", "statements", "table", "batch_size"])
+
+def schema_step(version, name, *statements):
+    """A migration whose statements are applied in one transaction"""
+    return Migration(version, name, "schema", statements, None, None)
+
+def index_step(version, name, statement):
+    """An index build in its own short transaction; must be CREATE INDEX IF NOT EXISTS"""
+    if not re.match(r"\s*CREATE\s+(UNIQUE\s+)?INDEX\s+IF\s+NOT\s+EXISTS", statement, re.IGNORECASE):
+        raise ValueError(f"Migration {version} must use CREATE INDEX IF NOT EXISTS")
+    return Migration(version, name, "index", (statement,), None, None)
+
+def backfill_step(version, name, table, statement, batch_size=5000):
+    """An UPDATE run over a table in rowid ranges (:first to :last), one commit per range
+    
+    The statement must be safe to run twice over a range, and rows written
+    after the backfill started must already be written correctly by the app.
+    """
+    return Migration(version, name, "backfill", (statement,), table, batch_size)
+
+def checksum(migration):
+    """Fingerprint of what a migration does; whitespace and batch size do not count"""
+    text = "\n".join([migration.kind, migration.table or ""] +
+                     [" ".join(statement.split()) for statement in migration.statements])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Schema changes after the baseline (DatabaseModels.SCHEMA_VERSION), in order.
+# Never edit or renumber a migration once released: add a new one instead.
+MIGRATIONS = [
+    # Sales reports filter on the sale day
+    index_step(2, "index sales by day", '''
+        CREATE INDEX IF NOT EXISTS idx_sales_date
+        ON sales (DATE(created_at))
+    '''),
+    # Users switch back in at the till with a PIN (database/auth.py)
+    schema_step(3, "add user PINs", '''
+        ALTER TABLE users ADD COLUMN pin_hash TEXT
+    '''),
+    # Positions of the sync with the store hub (database/sync.py)
+    schema_step(4, "add sync cursors", '''
+        CREATE TABLE IF NOT EXISTS sync_cursors (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL DEFAULT 0
+        )
+    '''),
+    # Tills pull the products and customers changed since a version
+    # (DatabaseManager.changes_since)
+    index_step(5, "index products by version", '''
+        CREATE INDEX IF NOT EXISTS idx_products_version
+        ON products (version)
+    '''),
+    index_step(6, "index customers by version", '''
+        CREATE INDEX IF NOT EXISTS idx_customers_version
+        ON customers (version)
+    '''),
+    # When each maintenance task last finished (database/maintenance.py)
+    schema_step(7, "add maintenance runs", '''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            task TEXT PRIMARY KEY,
+            finished_at TIMESTAMP NOT NULL,
+            duration_ms REAL,
+            pages_freed INTEGER,
+            result TEXT
+        )
+    '''),
+    # Rows from before the version column still have version 0 and would
+    # never reach a till pulling changes_since(0). They get versions above
+    # the counter, so tills that already synced pull them too.
+    schema_step(8, "version unversioned products and customers", '''
+        INSERT OR IGNORE INTO data_versions (name, version) VALUES ('catalog', 0), ('customers', 0)
+    ''', '''
+        UPDATE products
+        SET version = (SELECT version FROM data_versions WHERE name = 'catalog') + id
+        WHERE version IS NULL OR version = 0
+    ''', '''
+        UPDATE data_versions
+        SET version = MAX(version, (SELECT COALESCE(MAX(version), 0) FROM products))
+        WHERE name = 'catalog'
+    ''', '''
+        UPDATE customers
+        SET version = (SELECT version FROM data_versions WHERE name = 'customers') + id
+        WHERE version IS NULL OR version = 0
+    ''', '''
+        UPDATE data_versions
+        SET version = MAX(version, (SELECT COALESCE(MAX(version), 0) FROM customers))
+        WHERE name = 'customers'
+    '''),
+    # Products and customers get a uid, the same on every database, so a
+    # till can tell the hub's row with an id from a different row of its
+    # own with that id (DatabaseManager.apply_changes). New rows get theirs
+    # from a trigger, whichever code inserts them.
+    schema_step(9, "add product and customer uids", '''
+        ALTER TABLE products ADD COLUMN uid TEXT
+    ''', '''
+        ALTER TABLE customers ADD COLUMN uid TEXT
+    ''', '''
+        CREATE TRIGGER IF NOT EXISTS products_uid AFTER INSERT ON products
+        WHEN NEW.uid IS NULL
+        BEGIN
+            UPDATE products SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id;
+        END
+    ''', '''
+        CREATE TRIGGER IF NOT EXISTS customers_uid AFTER INSERT ON customers
+        WHEN NEW.uid IS NULL
+        BEGIN
+            UPDATE customers SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id;
+        END
+    '''),
+    backfill_step(10, "give products uids", "products", '''
+        UPDATE products SET uid = lower(hex(randomblob(16)))
+        WHERE rowid BETWEEN :first AND :last AND uid IS NULL
+    '''),
+    backfill_step(11, "give customers uids", "customers", '''
+        UPDATE customers SET uid = lower(hex(randomblob(16)))
+        WHERE rowid BETWEEN :first AND :last AND uid IS NULL
+    '''),
+    index_step(12, "index products by uid", '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_products_uid
+        ON products (uid)
+    '''),
+    index_step(13, "index customers by uid", '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_uid
+        ON customers (uid)
+    '''),
+    # Sales whose reserved stock was put back (DatabaseManager.release_stock),
+    # so replaying a rejected journal entry does not put it back twice
+    schema_step(14, "add stock releases", '''
+        CREATE TABLE IF NOT EXISTS stock_releases (
+            sale_number TEXT PRIMARY KEY,
+            released_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''),
+]
+
+class MigrationError(Exception):
+    """A migration cannot be applied or no longer matches what was applied"""
+
+class MigrationRunner:
+    """Apply pending schema migrations to a store database
+    
+    Each migration commits on its own together with its schema_migrations
+    row, so an interrupted upgrade continues from the next migration.
+    Index builds hold the write lock only for their own index, and
+    backfills commit every batch_size rows and record their progress, so
+    a large store database is never locked for the whole upgrade.
+    """
+    
+    # Shortest pause between backfill batches, in seconds
+    min_pause = 0.005
+    
+    def __init__(self, conn, migrations=MIGRATIONS):
+        self.conn = conn
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        
+        versions = [migration.version for migration in self.migrations]
+        if len(set(versions)) != len(versions):
+            raise ValueError("Migration versions must be unique")
+        if versions and versions[0] <= DatabaseModels.SCHEMA_VERSION:
+            raise ValueError(f"Migration versions must be above the baseline {DatabaseModels.SCHEMA_VERSION}")
+    
+    @property
+    def latest_version(self):
+        """Get the schema version after all migrations"""
+        return self.migrations[-1].version if self.migrations else DatabaseModels.SCHEMA_VERSION
+    
+    def run(self):
+        """Apply pending migrations in order; returns (version, name, duration_ms) for each
+        
+        A database that is already current costs a single query.
+        """
+        if DatabaseModels.get_schema_version(self.conn) >= self.latest_version:
+            return []
+        
+        self.ensure_tables()
+        self.verify()
+        
+        applied = []
+        for migration in self.pending():
+            started = time.perf_counter()
+            if self.apply(migration, started):
+                applied.append((migration.version, migration.name, (time.perf_counter() - started) * 1000))
+        return applied
+    
+    def ensure_tables(self):
+        """Create the migration bookkeeping tables"""
+        cursor = self.conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                checksum TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms REAL
+            )
+        ''')
+        
+        # Databases versioned before migrations had names and checksums
+        cursor.execute("PRAGMA table_info(schema_migrations)")
+        columns = [row[1] for row in cursor.fetchall()]
+        for column in ("name", "checksum"):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE schema_migrations ADD COLUMN {column} TEXT")
+        
+        # Last rowid done by an unfinished backfill
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS migration_progress (
+                version INTEGER PRIMARY KEY,
+                last_rowid INTEGER NOT NULL
+            )
+        ''')
+        
+        self.conn.commit()
+    
+    def verify(self):
+        """Check that applied migrations are still the ones in the code"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT version, checksum FROM schema_migrations WHERE checksum IS NOT NULL')
+        recorded = dict(cursor.fetchall())
+        
+        for migration in self.migrations:
+            if migration.version in recorded and recorded[migration.version] != checksum(migration):
+                raise MigrationError(
+                    f"Migration {migration.version} ({migration.name}) was changed after it was applied"
+                )
+    
+    def pending(self):
+        """Get the migrations not applied yet, in order"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT version FROM schema_migrations')
+        applied = {row[0] for row in cursor.fetchall()}
+        return [migration for migration in self.migrations if migration.version not in applied]
+    
+    def apply(self, migration, started):
+        """Apply one migration; returns False if another process applied it first"""
+        if migration.kind == "backfill":
+            self._backfill(migration)
+        
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (migration.version,))
+            if cursor.fetchone():
+                self.conn.rollback()
+                return False
+            
+            if migration.kind != "backfill":
+                for statement in migration.statements:
+                    cursor.execute(statement)
+            
+            cursor.execute('DELETE FROM migration_progress WHERE version = ?', (migration.version,))
+            cursor.execute('''
+                INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                VALUES (?, ?, ?, ?)
+            ''', (migration.version, migration.name, checksum(migration), (time.perf_counter() - started) * 1000))
+            
+            self.conn.commit()
+            return True
+            
+        except Exception as e:
+            self.conn.rollback()
+            raise MigrationError(f"Migration {migration.version} ({migration.name}) failed: {e}") from e
+    
+    def _backfill(self, migration):
+        """Run a backfill statement over the table's rowids in committed batches"""
+        cursor = self.conn.cursor()
+        cursor.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {migration.table}')
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        
+        # Resume after the last committed batch of an interrupted run
+        cursor.execute('SELECT last_rowid FROM migration_progress WHERE version = ?', (migration.version,))
+        progress = cursor.fetchone()
+        first = max(low, progress[0] + 1) if progress else low
+        
+        while first <= high:
+            last = first + migration.batch_size - 1
+            batch_started = time.perf_counter()
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute(migration.statements[0], {"first": first, "last": last})
+                cursor.execute('''
+                    INSERT OR REPLACE INTO migration_progress (version, last_rowid)
+                    VALUES (?, ?)
+                ''', (migration.version, last))
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                raise MigrationError(f"Migration {migration.version} ({migration.name}) failed: {e}") from e
+            first = last + 1
+            
+            # Leave the database unlocked as long as the batch held it, so
+            # writers waiting in their busy timeout get their turn
+            time.sleep(max(time.perf_counter() - batch_started, self.min_pause))
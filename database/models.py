@@ -1,10 +1,73 @@
 import sqlite3
 from datetime import datetime
-import hashlib
+import time
+from .auth import PasswordHasher
 
 class DatabaseModels:
     """Database models and table creation for the POS system"""
     
+    # Version of the baseline schema built here. Later schema changes are
+    # migrations (database/migrations.py) so existing databases get them too
+    SCHEMA_VERSION = 1
+    
+    @staticmethod
+    def get_schema_version(conn):
+        """Get the schema version recorded in a database, 0 if none"""
+        try:
+            row = conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()
+        except sqlite3.OperationalError:
+            return 0
+        return row[0] or 0
+    
+    @staticmethod
+    def ensure_schema(conn):
+        """Create or upgrade the schema, seeding sample data only into a new database
+        
+        A database already at SCHEMA_VERSION costs a single query. Returns
+        True when the schema was created or upgraded.
+        """
+        if DatabaseModels.get_schema_version(conn) >= DatabaseModels.SCHEMA_VERSION:
+            return False
+        
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        
+        try:
+            # Serialize with other processes starting at the same time
+            cursor.execute('BEGIN IMMEDIATE')
+            if DatabaseModels.get_schema_version(conn) >= DatabaseModels.SCHEMA_VERSION:
+                conn.rollback()
+                return False
+            
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'users'")
+            new_database = cursor.fetchone()[0] == 0
+            
+            DatabaseModels.create_tables(conn)
+            DatabaseModels.create_indexes(conn)
+            if new_database:
+                DatabaseModels.create_default_data(conn)
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT,
+                    checksum TEXT,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    duration_ms REAL
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO schema_migrations (version, name, duration_ms)
+                VALUES (?, ?, ?)
+            ''', (DatabaseModels.SCHEMA_VERSION, "baseline schema", (time.perf_counter() - started) * 1000))
+            
+            conn.commit()
+            return True
+            
+        except Exception as e:
+            conn.rollback()
+            raise e
+    
     @staticmethod
     def create_tables(conn):
         """Create all necessary tables for the POS system"""
@@ -37,7 +100,8 @@ class DatabaseModels:
                 min_stock_level INTEGER DEFAULT 5,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1
+                is_active BOOLEAN DEFAULT 1,
+                version INTEGER DEFAULT 0
             )
         ''')
         
@@ -50,7 +114,8 @@ class DatabaseModels:
                 email TEXT,
                 address TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1
+                is_active BOOLEAN DEFAULT 1,
+                version INTEGER DEFAULT 0
             )
         ''')
         
@@ -129,22 +194,121 @@ class DatabaseModels:
             )
         ''')
         
-        conn.commit()
+        # Customer search index (normalized name and phone digits per customer)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS customer_search (
+                customer_id INTEGER PRIMARY KEY,
+                name_norm TEXT NOT NULL,
+                phone_digits TEXT,
+                FOREIGN KEY (customer_id) REFERENCES customers (id)
+            )
+        ''')
+        
+        # Words of each customer's name
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS customer_name_words (
+                word TEXT NOT NULL,
+                customer_id INTEGER NOT NULL,
+                PRIMARY KEY (word, customer_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Trigrams of every distinct name word (for typo tolerant search)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS name_word_trigrams (
+                trigram TEXT NOT NULL,
+                word TEXT NOT NULL,
+                trigram_count INTEGER NOT NULL,
+                PRIMARY KEY (trigram, word)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Global data version counters ('catalog', 'customers', 'stock');
+        # rows changed by a write carry the counter value of that write
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.executemany('''
+            INSERT OR IGNORE INTO data_versions (name, version)
+            VALUES (?, 0)
+        ''', [("catalog",), ("customers",), ("stock",)])
+        
+        DatabaseModels.add_missing_columns(conn)
+    
+    @staticmethod
+    def add_missing_columns(conn):
+        """Add columns introduced after a database was first created"""
+        cursor = conn.cursor()
+        
+        new_columns = [
+            ("products", "version", "INTEGER DEFAULT 0"),
+            ("customers", "version", "INTEGER DEFAULT 0")
+        ]
+        
+        for table, column, definition in new_columns:
+            cursor.execute(f"PRAGMA table_info({table})")
+            if column not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    @staticmethod
+    def create_indexes(conn):
+        """Create indexes used by the lookup and history queries"""
+        cursor = conn.cursor()
+        
+        # Customer purchase history (keyset paging by sale id per customer);
+        # total and date are included so the history summary never touches the table
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sales_customer_id
+            ON sales (customer_id, id, total_amount, created_at)
+        ''')
+        
+        # Sale line items by sale, covering the per-customer product totals
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id
+            ON sale_items (sale_id, product_id, quantity, total_price)
+        ''')
+        
+        # Dinau balances per customer, answered from the index alone
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_dinau_transactions_customer
+            ON dinau_transactions (customer_id, transaction_type, amount)
+        ''')
+        
+        # Customer search: name prefix and phone number prefix lookups
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_customer_search_name
+            ON customer_search (name_norm)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_customer_search_phone
+            ON customer_search (phone_digits)
+        ''')
+        
+        # Name words by customer, for re-indexing a single customer
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_customer_name_words_customer
+            ON customer_name_words (customer_id)
+        ''')
     
     @staticmethod
     def create_default_data(conn):
         """Create default admin user and sample data"""
         cursor = conn.cursor()
+        hasher = PasswordHasher()
         
         # Create default admin user
-        admin_password = hashlib.sha256("admin123".encode()).hexdigest()
+        admin_password = hasher.hash("admin123")
         cursor.execute('''
             INSERT OR IGNORE INTO users (username, password_hash, role, full_name)
             VALUES (?, ?, ?, ?)
         ''', ("admin", admin_password, "manager", "System Administrator"))
         
         # Create sample cashier user
-        cashier_password = hashlib.sha256("cashier123".encode()).hexdigest()
+        cashier_password = hasher.hash("cashier123")
         cursor.execute('''
             INSERT OR IGNORE INTO users (username, password_hash, role, full_name)
             VALUES (?, ?, ?, ?)
@@ -170,5 +334,3 @@ class DatabaseModels:
             INSERT OR IGNORE INTO customers (name, phone, email)
             VALUES (?, ?, ?)
         ''', ("Walk-in Customer", "", ""))
-        
-        conn.commit()
@@ -0,0 +1,336 @@
+import bisect
+import functools
+import inspect
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+SlowQuery = namedtuple("SlowQuery", ["at", "method", "sql", "duration_ms", "rows", "plan"])
+
+# Statements EXPLAIN QUERY PLAN can describe
+_EXPLAINABLE = re.compile(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+def normalize_sql(sql):
+    """Collapse whitespace so the same statement is counted once however it is indented"""
+    return " ".join(sql.split())
+
+class LatencyHistogram:
+    """Latency histogram over fixed buckets, in milliseconds"""
+    
+    # Upper bounds of the buckets; the last bucket has no upper bound
+    BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+    
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+    
+    def add(self, duration_ms, rows=0):
+        """Count one call"""
+        self.buckets[bisect.bisect_left(self.BOUNDS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.rows += rows
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        if not self.count:
+            return 0.0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                bound = self.BOUNDS[index] if index < len(self.BOUNDS) else self.max_ms
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+    
+    def as_dict(self):
+        """Summary for reports and JSON dumps"""
+        labels = [f"<={bound}" for bound in self.BOUNDS] + [f">{self.BOUNDS[-1]}"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "buckets": {label: count for label, count in zip(labels, self.buckets) if count}
+        }
+
+class QueryStats:
+    """Latency of DatabaseManager methods, SQL statements and connection opens
+    
+    Statements slower than slow_query_ms are kept in a slow query log with
+    the method that ran them and, with explain_slow_queries, their query
+    plan. The log is kept in memory (the last slow_log_size entries) and,
+    when slow_log_path is set, appended to that file as JSON lines.
+    """
+    
+    def __init__(self, enabled=True, slow_query_ms=100, explain_slow_queries=True,
+                 slow_log_size=200, slow_log_path=None):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow_queries = explain_slow_queries
+        self.slow_log_path = slow_log_path
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.connect = LatencyHistogram()
+        self.methods = {}
+        self.statements = {}
+        self._plans = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    def current_method(self):
+        """Name of the outermost DatabaseManager method running on this thread"""
+        calls = getattr(self._local, "calls", None)
+        return calls[0] if calls else None
+    
+    def call(self, name, function, *args, **kwargs):
+        """Run a method and record its duration and returned row count"""
+        calls = getattr(self._local, "calls", None)
+        if calls is None:
+            calls = self._local.calls = []
+        
+        calls.append(name)
+        started = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            calls.pop()
+        
+        rows = len(result) if isinstance(result, list) else 0
+        with self._lock:
+            self.methods.setdefault(name, LatencyHistogram()).add(duration_ms, rows)
+        return result
+    
+    def record_connect(self, duration_ms):
+        """Record the time to open a connection"""
+        with self._lock:
+            self.connect.add(duration_ms)
+    
+    def record_statement(self, conn, sql, parameters, duration_ms, rows):
+        """Record a finished statement, logging it when slow"""
+        key = self._keys.get(sql)
+        if key is None:
+            key = self._keys[sql] = normalize_sql(sql)
+        with self._lock:
+            self.statements.setdefault(key, LatencyHistogram()).add(duration_ms, rows)
+        
+        if duration_ms >= self.slow_query_ms:
+            self._log_slow_query(conn, key, sql, parameters, duration_ms, rows)
+    
+    def _log_slow_query(self, conn, key, sql, parameters, duration_ms, rows):
+        """Add a slow statement to the slow query log"""
+        plan = None
+        if self.explain_slow_queries and parameters is not None and _EXPLAINABLE.match(sql):
+            plan = self._plans.get(key)
+            if plan is None:
+                try:
+                    # A plain cursor, so the EXPLAIN itself is not timed
+                    rows_of_plan = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+                    plan = [row[-1] for row in rows_of_plan]
+                    self._plans[key] = plan
+                except sqlite3.Error as e:
+                    plan = [f"EXPLAIN failed: {e}"]
+        
+        entry = SlowQuery(datetime.now().isoformat(timespec="seconds"), self.current_method(),
+                          key, round(duration_ms, 3), rows, plan)
+        with self._lock:
+            self.slow_queries.append(entry)
+        
+        if self.slow_log_path:
+            try:
+                with open(self.slow_log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry._asdict()) + "\n")
+            except OSError as e:
+                print(f"Error writing slow query log: {e}")
+    
+    def snapshot(self):
+        """All statistics as a dict; methods and statements ordered by total time"""
+        with self._lock:
+            by_total = lambda item: -item[1].total_ms
+            return {
+                "connect": self.connect.as_dict(),
+                "methods": {name: histogram.as_dict()
+                            for name, histogram in sorted(self.methods.items(), key=by_total)},
+                "statements": {sql: histogram.as_dict()
+                               for sql, histogram in sorted(self.statements.items(), key=by_total)},
+                "slow_queries": [entry._asdict() for entry in self.slow_queries]
+            }
+    
+    def dump(self, path):
+        """Write the statistics to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+    
+    def report(self, limit=10):
+        """Text summary of where database time went, slowest first"""
+        snapshot = self.snapshot()
+        lines = [f"{'method':<40} {'calls':>7} {'total ms':>10} {'p95 ms':>8} {'max ms':>8}"]
+        for name, stats in list(snapshot["methods"].items())[:limit]:
+            lines.append(f"{name:<40} {stats['count']:>7} {stats['total_ms']:>10.1f} "
+                         f"{stats['p95_ms']:>8} {stats['max_ms']:>8.1f}")
+        
+        lines.append("")
+        lines.append(f"{'statement':<40} {'calls':>7} {'total ms':>10} {'p95 ms':>8} {'rows':>8}")
+        for sql, stats in list(snapshot["statements"].items())[:limit]:
+            text = sql if len(sql) <= 40 else sql[:37] + "..."
+            lines.append(f"{text:<40} {stats['count']:>7} {stats['total_ms']:>10.1f} "
+                         f"{stats['p95_ms']:>8} {stats['rows']:>8}")
+        
+        connect = snapshot["connect"]
+        lines.append("")
+        lines.append(f"connections: {connect['count']}, {connect['mean_ms']} ms mean, {connect['max_ms']} ms max")
+        lines.append(f"slow queries (>= {self.slow_query_ms} ms): {len(snapshot['slow_queries'])}")
+        return "\n".join(lines)
+    
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self.connect = LatencyHistogram()
+            self.methods = {}
+            self.statements = {}
+            self.slow_queries.clear()
+            self._plans = {}
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records each statement in the connection's QueryStats
+    
+    A statement's time includes fetching its rows, so it is recorded once
+    its rows are fetched, at the next execute, or when the cursor or
+    connection is closed.
+    """
+    
+    _statement = None
+    
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._statement = [sql, parameters, time.perf_counter() - started, 0]
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # Parameters of executemany are not kept for EXPLAIN, they may be a generator
+            self._statement = [sql, None, time.perf_counter() - started, 0]
+    
+    def executescript(self, sql_script):
+        self._finish()
+        return super().executescript(sql_script)
+    
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+    
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+    
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        self._finish()
+        return rows
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def _timed_fetch(self, fetch, *args):
+        """Fetch rows, adding the time and row count to the open statement"""
+        started = time.perf_counter()
+        result = fetch(*args)
+        if self._statement is not None:
+            self._statement[2] += time.perf_counter() - started
+            self._statement[3] += len(result) if isinstance(result, list) else (result is not None)
+        return result
+    
+    def _finish(self):
+        """Record the open statement, if any"""
+        statement = self._statement
+        if statement is None:
+            return
+        self._statement = None
+        
+        sql, parameters, elapsed, rows = statement
+        if self.description is None:
+            rows = max(self.rowcount, 0)
+        self.connection.stats.record_statement(self.connection, sql, parameters, elapsed * 1000, rows)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements are recorded in a QueryStats (set as .stats)"""
+    
+    stats = None
+    _cursors = ()
+    
+    def cursor(self, factory=TimedCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, TimedCursor):
+            # Connections are short-lived, so holding on to their cursors is fine
+            if not self._cursors:
+                self._cursors = []
+            self._cursors.append(cursor)
+        return cursor
+    
+    # The shortcuts on sqlite3.Connection would bypass cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+    
+    def commit(self):
+        self._finish_statements()
+        super().commit()
+    
+    def close(self):
+        self._finish_statements()
+        super().close()
+    
+    def _finish_statements(self):
+        """Record statements whose rows were not fetched to the end"""
+        for cursor in self._cursors:
+            cursor._finish()
+
+def untimed(function):
+    """Mark a public method that timed_methods should leave alone"""
+    function.untimed = True
+    return function
+
+def timed_methods(cls):
+    """Class decorator: record each public method call in the instance's stats"""
+    for name, function in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(function) or getattr(function, "untimed", False):
+            continue
+        setattr(cls, name, _timed(name, function))
+    return cls
+
+def _timed(name, function):
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        stats = self.stats
+        if not stats.enabled:
+            return function(self, *args, **kwargs)
+        return stats.call(name, function, self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+class SaleJournal:
+    """Append-only sale journal committed to the database in the background
+    
+    Checkout appends the sale as one JSON line to the journal file and
+    returns; an applier thread commits pending sales to SQLite in batches.
+    The journal is truncated whenever everything in it has been applied,
+    and on start any sales left in it by a crash are replayed. Replaying is
+    safe because sales already in the database are skipped by sale number.
+    """
+    
+    def __init__(self, db_manager, journal_path=None, batch_size=50, durable=True,
+                 retry_interval=1.0, on_applied=None):
+        self.db_manager = db_manager
+        self.journal_path = journal_path or os.path.splitext(db_manager.db_path)[0] + "_sales.journal"
+        self.rejected_path = self.journal_path + ".rejected"
+        self.batch_size = batch_size
+        self.durable = durable
+        self.retry_interval = retry_interval
+        self.on_applied = on_applied
+        
+        self._pending = deque()
+        # Batch being committed by the applier thread
+        self._in_flight = []
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+    
+    def start(self):
+        """Replay sales left in the journal and start the applier thread"""
+        self.recover()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="sale-journal", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=None):
+        """Apply the remaining sales and stop the applier thread"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self._file.close()
+    
+    def record_sale(self, user_id, customer_id, total_amount, payment_method, cart_items, eftpos_receipt_path=None,
+                    stock_reserved=False):
+        """Journal a sale and return its sale number without waiting for the database
+        
+        Pass stock_reserved when the cart was already taken out of stock with
+        DatabaseManager.reserve_stock.
+        """
+        entry = {
+            'sale_number': self.db_manager.generate_sale_number(),
+            'user_id': user_id,
+            'customer_id': customer_id,
+            'total_amount': total_amount,
+            'payment_method': payment_method,
+            'eftpos_receipt_path': eftpos_receipt_path,
+            'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'stock_reserved': stock_reserved,
+            'items': [
+                {
+                    'product_id': item['product_id'],
+                    'quantity': item['quantity'],
+                    'unit_price': item['unit_price']
+                }
+                for item in cart_items
+            ]
+        }
+        line = json.dumps(entry) + "\n"
+        
+        with self._condition:
+            self._file.write(line)
+            self._file.flush()
+            if self.durable:
+                os.fsync(self._file.fileno())
+            self._pending.append(entry)
+            self._condition.notify_all()
+        
+        return entry['sale_number']
+    
+    def pending_count(self):
+        """Get the number of journaled sales not yet committed to the database"""
+        with self._condition:
+            return len(self._pending) + len(self._in_flight)
+    
+    def pending_quantities(self):
+        """Get the quantity per product of journaled sales not yet committed, and so not yet out of stock"""
+        quantities = {}
+        with self._condition:
+            for entry in list(self._pending) + self._in_flight:
+                if entry.get('stock_reserved'):
+                    continue
+                for item in entry['items']:
+                    quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+        return quantities
+    
+    def wait_until_applied(self, timeout=None):
+        """Block until every journaled sale has been committed; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._in_flight, timeout
+            )
+    
+    def recover(self):
+        """Commit sales left in the journal file by a previous run"""
+        entries = []
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn last line is a sale that was never confirmed to the till
+                    print(f"Skipping unreadable sale journal line: {line.strip()[:80]}")
+        
+        for start in range(0, len(entries), self.batch_size):
+            self._apply(entries[start:start + self.batch_size])
+        
+        with self._condition:
+            if not self._pending:
+                self._truncate()
+        return len(entries)
+    
+    def _run(self):
+        """Applier thread: commit pending sales in batches until stopped"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._in_flight = batch
+            
+            try:
+                self._apply(batch)
+            except Exception as e:
+                # Database unavailable (locked, disk full...): keep the sales and retry
+                print(f"Error applying sale journal: {e}")
+                with self._condition:
+                    if self._stopping:
+                        # Left in the journal file, replayed on the next start
+                        return
+                    self._pending.extendleft(reversed(batch))
+                    self._in_flight = []
+                    self._condition.wait(self.retry_interval)
+                continue
+            
+            with self._condition:
+                self._in_flight = []
+                if not self._pending:
+                    self._truncate()
+                self._condition.notify_all()
+    
+    def _apply(self, entries):
+        """Commit a batch of journal entries and set aside the ones that fail"""
+        applied, failed = self.db_manager.apply_journaled_sales(entries)
+        
+        if failed:
+            with open(self.rejected_path, "a", encoding="utf-8") as f:
+                for entry, error in failed:
+                    print(f"Error applying journaled sale {entry.get('sale_number')}: {error}")
+                    if entry.get('stock_reserved'):
+                        entry = self._release_stock(entry)
+                    f.write(json.dumps(entry) + "\n")
+        
+        if applied and self.on_applied:
+            self.on_applied(applied)
+    
+    def _release_stock(self, entry):
+        """Put back the stock reserved for a rejected sale; returns the entry as set aside
+        
+        The release is recorded by sale number, so an entry rejected again
+        when the journal is replayed after a crash is not released twice. A
+        released entry is set aside without stock_reserved, so applying it
+        again by hand takes the stock again.
+        """
+        try:
+            self.db_manager.release_stock(entry['items'], entry['sale_number'])
+        except Exception as e:
+            print(f"Error releasing stock of rejected sale {entry.get('sale_number')}: {e}")
+            return entry
+        return dict(entry, stock_reserved=False)
+    
+    def _truncate(self):
+        """Empty the journal file once all of it is in the database (lock held)"""
+        self._file.seek(0)
+        self._file.truncate()
@@ -0,0 +1,154 @@
+import csv
+from collections import namedtuple
+from .events import StockChanged
+
+VarianceLine = namedtuple("VarianceLine", ["product_id", "barcode", "name", "previous", "counted", "delta", "value"])
+VarianceReport = namedtuple("VarianceReport", ["mode", "lines", "unknown_barcodes", "total_units", "total_value"])
+
+class StockSession:
+    """Stock take or goods receiving session built from scanned barcodes
+    
+    In 'count' mode the entered quantities are the counted stock and the
+    difference to the system stock is booked as an adjustment; in 'receive'
+    mode they are delivered quantities booked as 'in' movements. Entries are
+    collected in memory and applied set-based in one transaction: deltas are
+    computed by joining a temp table of entries against products, then stock
+    and movements are written with one statement each.
+    """
+    
+    MODES = {"count": "adjustment", "receive": "in"}
+    
+    def __init__(self, db_manager, mode="count"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown stock session mode: {mode}")
+        self.db_manager = db_manager
+        self.mode = mode
+        self.entries = {}
+    
+    def scan(self, barcode, quantity=1):
+        """Add a scanned quantity for a barcode"""
+        barcode = str(barcode).strip()
+        self.entries[barcode] = self.entries.get(barcode, 0) + quantity
+    
+    def set_quantity(self, barcode, quantity):
+        """Set the counted or received quantity for a barcode"""
+        self.entries[str(barcode).strip()] = quantity
+    
+    def apply(self, user_id, reason=None, zero_uncounted=False):
+        """Apply the session to stock and return the variance report
+        
+        With zero_uncounted (full stock take only) active products that were
+        not scanned are counted as zero.
+        """
+        movement_type = self.MODES[self.mode]
+        reason = reason or ("Stock take" if self.mode == "count" else "Goods received")
+        
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            # Lock out other writers so stock cannot change between reading and updating it
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS stock_entries (
+                    barcode TEXT PRIMARY KEY,
+                    quantity INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute('DELETE FROM stock_entries')
+            cursor.executemany('INSERT INTO stock_entries (barcode, quantity) VALUES (?, ?)',
+                               list(self.entries.items()))
+            
+            cursor.execute('''
+                SELECT e.barcode FROM stock_entries e
+                LEFT JOIN products p ON p.barcode = e.barcode
+                WHERE p.id IS NULL
+                ORDER BY e.barcode
+            ''')
+            unknown_barcodes = [row[0] for row in cursor.fetchall()]
+            
+            counted = 'e.quantity' if self.mode == "count" else 'p.stock_quantity + e.quantity'
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS stock_deltas (
+                    product_id INTEGER PRIMARY KEY,
+                    barcode TEXT,
+                    name TEXT,
+                    cost_price REAL,
+                    previous INTEGER,
+                    counted INTEGER,
+                    delta INTEGER
+                )
+            ''')
+            cursor.execute('DELETE FROM stock_deltas')
+            cursor.execute(f'''
+                INSERT INTO stock_deltas (product_id, barcode, name, cost_price, previous, counted, delta)
+                SELECT p.id, p.barcode, p.name, p.cost_price,
+                       p.stock_quantity as previous, {counted} as counted,
+                       {counted} - p.stock_quantity as delta
+                FROM stock_entries e
+                JOIN products p ON p.barcode = e.barcode
+            ''')
+            
+            if zero_uncounted and self.mode == "count":
+                cursor.execute('''
+                    INSERT INTO stock_deltas (product_id, barcode, name, cost_price, previous, counted, delta)
+                    SELECT id, barcode, name, cost_price, stock_quantity, 0, -stock_quantity
+                    FROM products
+                    WHERE is_active = 1 AND id NOT IN (SELECT product_id FROM stock_deltas)
+                ''')
+            
+            cursor.execute('''
+                INSERT INTO inventory_movements (product_id, movement_type, quantity, reason, user_id)
+                SELECT product_id, ?, delta, ?, ?
+                FROM stock_deltas
+                WHERE delta != 0
+            ''', (movement_type, reason, user_id))
+            
+            cursor.execute('''
+                UPDATE products
+                SET stock_quantity = (SELECT counted FROM stock_deltas d WHERE d.product_id = products.id),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT product_id FROM stock_deltas WHERE delta != 0)
+            ''')
+            version = self.db_manager.bump_data_version(cursor, "stock") if cursor.rowcount else None
+            
+            cursor.execute('''
+                SELECT product_id, barcode, name, previous, counted, delta, delta * COALESCE(cost_price, 0)
+                FROM stock_deltas
+                WHERE delta != 0
+                ORDER BY ABS(delta * COALESCE(cost_price, 0)) DESC, name
+            ''')
+            lines = [VarianceLine(*row) for row in cursor.fetchall()]
+            
+            conn.commit()
+            conn.close()
+            
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            raise e
+        
+        if version is not None:
+            self.db_manager.changes.publish([StockChanged(tuple(line.product_id for line in lines), version)])
+        
+        self.entries = {}
+        return VarianceReport(
+            mode=self.mode,
+            lines=lines,
+            unknown_barcodes=unknown_barcodes,
+            total_units=sum(line.delta for line in lines),
+            total_value=sum(line.value for line in lines)
+        )
+    
+    @staticmethod
+    def write_report(path, report):
+        """Write a variance report to a CSV file"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["barcode", "name", "previous", "counted", "delta", "value"])
+            for line in report.lines:
+                writer.writerow([line.barcode, line.name, line.previous, line.counted, line.delta, f"{line.value:.2f}"])
+            for barcode in report.unknown_barcodes:
+                writer.writerow([barcode, "UNKNOWN BARCODE", "", "", "", ""])
+            writer.writerow(["", "TOTAL", "", "", report.total_units, f"{report.total_value:.2f}"])
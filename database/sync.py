@@ -0,0 +1,639 @@
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .events import StockChanged
+
+# Tables pulled from the hub; the hub owns the catalog and the customer
+# list, so terminals keep the hub's ids and add new rows at the hub
+PULLED_TABLES = ("products", "customers")
+
+class SyncError(Exception):
+    """A sync request failed or was refused by the hub"""
+
+def encode_payload(payload):
+    """Compact JSON compressed with zlib"""
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 6)
+
+def decode_payload(data):
+    """Inverse of encode_payload"""
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+def get_position(cursor, name):
+    """Read a sync cursor, 0 if never set"""
+    cursor.execute('SELECT position FROM sync_cursors WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def set_position(cursor, name, position):
+    """Move a sync cursor in the current transaction"""
+    cursor.execute('''
+        INSERT INTO sync_cursors (name, position) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET position = excluded.position
+    ''', (name, position))
+
+def row_uids(cursor, table, ids):
+    """uid of each row of products or customers with one of ids, by id"""
+    ids = list({row_id for row_id in ids if row_id is not None})
+    uids = {}
+    for start in range(0, len(ids), 500):
+        part = ids[start:start + 500]
+        cursor.execute(f'SELECT id, uid FROM {table} WHERE id IN ({",".join("?" * len(part))})', part)
+        uids.update(cursor.fetchall())
+    return uids
+
+def is_loopback(host):
+    """Whether a listen address only accepts connections from this machine"""
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+class SyncServer:
+    """Store sync hub for terminals with their own database
+    
+    Terminals push their sales and stock movements (receiving, counts,
+    adjustments) and pull the products, customers and stock levels changed
+    since their last pull. Payloads are zlib-compressed JSON posted over HTTP, and each
+    side keeps cursors (sale and movement ids, catalog versions), so a sync
+    sends only what changed since the previous one.
+    
+    Pushes are idempotent: sales already at the hub are skipped by sale
+    number and movements by the terminal's movement cursor, so a terminal
+    can resend a batch whose reply it never got. A pushed sale already
+    happened, so it is booked even where the hub's stock runs below zero.
+    
+    Terminals add, change and delete products and customers at the hub
+    (POST /create, /update and /delete), so a row has the same id and
+    details everywhere. Pushed sales and movements name their products
+    and customers by id and uid; those naming a row the hub has under
+    another uid (one the terminal made itself before it synced) are
+    refused instead of booked to a different product or customer.
+    
+    Pushes write to the hub database, so a hub listening beyond this
+    machine requires a key. The key is checked on every request but, like
+    the payloads, travels in plaintext over HTTP: anyone who can capture
+    LAN traffic can read it. Run the hub on a trusted store network only,
+    or put it behind a TLS proxy.
+    """
+    
+    def __init__(self, db_manager, host="127.0.0.1", port=8765, key=None, max_body=16 * 1024 * 1024):
+        if not key and not is_loopback(host):
+            raise ValueError(f"A sync hub listening on {host} needs a key")
+        self.db_manager = db_manager
+        self.key = key
+        self.max_body = max_body
+        self._httpd = ThreadingHTTPServer((host, port), SyncRequestHandler)
+        self._httpd.sync = self
+        self._thread = None
+    
+    @property
+    def address(self):
+        """Host and port the hub listens on"""
+        return self._httpd.server_address
+    
+    def start(self):
+        """Serve sync requests on a background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="sync-server", daemon=True)
+        self._thread.start()
+    
+    def serve_forever(self):
+        self._httpd.serve_forever()
+    
+    def stop(self):
+        """Stop serving and close the listening socket"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+    
+    def push(self, request):
+        """Apply a terminal's batch of sales and stock movements"""
+        terminal = request['terminal']
+        sales = request.get('sales', [])
+        refused = self._refused_sales(sales)
+        # A pushed sale already happened at the till: it is booked even if
+        # the hub's stock runs out, and only refused if it cannot be booked
+        applied, failed = self.db_manager.apply_journaled_sales(
+            [sale for sale in sales if sale['sale_number'] not in refused], oversell=True
+        )
+        movements, refused_movements = self._apply_movements(terminal, request.get('movements', []))
+        
+        return {
+            'sales': len(applied),
+            'rejected': [[sale_number, reason] for sale_number, reason in refused.items()] +
+                        [[entry['sale_number'], str(error)] for entry, error in failed],
+            'movements': movements,
+            'rejected_movements': refused_movements
+        }
+    
+    def _refused_sales(self, sales):
+        """Sales naming a customer or product the hub has under another uid, with the reason, by sale number"""
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        customers = row_uids(cursor, "customers", [sale['customer_id'] for sale in sales])
+        products = row_uids(cursor, "products", [item['product_id'] for sale in sales for item in sale['items']])
+        conn.close()
+        
+        refused = {}
+        for sale in sales:
+            if sale['customer_id'] is not None and customers.get(sale['customer_id']) != sale.get('customer_uid'):
+                refused[sale['sale_number']] = f"Customer {sale['customer_id']} at the hub is not the terminal's"
+            for item in sale['items']:
+                if products.get(item['product_id']) != item.get('product_uid'):
+                    refused[sale['sale_number']] = f"Product {item['product_id']} at the hub is not the terminal's"
+        return refused
+    
+    def _apply_movements(self, terminal, movements):
+        """Book a terminal's stock movements once, in one transaction with its cursor
+        
+        Returns the number booked and the [id, reason] of those refused.
+        """
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        name = f"terminal/{terminal}/movements"
+        booked = []
+        refused = []
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            position = get_position(cursor, name)
+            fresh = [movement for movement in movements if movement['id'] > position]
+            uids = row_uids(cursor, "products", [movement['product_id'] for movement in fresh])
+            
+            for movement in fresh:
+                if uids.get(movement['product_id']) != movement.get('product_uid'):
+                    reason = f"Product {movement['product_id']} at the hub is not the terminal's"
+                    refused.append([movement['id'], reason])
+                    continue
+                booked.append(movement)
+                cursor.execute('''
+                    UPDATE products SET stock_quantity = stock_quantity + ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (movement['quantity'], movement['product_id']))
+                cursor.execute('''
+                    INSERT INTO inventory_movements (product_id, movement_type, quantity, reason, user_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (movement['product_id'], movement['movement_type'], movement['quantity'],
+                      f"{movement['reason']} (terminal {terminal})", movement['user_id'], movement['created_at']))
+            
+            version = None
+            if booked:
+                version = self.db_manager.bump_data_version(cursor, "stock")
+            if fresh:
+                set_position(cursor, name, max(movement['id'] for movement in fresh))
+            
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            raise e
+        
+        if version is not None:
+            product_ids = tuple(dict.fromkeys(movement['product_id'] for movement in booked))
+            self.db_manager.changes.publish([StockChanged(product_ids, version)])
+        return len(booked), refused
+    
+    def create(self, request):
+        """Add a product or customer for a terminal, so it has the hub's id on every terminal"""
+        values = request['values']
+        if request['table'] == "products":
+            row_id = self.db_manager.add_product(
+                values['barcode'], values['name'], values['description'], values['category'], values['price'],
+                values['cost_price'], values['stock_quantity'], values['min_stock_level']
+            )
+        elif request['table'] == "customers":
+            row_id = self.db_manager.add_customer(values['name'], values['phone'], values['email'], values['address'])
+        else:
+            raise ValueError(f"Terminals cannot add to {request['table']}")
+        return {'result': row_id}
+    
+    def update(self, request):
+        """Change a product's or customer's details for a terminal"""
+        values = request['values']
+        if request['table'] == "products":
+            updated = self.db_manager.update_product(
+                values['id'], values['barcode'], values['name'], values['description'], values['category'],
+                values['price'], values['cost_price'], values['min_stock_level']
+            )
+        elif request['table'] == "customers":
+            updated = self.db_manager.update_customer(values['id'], values['name'], values['phone'],
+                                                      values['email'], values['address'])
+        else:
+            raise ValueError(f"Terminals cannot change {request['table']}")
+        return {'result': updated}
+    
+    def delete(self, request):
+        """Soft delete a product or customer for a terminal"""
+        if request['table'] == "products":
+            deleted = self.db_manager.delete_product(request['values']['id'])
+        elif request['table'] == "customers":
+            deleted = self.db_manager.delete_customer(request['values']['id'])
+        else:
+            raise ValueError(f"Terminals cannot delete from {request['table']}")
+        return {'result': deleted}
+    
+    def pull(self, request):
+        """Rows changed since a terminal's versions, and stock changed since its stock cursor"""
+        changes = [self.db_manager.changes_since(table, request.get(table, 0), request.get('limit'))
+                   for table in PULLED_TABLES]
+        
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            # One read transaction, so the cursor matches the stock sent
+            cursor.execute('BEGIN')
+            # The last movement id handed out, even if archiving moved the movement away
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'inventory_movements'")
+            stock_position = cursor.fetchone()[0]
+            cursor.execute('''
+                SELECT id, uid, stock_quantity FROM products
+                WHERE id IN (SELECT product_id FROM inventory_movements WHERE id > ? AND id <= ?)
+                ORDER BY id
+            ''', (request.get('stock', 0), stock_position))
+            stock = cursor.fetchall()
+        finally:
+            conn.rollback()
+            conn.close()
+        
+        return {
+            'changes': changes,
+            'stock': stock,
+            'stock_position': stock_position
+        }
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front of the SyncServer: POST /push, /pull, /create, /update and /delete"""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        sync = self.server.sync
+        routes = {"/push": sync.push, "/pull": sync.pull, "/create": sync.create, "/update": sync.update,
+                  "/delete": sync.delete}
+        
+        if self.path not in routes:
+            return self._reply(404, {'error': f"Unknown path {self.path}"})
+        if sync.key and not hmac.compare_digest(self.headers.get("X-Sync-Key", ""), sync.key):
+            return self._reply(403, {'error': "Wrong sync key"})
+        
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            return self._reply(400, {'error': "Invalid Content-Length"})
+        if length > sync.max_body:
+            return self._reply(413, {'error': f"Payload over {sync.max_body} bytes"})
+        
+        try:
+            request = decode_payload(self.rfile.read(length))
+        except (zlib.error, ValueError) as e:
+            return self._reply(400, {'error': f"Unreadable payload: {e}"})
+        
+        try:
+            self._reply(200, routes[self.path](request))
+        except Exception as e:
+            print(f"Error handling sync {self.path}: {e}")
+            self._reply(500, {'error': str(e)})
+    
+    def _reply(self, status, payload):
+        body = encode_payload(payload)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "deflate")
+        self.send_header("Content-Length", str(len(body)))
+        if status != 200:
+            # The request body may not have been read
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # Requests from every terminal would flood the console
+        pass
+
+class SyncClient:
+    """Terminal side of the store sync: push local sales and movements, pull catalog changes
+    
+    Local sales and stock movements are pushed in batches of batch_size
+    after the last pushed id. Sale movements are not pushed, the hub books
+    them itself from the sale. Pulled products and customers are merged
+    with DatabaseManager.apply_changes, batch_size rows per table at a
+    time; pulled stock levels replace the local ones in one transaction
+    with the stock cursor.
+    
+    The client becomes the DatabaseManager's hub: products and customers
+    added, changed or deleted on the terminal are changed at the hub and
+    pulled, so they have the hub's id and a pull never reverts them. Hub
+    rows that a row of the terminal's own stands in the way of are not
+    merged but written to the conflicts file, and sales or movements the
+    hub refuses to the rejected file, for the manager.
+    """
+    
+    def __init__(self, db_manager, url, terminal_id=None, key=None, batch_size=200, timeout=10):
+        self.db_manager = db_manager
+        self.url = url.rstrip("/")
+        self.terminal_id = terminal_id if terminal_id is not None else db_manager.till_id
+        if self.terminal_id is None:
+            # The hub skips sales whose number it already has
+            raise ValueError("Sync terminals need a till id, so their sale numbers do not collide at the hub")
+        self.key = key
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.rejected_path = os.path.splitext(db_manager.db_path)[0] + "_sync.rejected"
+        self.conflicts_path = os.path.splitext(db_manager.db_path)[0] + "_sync.conflicts"
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        
+        # One sync or add at a time, from the background thread or the screens
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        db_manager.hub = self
+    
+    def start(self, interval=60):
+        """Sync every interval seconds on a background thread"""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="sync-client", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=None):
+        """Stop the background sync"""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self, interval):
+        while not self._stopping.is_set():
+            try:
+                self.sync()
+            except (SyncError, OSError) as e:
+                # Hub unreachable: everything is still queued behind the cursors
+                print(f"Error syncing with {self.url}: {e}")
+            self._stopping.wait(interval)
+    
+    def sync(self):
+        """Push local changes, then pull the hub's; returns counts of what moved"""
+        with self._lock:
+            pushed = self.push()
+            pulled = self.pull()
+        return dict(pushed, **pulled)
+    
+    def add_product(self, barcode, name, description, category, price, cost_price, stock_quantity, min_stock_level=5):
+        """Add a product at the hub and pull it; returns its id, None if the barcode is taken"""
+        return self._send("/create", "products", {
+            'barcode': barcode, 'name': name, 'description': description, 'category': category,
+            'price': price, 'cost_price': cost_price, 'stock_quantity': stock_quantity,
+            'min_stock_level': min_stock_level
+        })
+    
+    def update_product(self, product_id, barcode, name, description, category, price, cost_price, min_stock_level):
+        """Change a product at the hub and pull it; returns False if it does not exist or the barcode is taken"""
+        return self._send("/update", "products", {
+            'id': product_id, 'barcode': barcode, 'name': name, 'description': description,
+            'category': category, 'price': price, 'cost_price': cost_price, 'min_stock_level': min_stock_level
+        })
+    
+    def delete_product(self, product_id):
+        """Soft delete a product at the hub and pull it; returns False if it does not exist"""
+        return self._send("/delete", "products", {'id': product_id})
+    
+    def add_customer(self, name, phone="", email="", address=""):
+        """Add a customer at the hub and pull it; returns its id"""
+        return self._send("/create", "customers", {'name': name, 'phone': phone, 'email': email, 'address': address})
+    
+    def update_customer(self, customer_id, name, phone="", email="", address=""):
+        """Change a customer at the hub and pull it; returns False if they do not exist"""
+        return self._send("/update", "customers", {
+            'id': customer_id, 'name': name, 'phone': phone, 'email': email, 'address': address
+        })
+    
+    def delete_customer(self, customer_id):
+        """Soft delete a customer at the hub and pull it; returns False if they do not exist"""
+        return self._send("/delete", "customers", {'id': customer_id})
+    
+    def _send(self, path, table, values):
+        """Make a product or customer change at the hub, then pull it; returns the hub's result"""
+        with self._lock:
+            result = self._request(path, {'table': table, 'values': values})['result']
+            if result:
+                try:
+                    self.pull()
+                except (SyncError, OSError) as e:
+                    # The change is at the hub, it arrives with the next sync
+                    print(f"Error pulling {table} after {path}: {e}")
+        return result
+    
+    def push(self):
+        """Send unpushed sales and movements until none are left"""
+        totals = {'sales': 0, 'rejected': 0, 'movements': 0}
+        
+        while True:
+            sales, movements = self._unpushed()
+            if not sales and not movements:
+                return totals
+            
+            reply = self._request("/push", {
+                'terminal': self.terminal_id,
+                'sales': sales,
+                'movements': movements
+            })
+            totals['sales'] += reply['sales']
+            totals['movements'] += reply['movements']
+            if reply['rejected']:
+                self._reject("sale", sales, reply['rejected'], "sale_number")
+                totals['rejected'] += len(reply['rejected'])
+            if reply.get('rejected_movements'):
+                self._reject("movement", movements, reply['rejected_movements'], "id")
+                totals['rejected'] += len(reply['rejected_movements'])
+            
+            conn = self.db_manager.get_connection()
+            cursor = conn.cursor()
+            if sales:
+                set_position(cursor, "push/sales", sales[-1]['id'])
+            if movements:
+                set_position(cursor, "push/movements", movements[-1]['id'])
+            conn.commit()
+            conn.close()
+    
+    def _unpushed(self):
+        """Next batch of local sales (as journal entries) and non-sale movements"""
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        # Products and customers go with their uid, so the hub can check they are its own
+        cursor.execute('''
+            SELECT s.id, s.sale_number, s.user_id, s.customer_id, c.uid, s.total_amount, s.payment_method,
+                   s.eftpos_receipt_path, s.created_at
+            FROM sales s
+            LEFT JOIN customers c ON c.id = s.customer_id
+            WHERE s.id > ?
+            ORDER BY s.id
+            LIMIT ?
+        ''', (get_position(cursor, "push/sales"), self.batch_size))
+        sales = [
+            {
+                'id': row[0], 'sale_number': row[1], 'user_id': row[2], 'customer_id': row[3],
+                'customer_uid': row[4], 'total_amount': row[5], 'payment_method': row[6],
+                'eftpos_receipt_path': row[7], 'created_at': row[8], 'items': []
+            }
+            for row in cursor.fetchall()
+        ]
+        
+        if sales:
+            by_id = {sale['id']: sale for sale in sales}
+            cursor.execute(f'''
+                SELECT si.sale_id, si.product_id, p.uid, si.quantity, si.unit_price
+                FROM sale_items si
+                LEFT JOIN products p ON p.id = si.product_id
+                WHERE si.sale_id IN ({",".join("?" * len(by_id))})
+                ORDER BY si.id
+            ''', list(by_id))
+            for sale_id, product_id, product_uid, quantity, unit_price in cursor.fetchall():
+                by_id[sale_id]['items'].append(
+                    {'product_id': product_id, 'product_uid': product_uid, 'quantity': quantity,
+                     'unit_price': unit_price}
+                )
+        
+        cursor.execute('''
+            SELECT m.id, m.product_id, p.uid, m.movement_type, m.quantity, m.reason, m.user_id, m.created_at
+            FROM inventory_movements m
+            LEFT JOIN products p ON p.id = m.product_id
+            WHERE m.id > ? AND m.movement_type != 'out'
+            ORDER BY m.id
+            LIMIT ?
+        ''', (get_position(cursor, "push/movements"), self.batch_size))
+        columns = ["id", "product_id", "product_uid", "movement_type", "quantity", "reason", "user_id", "created_at"]
+        movements = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        conn.close()
+        return sales, movements
+    
+    def _reject(self, kind, records, rejected, key):
+        """Keep sales or movements the hub refused (e.g. a product it does not have) for the manager to reconcile"""
+        errors = dict(rejected)
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            for record in records:
+                if record[key] in errors:
+                    print(f"Error syncing {kind} {record[key]}: {errors[record[key]]}")
+                    f.write(json.dumps(dict(record, error=errors[record[key]])) + "\n")
+    
+    def _keep_conflicts(self, conflicts):
+        """Keep hub rows a row of this terminal's own stands in the way of, for the manager to reconcile"""
+        with open(self.conflicts_path, "a", encoding="utf-8") as f:
+            for conflict in conflicts:
+                print(f"Error syncing {conflict.table} {conflict.id}: {conflict.reason}")
+                f.write(json.dumps(conflict._asdict()) + "\n")
+    
+    def pull(self):
+        """Apply the products, customers and stock levels changed at the hub since the last pull"""
+        totals = {'products': 0, 'customers': 0, 'stock': 0, 'conflicts': 0}
+        
+        while True:
+            conn = self.db_manager.get_connection()
+            cursor = conn.cursor()
+            request = {table: get_position(cursor, f"pull/{table}") for table in PULLED_TABLES}
+            request.update(stock=get_position(cursor, "pull/stock"), limit=self.batch_size)
+            conn.close()
+            
+            reply = self._request("/pull", request)
+            # Merging twice is harmless, so the cursors are moved after the merge commits
+            result = self.db_manager.apply_changes(reply['changes'])
+            for table, count in result.merged.items():
+                totals[table] += count
+            if result.conflicts:
+                self._keep_conflicts(result.conflicts)
+                totals['conflicts'] += len(result.conflicts)
+            
+            stock = reply['stock']
+            version = None
+            conn = self.db_manager.get_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                if stock:
+                    # Only where this terminal's product with the id is the hub's
+                    cursor.executemany('UPDATE products SET stock_quantity = ? WHERE id = ? AND uid = ?',
+                                       [(quantity, product_id, uid) for product_id, uid, quantity in stock])
+                    version = self.db_manager.bump_data_version(cursor, "stock")
+                
+                for delta in reply['changes']:
+                    set_position(cursor, f"pull/{delta['table']}", delta['version'])
+                set_position(cursor, "pull/stock", reply['stock_position'])
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                raise e
+            
+            if version is not None:
+                self.db_manager.changes.publish(
+                    [StockChanged(tuple(product_id for product_id, uid, quantity in stock), version)]
+                )
+            totals['stock'] += len(stock)
+            
+            if not any(delta['more'] for delta in reply['changes']):
+                return totals
+    
+    def _request(self, path, payload):
+        """POST a compressed payload to the hub and return its decoded reply"""
+        body = encode_payload(payload)
+        headers = {"Content-Type": "application/json", "Content-Encoding": "deflate"}
+        if self.key:
+            headers["X-Sync-Key"] = self.key
+        
+        request = urllib.request.Request(self.url + path, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = decode_payload(e.read())['error']
+            except (zlib.error, ValueError, KeyError):
+                message = e.reason
+            raise SyncError(f"Hub refused {path}: {e.code} {message}") from e
+        
+        self.bytes_sent += len(body)
+        self.bytes_received += len(data)
+        return decode_payload(data)
+
+def main():
+    from .database_manager import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Run the store sync hub for the tills on the LAN")
+    parser.add_argument("--db", default="store_pos.db", help="hub database")
+    parser.add_argument("--host", default=None,
+                        help="address to listen on (default: all addresses with a key, else 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--key", default=os.environ.get("POS_SYNC_KEY"),
+                        help="shared key terminals must send (sent in plaintext over HTTP)")
+    args = parser.parse_args()
+    
+    # Without a key anyone on the LAN could push sales and stock changes
+    if args.host is None:
+        args.host = "0.0.0.0" if args.key else "127.0.0.1"
+    elif not args.key and not is_loopback(args.host):
+        parser.error(f"listening on {args.host} needs --key or POS_SYNC_KEY")
+    
+    server = SyncServer(DatabaseManager(args.db), args.host, args.port, args.key)
+    print(f"Sync hub for {args.db} listening on {args.host}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
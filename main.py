@@ -1,34 +1,71 @@
 import os
 import sys
-from kivy.app import App
-from kivy.uix.screenmanager import ScreenManager, Screen
+import importlib
+from kivy.clock import Clock
+from kivy.core.window import Window
 from kivymd.app import MDApp
-from kivymd.theming import ThemableBehavior
-from kivymd.uix.screen import MDScreen
 from kivymd.uix.screenmanager import MDScreenManager
 
-# Import screens
-from screens.login_screen import LoginScreen
-from screens.main_menu_screen import MainMenuScreen
-from screens.cashier_screen import CashierScreen
-from screens.inventory_screen import InventoryScreen
-from screens.customer_screen import CustomerScreen
-from screens.reports_screen import ReportsScreen
-
 # Import database manager
 from database.database_manager import DatabaseManager
+from database.customer_lookup import CustomerLookup
+from database.sale_journal import SaleJournal
+from database.sync import SyncClient
+from database.backup import BackupManager
+from database.maintenance import MaintenanceScheduler
+from utils.receipt_renderer import ReceiptRenderer
+from utils.receipt_writer import ReceiptWriter
+from utils.ui_profiler import UIProfiler
+
+# Screens by name, as (module, class). A screen's module is imported and the
+# screen built the first time it is shown, so only the login screen is
+# built before the app opens.
+SCREENS = {
+    "login": ("screens.login_screen", "LoginScreen"),
+    "main_menu": ("screens.main_menu_screen", "MainMenuScreen"),
+    "cashier": ("screens.cashier_screen", "CashierScreen"),
+    "inventory": ("screens.inventory_screen", "InventoryScreen"),
+    "customers": ("screens.customer_screen", "CustomerScreen"),
+    "reports": ("screens.reports_screen", "ReportsScreen")
+}
 
 class StorePOSApp(MDApp):
     """Main application class for Store POS system"""
     
+    # Build the remaining screens one per frame after login, so the first
+    # visit to each screen does not pay for building it
+    prebuild_screens = True
+    
+    # Time screen handlers and frames, with an on-screen overlay (F12) and a
+    # log of slow handlers; enabled with POS_PROFILE_UI=1
+    profile_ui = os.environ.get("POS_PROFILE_UI") == "1"
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.title = "Store POS & Inventory Management"
         self.theme_cls.primary_palette = "Blue"
         self.theme_cls.theme_style = "Light"
         
-        # Initialize database
-        self.db_manager = DatabaseManager()
+        # Initialize database; tills sharing one database set POS_TILL_ID
+        self.db_manager = DatabaseManager(till_id=os.environ.get("POS_TILL_ID"))
+        
+        # Recently served customers and cached balances for the till,
+        # kept current from the database change feed
+        self.customer_lookup = CustomerLookup(self.db_manager)
+        self.customer_lookup.watch(self.db_manager.changes)
+        
+        # Sales are journaled at checkout and committed in the background;
+        # sales left over from a crash are replayed before the till opens
+        self.sale_journal = SaleJournal(self.db_manager)
+        self.sale_journal.start()
+        
+        # Tills with their own database sync with the store hub
+        # (python -m database.sync) when POS_SYNC_URL is set
+        self.sync_client = None
+        if os.environ.get("POS_SYNC_URL"):
+            self.sync_client = SyncClient(self.db_manager, os.environ["POS_SYNC_URL"],
+                                          key=os.environ.get("POS_SYNC_KEY"))
+            self.sync_client.start()
         
         # Current user session
         self.current_user = None
@@ -36,42 +73,121 @@ class StorePOSApp(MDApp):
         # Create assets directory if it doesn't exist
         os.makedirs("assets/images", exist_ok=True)
         os.makedirs("assets/receipts", exist_ok=True)
+        
+        os.makedirs("assets/reports", exist_ok=True)
+        
+        # Slow database statements on the till are logged with their query plan
+        self.db_manager.stats.slow_log_path = "assets/reports/slow_queries.log"
+        self.ui_profiler = UIProfiler("assets/reports/ui_profile.log") if self.profile_ui else None
+        
+        # Receipts are rendered and saved in the background after checkout,
+        # laid out by assets/receipt_template.txt when the store has one;
+        # receipts older than a month are compacted into archives at startup
+        template_path = "assets/receipt_template.txt"
+        renderer = ReceiptRenderer(self.db_manager, template_path if os.path.exists(template_path) else None)
+        self.receipt_writer = ReceiptWriter(renderer=renderer)
+        self.receipt_writer.schedule_compaction()
+        
+        # The database is backed up online once a day, and from the main menu
+        self.backups = BackupManager(self.db_manager, "backups")
+        self.backups.start()
+        
+        # Statistics, free page reclaiming and integrity checks run in short
+        # slices while nobody is using the till and no sale is open
+        self.maintenance = MaintenanceScheduler(self.db_manager, "assets/reports/maintenance.log",
+                                                can_run=lambda: not self.has_open_cart())
+        self.maintenance.start()
     
     def build(self):
         """Build the application UI"""
-        # Create screen manager
+        # Create screen manager with the login screen; the others are built on demand
         self.screen_manager = MDScreenManager()
+        self.get_screen("login")
+        
+        if self.ui_profiler:
+            self.ui_profiler.start()
         
-        # Add screens
-        self.screen_manager.add_widget(LoginScreen(name="login"))
-        self.screen_manager.add_widget(MainMenuScreen(name="main_menu"))
-        self.screen_manager.add_widget(CashierScreen(name="cashier"))
-        self.screen_manager.add_widget(InventoryScreen(name="inventory"))
-        self.screen_manager.add_widget(CustomerScreen(name="customers"))
-        self.screen_manager.add_widget(ReportsScreen(name="reports"))
+        # Any input postpones maintenance
+        Window.bind(on_touch_down=self.on_user_activity, on_key_down=self.on_user_activity)
         
         return self.screen_manager
     
+    def on_user_activity(self, *args):
+        """Note input for the maintenance scheduler, without handling it"""
+        self.maintenance.touch()
+    
+    def has_open_cart(self):
+        """Whether the cashier screen holds items of a sale not checked out yet"""
+        return self.screen_manager.has_screen("cashier") and bool(self.get_screen("cashier").cart_items)
+    
+    def get_screen(self, screen_name):
+        """Get a screen, importing and building it on first use"""
+        if self.screen_manager.has_screen(screen_name):
+            return self.screen_manager.get_screen(screen_name)
+        
+        module_name, class_name = SCREENS[screen_name]
+        screen_class = getattr(importlib.import_module(module_name), class_name)
+        if self.ui_profiler:
+            # Before building, so the handlers the screen binds are the timed ones
+            self.ui_profiler.instrument(screen_class)
+        screen = screen_class(name=screen_name)
+        self.screen_manager.add_widget(screen)
+        return screen
+    
+    def schedule_prebuild(self):
+        """Build the screens not shown yet in the background, one per frame"""
+        remaining = [name for name in SCREENS if not self.screen_manager.has_screen(name)]
+        
+        def build_next(dt):
+            if not remaining or not self.current_user:
+                return
+            self.get_screen(remaining.pop(0))
+            if remaining:
+                Clock.schedule_once(build_next, 0)
+        
+        Clock.schedule_once(build_next, 0)
+    
+    def on_stop(self):
+        """Save pending receipts and commit journaled sales before the app exits"""
+        self.receipt_writer.stop()
+        self.sale_journal.stop()
+        if self.sync_client:
+            self.sync_client.stop()
+        self.backups.stop()
+        self.maintenance.stop()
+        
+        # Where the database and UI time went this session
+        try:
+            self.db_manager.stats.dump("assets/reports/query_stats.json")
+            if self.ui_profiler:
+                self.ui_profiler.dump("assets/reports/ui_profile.json")
+        except OSError as e:
+            print(f"Error saving profiling stats: {e}")
+    
     def login_user(self, user_data):
         """Handle user login"""
         self.current_user = user_data
-        self.screen_manager.current = "main_menu"
+        self.switch_screen("main_menu")
         
         # Update main menu with user info
-        main_menu_screen = self.screen_manager.get_screen("main_menu")
+        main_menu_screen = self.get_screen("main_menu")
         main_menu_screen.update_user_info(user_data)
+        
+        if self.prebuild_screens:
+            self.schedule_prebuild()
     
     def logout_user(self):
         """Handle user logout"""
         self.current_user = None
-        self.screen_manager.current = "login"
+        self.switch_screen("login")
         
         # Clear login form
-        login_screen = self.screen_manager.get_screen("login")
+        login_screen = self.get_screen("login")
         login_screen.clear_form()
     
     def switch_screen(self, screen_name):
         """Switch to specified screen"""
+        self.get_screen(screen_name)
         self.screen_manager.current = screen_name
     
     def get_current_user(self):
@@ -81,6 +197,26 @@ class StorePOSApp(MDApp):
     def get_db_manager(self):
         """Get database manager instance"""
         return self.db_manager
+    
+    def get_customer_lookup(self):
+        """Get customer lookup (recent customers and balance cache)"""
+        return self.customer_lookup
+    
+    def get_sale_journal(self):
+        """Get the sale journal used at checkout"""
+        return self.sale_journal
+    
+    def get_receipt_writer(self):
+        """Get the background receipt writer"""
+        return self.receipt_writer
+    
+    def get_backups(self):
+        """Get the database backup manager"""
+        return self.backups
+    
+    def get_maintenance(self):
+        """Get the database maintenance scheduler"""
+        return self.maintenance
 
 if __name__ == "__main__":
     StorePOSApp().run()
@@ -13,8 +13,8 @@ from kivymd.uix.selectioncontrol import MDCheckbox
 from kivy.uix.widget import Widget
 from kivy.metrics import dp
 from kivy.app import App
-from datetime import datetime
-import os
+from utils.receipt_writer import snapshot_sale
+from database.concurrency import InsufficientStockError
 
 class CashierScreen(MDScreen):
     """Cashier/POS screen for processing sales"""
@@ -459,9 +459,99 @@ class CashierScreen(MDScreen):
     
     def select_customer(self, *args):
         """Select customer for the sale"""
-        # This would open a customer selection dialog
-        # For now, we'll use a simple implementation
-        pass
+        content = MDBoxLayout(
+            orientation="vertical",
+            spacing=dp(10),
+            size_hint_y=None,
+            height=dp(400)
+        )
+        
+        self.customer_search_field = MDTextField(
+            hint_text="Search by name or phone...",
+            size_hint_y=None,
+            height=dp(48)
+        )
+        self.customer_search_field.bind(text=self.on_customer_search_text)
+        
+        scroll = MDScrollView()
+        self.customer_picker_list = MDList()
+        scroll.add_widget(self.customer_picker_list)
+        
+        content.add_widget(self.customer_search_field)
+        content.add_widget(scroll)
+        
+        self.dialog = MDDialog(
+            title="Select Customer",
+            type="custom",
+            content_cls=content,
+            buttons=[
+                MDFlatButton(
+                    text="WALK-IN",
+                    on_release=lambda x: self.set_customer(None)
+                ),
+                MDFlatButton(
+                    text="CANCEL",
+                    on_release=self.close_dialog
+                )
+            ]
+        )
+        
+        # Recently served customers are shown before anything is typed
+        self.display_customer_choices(App.get_running_app().get_customer_lookup().start_search())
+        self.dialog.open()
+    
+    def on_customer_search_text(self, instance, text):
+        """Handle customer search text change"""
+        try:
+            customers = App.get_running_app().get_customer_lookup().search(text)
+            self.display_customer_choices(customers)
+        except Exception as e:
+            print(f"Error searching customers: {e}")
+    
+    def display_customer_choices(self, customers):
+        """Display customers in the picker with their outstanding balance"""
+        self.customer_picker_list.clear_widgets()
+        
+        lookup = App.get_running_app().get_customer_lookup()
+        balances = lookup.get_balances([customer[0] for customer in customers])
+        
+        for customer in customers:
+            customer_id, name, phone = customer[0], customer[1], customer[2]
+            balance = balances.get(customer_id, 0.0)
+            
+            secondary = phone or "No phone"
+            if balance > 0:
+                secondary += f" | Owes ${balance:.2f}"
+            
+            item = TwoLineListItem(
+                text=name,
+                secondary_text=secondary,
+                on_release=lambda x, c=customer: self.set_customer(c)
+            )
+            self.customer_picker_list.add_widget(item)
+    
+    def set_customer(self, customer):
+        """Assign a customer row to the sale, or None for walk-in"""
+        if customer is None:
+            self.selected_customer = None
+            self.customer_label.text = "Customer: Walk-in"
+        else:
+            lookup = App.get_running_app().get_customer_lookup()
+            lookup.remember(customer)
+            
+            self.selected_customer = {
+                'id': customer[0],
+                'name': customer[1],
+                'phone': customer[2]
+            }
+            
+            balance = lookup.get_balance(customer[0])
+            label = f"Customer: {customer[1]}"
+            if balance > 0:
+                label += f" (Owes ${balance:.2f})"
+            self.customer_label.text = label
+        
+        self.close_dialog()
     
     def checkout(self, *args):
         """Process checkout"""
@@ -537,14 +627,30 @@ class CashierScreen(MDScreen):
     def process_payment(self, payment_method, total_amount):
         """Process the payment"""
         app = App.get_running_app()
-        db_manager = app.get_db_manager()
+        sale_journal = app.get_sale_journal()
         current_user = app.get_current_user()
         
+        if payment_method == "dinau" and not self.selected_customer:
+            self.show_dialog("Select Customer", "Dinau sales need a customer. Please select the customer first!")
+            return
+        
+        db_manager = app.get_db_manager()
         try:
-            # Create sale
+            # A read only: the sale takes its stock when the journal saves it,
+            # and is set aside then if another till sold the items first
+            shortages = db_manager.check_stock(self.cart_items, sale_journal.pending_quantities())
+        except Exception as e:
+            self.show_dialog("Error", f"Failed to process sale: {str(e)}")
+            return
+        if shortages:
+            self.show_dialog("Not Enough Stock", f"{InsufficientStockError(shortages)}\nPlease update the cart.")
+            return
+        
+        try:
+            # Journal the sale; it is committed to the database in the background
             customer_id = 1 if not self.selected_customer else self.selected_customer['id']  # Default walk-in customer
             
-            sale_id, sale_number = db_manager.create_sale(
+            sale_number = sale_journal.record_sale(
                 user_id=current_user['id'],
                 customer_id=customer_id,
                 total_amount=total_amount,
@@ -553,11 +659,13 @@ class CashierScreen(MDScreen):
             )
             
             # Generate receipt
-            self.generate_receipt(sale_id, sale_number, total_amount, payment_method)
+            self.generate_receipt(sale_number, total_amount, payment_method)
             
-            # Clear cart
+            # Clear cart and go back to walk-in for the next sale
             self.cart_items.clear()
             self.update_cart_display()
+            self.selected_customer = None
+            self.customer_label.text = "Customer: Walk-in"
             
             # Close dialog
             self.close_dialog()
@@ -574,42 +682,19 @@ class CashierScreen(MDScreen):
         # For now, process as regular EFTPOS payment
         self.process_payment("eftpos", total_amount)
     
-    def generate_receipt(self, sale_id, sale_number, total_amount, payment_method):
-        """Generate receipt file"""
-        try:
-            receipt_content = f"""
-STORE POS SYSTEM
-================
-
-Sale Number: {sale_number}
-Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Cashier: {App.get_running_app().get_current_user()['full_name']}
-
-Items:
-------
-"""
-            
-            for item in self.cart_items:
-                receipt_content += f"{item['name']}\n"
-                receipt_content += f"  ${item['unit_price']:.2f} x {item['quantity']} = ${item['total']:.2f}\n"
-            
-            receipt_content += f"""
-------
-Total: ${total_amount:.2f}
-Payment: {payment_method.upper()}
-
-Thank you for your business!
-"""
-            
-            # Save receipt
-            receipt_filename = f"receipt_{sale_number}.txt"
-            receipt_path = os.path.join("assets", "receipts", receipt_filename)
-            
-            with open(receipt_path, 'w') as f:
-                f.write(receipt_content)
-                
-        except Exception as e:
-            print(f"Error generating receipt: {e}")
+    def generate_receipt(self, sale_number, total_amount, payment_method):
+        """Queue the receipt for the background receipt writer"""
+        app = App.get_running_app()
+        
+        # Snapshot the cart now; it is cleared before the receipt is written
+        record = snapshot_sale(
+            sale_number,
+            app.get_current_user()['full_name'],
+            payment_method,
+            total_amount,
+            self.cart_items
+        )
+        app.get_receipt_writer().submit(record)
     
     def show_dialog(self, title, message):
         """Show information dialog"""
@@ -12,6 +12,7 @@ from kivymd.uix.datatables import MDDataTable
 from kivy.uix.widget import Widget
 from kivy.metrics import dp
 from kivy.app import App
+from database.events import CustomerChanged, EventCoalescer, advance_versions
 
 class CustomerScreen(MDScreen):
     """Customer management screen"""
@@ -21,7 +22,14 @@ class CustomerScreen(MDScreen):
         self.dialog = None
         self.selected_customer = None
         self.data_table = None
+        self.displayed_customers = []
+        self.loaded_versions = None
+        self.pending_events = []
         self.build_ui()
+        
+        # Customer changes patch the table instead of reloading it
+        app = App.get_running_app()
+        app.get_db_manager().changes.subscribe(EventCoalescer(self.on_customers_changed), (CustomerChanged,))
     
     def build_ui(self):
         """Build the customer screen UI"""
@@ -144,7 +152,15 @@ class CustomerScreen(MDScreen):
     
     def on_enter(self):
         """Called when screen is entered"""
-        self.load_customers()
+        # Apply changes made while away, then reload only if something was still missed
+        if self.pending_events:
+            events, self.pending_events = self.pending_events, []
+            self.apply_customer_changes(events)
+        
+        app = App.get_running_app()
+        if self.loaded_versions is None or \
+                self.loaded_versions["customers"] != app.get_db_manager().get_data_version("customers"):
+            self.load_customers()
     
     def load_customers(self):
         """Load customer data"""
@@ -152,13 +168,66 @@ class CustomerScreen(MDScreen):
         db_manager = app.get_db_manager()
         
         try:
+            # Read the version first so a change made while loading marks the list stale
+            version = db_manager.get_data_version("customers")
             customers = db_manager.get_all_customers()
             self.display_customers(customers)
+            self.loaded_versions = {"customers": version}
+            self.pending_events = []
         except Exception as e:
             print(f"Error loading customers: {e}")
     
+    def on_customers_changed(self, events):
+        """Patch the table with committed customer changes, or keep them until the screen is shown"""
+        if self.manager and self.manager.current == self.name:
+            self.apply_customer_changes(events)
+        else:
+            self.pending_events.extend(events)
+    
+    def apply_customer_changes(self, events):
+        """Refresh only the changed rows of the displayed customers"""
+        app = App.get_running_app()
+        db_manager = app.get_db_manager()
+        
+        # New customers can only be placed when the full list is displayed
+        showing_all = self.loaded_versions is not None
+        if showing_all:
+            versions = advance_versions(self.loaded_versions, events)
+            if versions is None:
+                self.load_customers()
+                return
+        
+        displayed_ids = {customer[0] for customer in self.displayed_customers}
+        changed_ids = {event.customer_id for event in events}
+        if not showing_all:
+            changed_ids &= displayed_ids
+        
+        try:
+            # Deleted customers are no longer returned and drop out of the table
+            fresh = {}
+            for customer_id in changed_ids:
+                customer = db_manager.get_customer_by_id(customer_id)
+                if customer:
+                    fresh[customer_id] = customer
+            
+            customers = [fresh.get(customer[0]) if customer[0] in changed_ids else customer
+                         for customer in self.displayed_customers]
+            customers = [customer for customer in customers if customer]
+            
+            if showing_all:
+                customers.extend(customer for customer_id, customer in fresh.items() if customer_id not in displayed_ids)
+                customers.sort(key=lambda customer: customer[1])
+            
+            self.display_customers(customers)
+            if showing_all:
+                self.loaded_versions = versions
+        except Exception as e:
+            print(f"Error updating customers: {e}")
+    
     def display_customers(self, customers):
         """Display customers in the table"""
+        self.displayed_customers = customers
+        self.loaded_versions = None
         row_data = []
         
         for customer in customers:
@@ -203,14 +272,7 @@ class CustomerScreen(MDScreen):
         
         try:
             customers = db_manager.search_customers(search_term)
-            # Convert search results to full customer format
-            full_customers = []
-            for customer in customers:
-                customer_id, name, phone, email, address = customer
-                # Add created_at field (we'll need to modify the search method to include this)
-                full_customers.append((customer_id, name, phone, email, address, "N/A"))
-            
-            self.display_customers(full_customers)
+            self.display_customers(customers)
         except Exception as e:
             print(f"Error searching customers: {e}")
     
@@ -219,17 +281,9 @@ class CustomerScreen(MDScreen):
         # Get the selected customer based on row index
         row_index = instance_row.index
         
-        app = App.get_running_app()
-        db_manager = app.get_db_manager()
-        
-        try:
-            # Get all customers to find the selected one
-            customers = db_manager.get_all_customers()
-            if row_index < len(customers):
-                self.selected_customer = customers[row_index]
-                self.show_customer_actions()
-        except Exception as e:
-            print(f"Error selecting customer: {e}")
+        if row_index < len(self.displayed_customers):
+            self.selected_customer = self.displayed_customers[row_index]
+            self.show_customer_actions()
     
     def show_customer_actions(self):
         """Show customer action dialog"""
@@ -393,15 +447,20 @@ class CustomerScreen(MDScreen):
             db_manager = app.get_db_manager()
             
             if edit_mode and self.selected_customer:
-                # Update existing customer (this would require an update method in database_manager)
-                self.show_error_dialog("Customer update functionality not yet implemented!")
+                # Update existing customer
+                customer_id = self.selected_customer[0]
+                
+                if db_manager.update_customer(customer_id, name, phone, email, address):
+                    self.close_dialog()
+                    self.show_success_dialog("Customer updated successfully!")
+                else:
+                    self.show_error_dialog("Failed to update customer!")
             else:
                 # Add new customer
                 customer_id = db_manager.add_customer(name, phone, email, address)
                 
                 if customer_id:
                     self.close_dialog()
-                    self.load_customers()
                     self.show_success_dialog("Customer added successfully!")
                 else:
                     self.show_error_dialog("Failed to add customer!")
@@ -423,31 +482,55 @@ class CustomerScreen(MDScreen):
         db_manager = app.get_db_manager()
         
         try:
-            # This would require a method to get customer purchase history
-            # For now, show a placeholder
+            summary = db_manager.get_customer_purchase_summary(customer_id)
+            top_products = db_manager.get_customer_top_products(customer_id, limit=3)
+            
             content = MDBoxLayout(
                 orientation="vertical",
                 spacing=dp(10),
                 size_hint_y=None,
-                height=dp(200)
+                height=dp(400)
             )
             
-            history_label = MDLabel(
-                text=f"Purchase history for {name}\n\nThis feature will show:\n- Recent purchases\n- Total spent\n- Favorite products\n- Purchase frequency",
+            if summary['avg_days_between_visits'] is not None:
+                frequency = f"every {summary['avg_days_between_visits']:.1f} days"
+            else:
+                frequency = "N/A"
+            
+            favourites = ", ".join(f"{p[1]} ({p[2]})" for p in top_products) or "N/A"
+            
+            summary_label = MDLabel(
+                text=f"{name}\n"
+                     f"Purchases: {summary['sale_count']} | Total spent: ${summary['total_spent']:.2f}\n"
+                     f"Average sale: ${summary['average_sale']:.2f} | Visits: {frequency}\n"
+                     f"Favourite products: {favourites}",
                 theme_text_color="Primary",
                 font_style="Body1",
                 text_size=(dp(300), None),
                 size_hint_y=None,
-                height=dp(150)
+                height=dp(120)
             )
             
-            content.add_widget(history_label)
+            history_scroll = MDScrollView()
+            self.history_list = MDList()
+            history_scroll.add_widget(self.history_list)
+            
+            content.add_widget(summary_label)
+            content.add_widget(history_scroll)
+            
+            self.history_customer_id = customer_id
+            self.history_last_sale_id = None
+            self.load_more_history()
             
             self.dialog = MDDialog(
                 title="Purchase History",
                 type="custom",
                 content_cls=content,
                 buttons=[
+                    MDFlatButton(
+                        text="MORE",
+                        on_release=self.load_more_history
+                    ),
                     MDFlatButton(
                         text="CLOSE",
                         on_release=self.close_dialog
@@ -460,11 +543,78 @@ class CustomerScreen(MDScreen):
         except Exception as e:
             self.show_error_dialog(f"Error loading purchase history: {str(e)}")
     
+    def load_more_history(self, *args):
+        """Append the next page of purchases to the history list"""
+        app = App.get_running_app()
+        db_manager = app.get_db_manager()
+        
+        try:
+            sales = db_manager.get_customer_purchase_history(
+                self.history_customer_id,
+                limit=20,
+                before_sale_id=self.history_last_sale_id
+            )
+            
+            for sale in sales:
+                sale_id, sale_number, total_amount, payment_method, created_at, item_count = sale
+                self.history_list.add_widget(ThreeLineListItem(
+                    text=sale_number,
+                    secondary_text=f"${total_amount:.2f} | {payment_method.upper()} | {item_count} items",
+                    tertiary_text=created_at[:16] if created_at else "N/A"
+                ))
+            
+            if sales:
+                self.history_last_sale_id = sales[-1][0]
+        except Exception as e:
+            print(f"Error loading purchase history: {e}")
+    
     def delete_customer(self, *args):
         """Delete customer (mark as inactive)"""
-        # This would require implementing a soft delete in the database
+        if not self.selected_customer:
+            return
+        
         self.close_dialog()
-        self.show_error_dialog("Customer deletion functionality not yet implemented!")
+        
+        # The walk-in customer is used for every anonymous sale
+        if self.selected_customer[0] == 1:
+            self.show_error_dialog("The walk-in customer cannot be deleted!")
+            return
+        
+        self.dialog = MDDialog(
+            title="Delete Customer",
+            text=f"Delete {self.selected_customer[1]}? Their sales and dinau history are kept.",
+            buttons=[
+                MDFlatButton(
+                    text="CANCEL",
+                    on_release=self.close_dialog
+                ),
+                MDRaisedButton(
+                    text="DELETE",
+                    md_bg_color="Red",
+                    on_release=self.confirm_delete_customer
+                )
+            ]
+        )
+        self.dialog.open()
+    
+    def confirm_delete_customer(self, *args):
+        """Soft delete the selected customer"""
+        app = App.get_running_app()
+        db_manager = app.get_db_manager()
+        
+        try:
+            customer_id = self.selected_customer[0]
+            deleted = db_manager.delete_customer(customer_id)
+            self.close_dialog()
+            self.selected_customer = None
+            
+            if deleted:
+                self.show_success_dialog("Customer deleted successfully!")
+            else:
+                self.show_error_dialog("Customer was already deleted.")
+        except Exception as e:
+            self.close_dialog()
+            self.show_error_dialog(f"Error deleting customer: {str(e)}")
     
     def show_success_dialog(self, message):
         """Show success dialog"""
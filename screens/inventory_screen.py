@@ -13,16 +13,38 @@ from kivymd.uix.datatables import MDDataTable
 from kivy.uix.widget import Widget
 from kivy.metrics import dp
 from kivy.app import App
+from database.bulk_import import ProductImporter
+from database.stock_take import StockSession
+from database.events import (
+    CatalogChanged, EventCoalescer, ProductChanged, StockChanged, advance_versions
+)
+import os
+from datetime import datetime
 
 class InventoryScreen(MDScreen):
     """Inventory management screen"""
     
+    # Data versions the product table depends on
+    COUNTERS = ("catalog", "stock")
+    
+    # Changes buffered while the screen is hidden before falling back to a reload
+    MAX_PENDING_EVENTS = 1000
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.dialog = None
         self.selected_product = None
         self.data_table = None
+        self.displayed_products = []
+        self.loaded_versions = None
+        self.pending_events = []
         self.build_ui()
+        
+        # Product and stock changes patch the table instead of reloading it
+        app = App.get_running_app()
+        app.get_db_manager().changes.subscribe(
+            EventCoalescer(self.on_products_changed), (ProductChanged, StockChanged, CatalogChanged)
+        )
     
     def build_ui(self):
         """Build the inventory screen UI"""
@@ -40,6 +62,8 @@ class InventoryScreen(MDScreen):
             ],
             right_action_items=[
                 ["plus", lambda x: self.add_product()],
+                ["file-import", lambda x: self.show_import_dialog()],
+                ["barcode-scan", lambda x: self.show_stock_session_dialog()],
                 ["refresh", lambda x: self.refresh_inventory()]
             ],
             elevation=2
@@ -154,7 +178,19 @@ class InventoryScreen(MDScreen):
     
     def on_enter(self):
         """Called when screen is entered"""
-        self.load_inventory()
+        # Apply changes made while away, then reload only if something was still missed
+        if self.pending_events:
+            events, self.pending_events = self.pending_events, []
+            self.apply_product_changes(events)
+        
+        app = App.get_running_app()
+        if self.loaded_versions is None or self.loaded_versions != self.current_versions(app.get_db_manager()):
+            self.load_inventory()
+    
+    def current_versions(self, db_manager):
+        """Get the data versions the product table depends on"""
+        versions = db_manager.get_data_versions()
+        return {name: versions.get(name, 0) for name in self.COUNTERS}
     
     def load_inventory(self):
         """Load inventory data"""
@@ -162,13 +198,71 @@ class InventoryScreen(MDScreen):
         db_manager = app.get_db_manager()
         
         try:
+            # Read the versions first so a change made while loading marks the list stale
+            versions = self.current_versions(db_manager)
             products = db_manager.get_all_products()
             self.display_inventory(products)
+            self.loaded_versions = versions
+            self.pending_events = []
         except Exception as e:
             print(f"Error loading inventory: {e}")
     
+    def on_products_changed(self, events):
+        """Patch the table with committed product changes, or keep them until the screen is shown"""
+        if self.manager and self.manager.current == self.name:
+            self.apply_product_changes(events)
+        elif len(self.pending_events) + len(events) > self.MAX_PENDING_EVENTS:
+            self.pending_events = []
+            self.loaded_versions = None
+        else:
+            self.pending_events.extend(events)
+    
+    def apply_product_changes(self, events):
+        """Refresh only the changed rows of the displayed products"""
+        app = App.get_running_app()
+        db_manager = app.get_db_manager()
+        
+        # New products can only be placed when the full list is displayed
+        showing_all = self.loaded_versions is not None
+        if showing_all:
+            versions = advance_versions(self.loaded_versions, events)
+            if versions is None or any(isinstance(event, CatalogChanged) for event in events):
+                self.load_inventory()
+                return
+        
+        changed_ids = set()
+        for event in events:
+            if isinstance(event, StockChanged):
+                changed_ids.update(event.product_ids)
+            elif isinstance(event, ProductChanged):
+                changed_ids.add(event.product_id)
+        
+        displayed_ids = {product[0] for product in self.displayed_products}
+        if not showing_all:
+            changed_ids &= displayed_ids
+        
+        try:
+            fresh = {product[0]: product for product in db_manager.get_products_by_ids(changed_ids)}
+            
+            # Deleted products are no longer returned and drop out of the table
+            products = [fresh.get(product[0]) if product[0] in changed_ids else product
+                        for product in self.displayed_products]
+            products = [product for product in products if product]
+            
+            if showing_all:
+                products.extend(product for product_id, product in fresh.items() if product_id not in displayed_ids)
+                products.sort(key=lambda product: product[2])
+            
+            self.display_inventory(products)
+            if showing_all:
+                self.loaded_versions = versions
+        except Exception as e:
+            print(f"Error updating inventory: {e}")
+    
     def display_inventory(self, products):
         """Display inventory in the table"""
+        self.displayed_products = products
+        self.loaded_versions = None
         row_data = []
         
         for product in products:
@@ -243,17 +337,9 @@ class InventoryScreen(MDScreen):
         # Get the selected product based on row index
         row_index = instance_row.index
         
-        app = App.get_running_app()
-        db_manager = app.get_db_manager()
-        
-        try:
-            # Get all products to find the selected one
-            products = db_manager.get_all_products()
-            if row_index < len(products):
-                self.selected_product = products[row_index]
-                self.show_product_actions()
-        except Exception as e:
-            print(f"Error selecting product: {e}")
+        if row_index < len(self.displayed_products):
+            self.selected_product = self.displayed_products[row_index]
+            self.show_product_actions()
     
     def show_product_actions(self):
         """Show product action dialog"""
@@ -464,9 +550,25 @@ class InventoryScreen(MDScreen):
             db_manager = app.get_db_manager()
             
             if edit_mode and self.selected_product:
-                # Update existing product (this would require an update method in database_manager)
-                # For now, we'll show a message
-                self.show_error_dialog("Product update functionality not yet implemented!")
+                # Update existing product
+                product_id = self.selected_product[0]
+                if not db_manager.update_product(
+                    product_id, barcode, name, description, category, price, cost_price, min_stock
+                ):
+                    self.show_error_dialog("Failed to update product. Barcode might already exist.")
+                    return
+                
+                # A changed stock quantity is recorded as an adjustment
+                if stock != self.selected_product[7]:
+                    current_user = app.get_current_user()
+                    if not db_manager.update_product_stock(product_id, stock, current_user['id'], "Product edit",
+                                                           expected_quantity=self.selected_product[7]):
+                        self.show_error_dialog("Product saved, but its stock was changed on another till. "
+                                               "Please reload and set the stock again.")
+                        return
+                
+                self.close_dialog()
+                self.show_success_dialog("Product updated successfully!")
             else:
                 # Add new product
                 product_id = db_manager.add_product(
@@ -475,7 +577,6 @@ class InventoryScreen(MDScreen):
                 
                 if product_id:
                     self.close_dialog()
-                    self.load_inventory()
                     self.show_success_dialog("Product added successfully!")
                 else:
                     self.show_error_dialog("Failed to add product. Barcode might already exist.")
@@ -561,10 +662,12 @@ class InventoryScreen(MDScreen):
             
             product_id = self.selected_product[0]
             
-            db_manager.update_product_stock(product_id, new_quantity, current_user['id'], reason)
+            if not db_manager.update_product_stock(product_id, new_quantity, current_user['id'], reason,
+                                                   expected_quantity=self.selected_product[7]):
+                self.show_error_dialog("Stock was changed on another till. Please reload and try again.")
+                return
             
             self.close_dialog()
-            self.load_inventory()
             self.show_success_dialog("Stock updated successfully!")
             
         except ValueError:
@@ -572,11 +675,222 @@ class InventoryScreen(MDScreen):
         except Exception as e:
             self.show_error_dialog(f"Error updating stock: {str(e)}")
     
+    def show_import_dialog(self, *args):
+        """Show dialog for importing a supplier price list"""
+        content = MDBoxLayout(
+            orientation="vertical",
+            spacing=dp(15),
+            size_hint_y=None,
+            height=dp(100)
+        )
+        
+        self.import_path_field = MDTextField(
+            hint_text="Price list file (.csv, .json or .jsonl)",
+            size_hint_y=None,
+            height=dp(56)
+        )
+        content.add_widget(self.import_path_field)
+        
+        self.dialog = MDDialog(
+            title="Import Products",
+            type="custom",
+            content_cls=content,
+            buttons=[
+                MDFlatButton(
+                    text="CANCEL",
+                    on_release=self.close_dialog
+                ),
+                MDFlatButton(
+                    text="IMPORT",
+                    on_release=self.import_products
+                )
+            ]
+        )
+        
+        self.dialog.open()
+    
+    def import_products(self, *args):
+        """Import products from a price list file"""
+        path = self.import_path_field.text.strip()
+        if not os.path.exists(path):
+            self.close_dialog()
+            self.show_error_dialog(f"File not found: {path}")
+            return
+        
+        try:
+            db_manager = App.get_running_app().get_db_manager()
+            result = ProductImporter(db_manager).import_file(path)
+            
+            message = f"Added {result.inserted} and updated {result.updated} products."
+            if result.rejected:
+                rejects_path = os.path.splitext(path)[0] + "_rejects.csv"
+                ProductImporter.write_rejects(rejects_path, result.rejected)
+                message += f"\n{len(result.rejected)} rows rejected, see {rejects_path}"
+            
+            self.close_dialog()
+            self.load_inventory()
+            self.show_success_dialog(message)
+            
+        except Exception as e:
+            self.close_dialog()
+            self.show_error_dialog(f"Error importing products: {str(e)}")
+    
+    def show_stock_session_dialog(self, *args):
+        """Show stock take / goods receiving dialog for scanner input"""
+        self.stock_session = StockSession(App.get_running_app().get_db_manager(), "count")
+        
+        content = MDBoxLayout(
+            orientation="vertical",
+            spacing=dp(10),
+            size_hint_y=None,
+            height=dp(200)
+        )
+        
+        self.session_mode_button = MDRaisedButton(
+            text="MODE: STOCK TAKE",
+            size_hint=(1, None),
+            height=dp(40),
+            on_release=self.toggle_stock_session_mode
+        )
+        
+        self.session_barcode_field = MDTextField(
+            hint_text="Scan barcode",
+            size_hint_y=None,
+            height=dp(56)
+        )
+        self.session_barcode_field.bind(on_text_validate=self.scan_stock_entry)
+        
+        self.session_quantity_field = MDTextField(
+            hint_text="Quantity per scan",
+            input_filter="int",
+            text="1",
+            size_hint_y=None,
+            height=dp(56)
+        )
+        
+        self.session_status_label = MDLabel(
+            text="0 products scanned",
+            theme_text_color="Secondary",
+            size_hint_y=None,
+            height=dp(30)
+        )
+        
+        content.add_widget(self.session_mode_button)
+        content.add_widget(self.session_barcode_field)
+        content.add_widget(self.session_quantity_field)
+        content.add_widget(self.session_status_label)
+        
+        self.dialog = MDDialog(
+            title="Stock Take / Receiving",
+            type="custom",
+            content_cls=content,
+            buttons=[
+                MDFlatButton(
+                    text="CANCEL",
+                    on_release=self.close_dialog
+                ),
+                MDFlatButton(
+                    text="APPLY",
+                    on_release=self.apply_stock_session
+                )
+            ]
+        )
+        
+        self.dialog.open()
+    
+    def toggle_stock_session_mode(self, *args):
+        """Switch the session between stock take and goods receiving"""
+        mode = "receive" if self.stock_session.mode == "count" else "count"
+        entries = self.stock_session.entries
+        self.stock_session = StockSession(self.stock_session.db_manager, mode)
+        self.stock_session.entries = entries
+        self.session_mode_button.text = "MODE: RECEIVING" if mode == "receive" else "MODE: STOCK TAKE"
+    
+    def scan_stock_entry(self, *args):
+        """Add the scanned barcode to the stock session"""
+        barcode = self.session_barcode_field.text.strip()
+        if not barcode:
+            return
+        
+        try:
+            quantity = int(self.session_quantity_field.text or 1)
+        except ValueError:
+            quantity = 1
+        
+        self.stock_session.scan(barcode, quantity)
+        self.session_barcode_field.text = ""
+        self.session_barcode_field.focus = True
+        self.session_status_label.text = f"{len(self.stock_session.entries)} products scanned (last: {barcode})"
+    
+    def apply_stock_session(self, *args):
+        """Apply the stock session and show the variance report"""
+        if not self.stock_session.entries:
+            self.close_dialog()
+            self.show_error_dialog("No products scanned!")
+            return
+        
+        try:
+            current_user = App.get_running_app().get_current_user()
+            report = self.stock_session.apply(current_user['id'])
+            
+            os.makedirs(os.path.join("assets", "reports"), exist_ok=True)
+            report_path = os.path.join("assets", "reports", f"stock_{report.mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            StockSession.write_report(report_path, report)
+            
+            message = f"{len(report.lines)} products changed, {report.total_units:+d} units (${report.total_value:+.2f})."
+            if report.unknown_barcodes:
+                message += f"\n{len(report.unknown_barcodes)} unknown barcodes."
+            message += f"\nReport saved to {report_path}"
+            
+            self.close_dialog()
+            self.load_inventory()
+            self.show_success_dialog(message)
+            
+        except Exception as e:
+            self.close_dialog()
+            self.show_error_dialog(f"Error applying stock session: {str(e)}")
+    
     def delete_product(self, *args):
         """Delete product (mark as inactive)"""
-        # This would require implementing a soft delete in the database
+        if not self.selected_product:
+            return
+        
         self.close_dialog()
-        self.show_error_dialog("Product deletion functionality not yet implemented!")
+        
+        self.dialog = MDDialog(
+            title="Delete Product",
+            text=f"Delete {self.selected_product[2]}? Its sales history is kept.",
+            buttons=[
+                MDFlatButton(
+                    text="CANCEL",
+                    on_release=self.close_dialog
+                ),
+                MDRaisedButton(
+                    text="DELETE",
+                    md_bg_color="Red",
+                    on_release=self.confirm_delete_product
+                )
+            ]
+        )
+        self.dialog.open()
+    
+    def confirm_delete_product(self, *args):
+        """Soft delete the selected product"""
+        app = App.get_running_app()
+        db_manager = app.get_db_manager()
+        
+        try:
+            deleted = db_manager.delete_product(self.selected_product[0])
+            self.close_dialog()
+            self.selected_product = None
+            
+            if deleted:
+                self.show_success_dialog("Product deleted successfully!")
+            else:
+                self.show_error_dialog("Product was already deleted.")
+        except Exception as e:
+            self.close_dialog()
+            self.show_error_dialog(f"Error deleting product: {str(e)}")
     
     def show_success_dialog(self, message):
         """Show success dialog"""
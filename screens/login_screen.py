@@ -77,7 +77,7 @@ class LoginScreen(MDScreen):
         
         # Password field
         self.password_field = MDTextField(
-            hint_text="Password",
+            hint_text="Password or PIN",
             icon_right="eye-off",
             password=True,
             size_hint_y=None,
@@ -132,8 +132,8 @@ class LoginScreen(MDScreen):
         app = App.get_running_app()
         db_manager = app.get_db_manager()
         
-        # Authenticate user
-        user_data = db_manager.authenticate_user(username, password)
+        # Users who logged in with their password this shift can switch back by PIN
+        user_data = db_manager.login(username, password)
         
         if user_data:
             # Login successful
@@ -3,12 +3,16 @@ from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.gridlayout import MDGridLayout
 from kivymd.uix.card import MDCard
 from kivymd.uix.label import MDLabel
-from kivymd.uix.button import MDRaisedButton, MDIconButton
+from kivymd.uix.button import MDRaisedButton, MDIconButton, MDFlatButton
+from kivymd.uix.dialog import MDDialog
+from kivymd.uix.textfield import MDTextField
 from kivymd.uix.toolbar import MDTopAppBar
 from kivy.uix.widget import Widget
 from kivy.metrics import dp
 from kivy.app import App
+from kivy.clock import Clock
 from datetime import datetime
+from database.events import CatalogChanged, EventCoalescer, ProductChanged, SaleCreated, StockChanged
 
 class MainMenuScreen(MDScreen):
     """Main menu/dashboard screen"""
@@ -16,7 +20,19 @@ class MainMenuScreen(MDScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.user_data = None
+        self.dialog = None
         self.build_ui()
+        
+        # Keep the stats live while the menu is showing, one refresh per frame at most
+        app = App.get_running_app()
+        app.get_db_manager().changes.subscribe(
+            EventCoalescer(self.on_data_changed), (SaleCreated, StockChanged, ProductChanged, CatalogChanged)
+        )
+    
+    def on_data_changed(self, events):
+        """Refresh the quick stats after committed changes (on_enter covers a hidden menu)"""
+        if self.user_data and self.manager and self.manager.current == self.name:
+            self.update_quick_stats()
     
     def build_ui(self):
         """Build the main menu UI"""
@@ -30,6 +46,8 @@ class MainMenuScreen(MDScreen):
         self.toolbar = MDTopAppBar(
             title="Store POS - Main Menu",
             right_action_items=[
+                ["dialpad", lambda x: self.show_pin_dialog()],
+                ["database-export", lambda x: self.backup_now()],
                 ["logout", lambda x: self.logout()]
             ],
             elevation=2
@@ -308,6 +326,87 @@ class MainMenuScreen(MDScreen):
         app = App.get_running_app()
         app.switch_screen("reports")
     
+    def show_pin_dialog(self, *args):
+        """Show the dialog to set the quick switch PIN"""
+        self.pin_field = MDTextField(
+            hint_text="New PIN (4 to 8 digits)",
+            input_filter="int",
+            password=True,
+            max_text_length=8,
+            size_hint_y=None,
+            height=dp(56)
+        )
+        
+        self.dialog = MDDialog(
+            title="Quick Switch PIN",
+            text="Log back in with this PIN instead of your password until the app is closed.",
+            type="custom",
+            content_cls=self.pin_field,
+            buttons=[
+                MDFlatButton(
+                    text="CANCEL",
+                    on_release=self.close_dialog
+                ),
+                MDFlatButton(
+                    text="SAVE",
+                    on_release=self.save_pin
+                )
+            ]
+        )
+        self.dialog.open()
+    
+    def save_pin(self, *args):
+        """Save the quick switch PIN of the logged in user"""
+        app = App.get_running_app()
+        
+        try:
+            app.get_db_manager().set_user_pin(self.user_data['id'], self.pin_field.text.strip())
+            self.close_dialog()
+        except ValueError as e:
+            self.pin_field.error = True
+            self.pin_field.helper_text = str(e)
+            self.pin_field.helper_text_mode = "on_error"
+        except Exception as e:
+            print(f"Error saving PIN: {e}")
+            self.close_dialog()
+    
+    def backup_now(self, *args):
+        """Back up the database in the background while the tills keep working"""
+        app = App.get_running_app()
+        app.get_backups().backup_now(
+            lambda result: Clock.schedule_once(lambda dt: self.on_backup_done(result))
+        )
+        self.show_message("Backup", "Backing up the database. You can keep working.")
+    
+    def on_backup_done(self, result):
+        """Report a finished backup (called on the UI thread)"""
+        if isinstance(result, Exception):
+            self.show_message("Backup Failed", str(result))
+        else:
+            self.show_message("Backup Complete", f"Saved to {result.path}\n"
+                                                 f"({result.compressed_size / 1024:.0f} KB, checked OK)")
+    
+    def show_message(self, title, message):
+        """Show information dialog"""
+        self.close_dialog()
+        self.dialog = MDDialog(
+            title=title,
+            text=message,
+            buttons=[
+                MDFlatButton(
+                    text="OK",
+                    on_release=self.close_dialog
+                )
+            ]
+        )
+        self.dialog.open()
+    
+    def close_dialog(self, *args):
+        """Close dialog"""
+        if self.dialog:
+            self.dialog.dismiss()
+            self.dialog = None
+    
     def logout(self, *args):
         """Handle logout"""
         app = App.get_running_app()
@@ -506,7 +506,7 @@ class ReportsScreen(MDScreen):
             # Generate report filename
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"{self.current_report_type}_report_{timestamp}.txt"
-            filepath = os.path.join("assets", "receipts", filename)
+            filepath = os.path.join("assets", "reports", filename)
             
             # Generate report content
             content = f"{self.report_title.text}\n"
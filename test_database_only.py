@@ -6,12 +6,39 @@ This tests the core database operations without requiring GUI dependencies.
 
 import sys
 import os
+import hashlib
+import http.client
+import json
+import sqlite3
+import tempfile
+import threading
+import time
 from datetime import datetime
 
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database.database_manager import DatabaseManager
+from database.customer_lookup import CustomerLookup
+from database.sale_journal import SaleJournal
+from database.group_commit import GroupCommitWriter
+from database.bulk_import import ProductImporter
+from database.stock_take import StockSession
+from database.query_stats import QueryStats
+from database.concurrency import InsufficientStockError
+from database.sync import SyncClient, SyncError, SyncServer
+from database.backup import BackupError, BackupManager
+from database.maintenance import MaintenanceScheduler
+from database.migrations import MIGRATIONS, MigrationError, MigrationRunner, backfill_step, index_step
+from database.events import (
+    EventCoalescer, ProductChanged, SaleCreated, StockChanged, advance_versions
+)
+from utils.receipt_writer import ReceiptWriter, snapshot_sale
+from utils.receipt_renderer import ReceiptRenderer, load_template
+from utils.receipt_store import ReceiptStore
+from utils.ui_profiler import UIProfiler
+from benchmarks.datagen import StoreScale, generate_store
+from benchmarks.suite import compare
 
 def test_database_functionality():
     """Test all database operations"""
@@ -102,6 +129,19 @@ def test_database_functionality():
         customer_search = db_manager.search_customers("Test")
         print(f"✅ Customer search for 'Test' returned {len(customer_search)} results")
         
+        # Typo tolerant name search and phone number prefix search
+        typo_search = db_manager.search_customers("Tset Custmer")
+        if any(customer[0] == test_customer_id for customer in typo_search):
+            print("✅ Misspelled customer search found the test customer")
+        else:
+            print("❌ Misspelled customer search missed the test customer")
+        
+        phone_search = db_manager.search_customers("123-456")
+        if any(customer[0] == test_customer_id for customer in phone_search):
+            print("✅ Phone prefix search found the test customer")
+        else:
+            print("❌ Phone prefix search missed the test customer")
+        
         # Test sales operations
         print("\n5. Testing Sales Operations...")
         
@@ -174,16 +214,1137 @@ def test_database_functionality():
             except Exception as e:
                 print(f"❌ Stock update failed: {str(e)}")
         
+        # Test customer purchase history
+        print("\n8. Testing Customer Purchase History...")
+        
+        summary = db_manager.get_customer_purchase_summary(1)
+        print(f"✅ Walk-in customer: {summary['sale_count']} purchases, ${summary['total_spent']:.2f} spent")
+        
+        first_page = db_manager.get_customer_purchase_history(1, limit=1)
+        if first_page:
+            next_page = db_manager.get_customer_purchase_history(1, limit=1, before_sale_id=first_page[0][0])
+            if all(sale[0] < first_page[0][0] for sale in next_page):
+                print("✅ Purchase history paging verified")
+            else:
+                print("❌ Purchase history paging returned overlapping rows")
+        
+        top_products = db_manager.get_customer_top_products(1)
+        print(f"✅ Top products for walk-in customer: {len(top_products)}")
+        
+        # Test customer picker lookup
+        print("\n9. Testing Customer Lookup...")
+        
+        lookup = CustomerLookup(db_manager)
+        test_customer = db_manager.get_customer_by_id(test_customer_id)
+        lookup.remember(test_customer)
+        if lookup.recent_customers() and lookup.recent_customers()[0][0] == test_customer_id:
+            print("✅ Recently served customer remembered")
+        else:
+            print("❌ Recently served customer not remembered")
+        
+        if lookup.search("test cust") and lookup.search("test cust")[0][0] == test_customer_id:
+            print("✅ Recent customer returned first from lookup search")
+        else:
+            print("❌ Lookup search missed the recent customer")
+        
+        # The data version is read when the picker opens, not on every keystroke
+        version_reads = []
+        get_data_version = db_manager.get_data_version
+        db_manager.get_data_version = lambda name: version_reads.append(name) or get_data_version(name)
+        try:
+            lookup.start_search()
+            for typed in ("t", "te", "tes", "test", "test c"):
+                lookup.search(typed)
+        finally:
+            del db_manager.get_data_version
+        if version_reads == ["customers"]:
+            print("✅ Customer data version checked once per search")
+        else:
+            print(f"❌ Customer data version read {len(version_reads)} times for one search")
+        
+        balance = lookup.get_balance(test_customer_id)
+        print(f"✅ Test customer dinau balance: ${balance:.2f}")
+        
+        # Test sale journal
+        print("\n10. Testing Sale Journal...")
+        
+        if products and admin_user:
+            journal_path = "test_store_pos_sales.journal"
+            journal_items = [{'product_id': products[0][0], 'quantity': 1, 'unit_price': products[0][5]}]
+            
+            # Sales journaled without an applier running are left in the file, as after a crash
+            crashed_journal = SaleJournal(db_manager, journal_path)
+            crashed_sale = crashed_journal.record_sale(admin_user['id'], 1, products[0][5], 'cash', journal_items)
+            crashed_journal._file.close()
+            
+            sale_journal = SaleJournal(db_manager, journal_path)
+            sale_journal.start()
+            journaled_sales = [
+                sale_journal.record_sale(admin_user['id'], test_customer_id, products[0][5], 'dinau', journal_items)
+                for _ in range(3)
+            ]
+            sale_journal.wait_until_applied(timeout=5)
+            sale_journal.stop()
+            
+            if len(set(journaled_sales + [crashed_sale])) == 4:
+                print("✅ Journaled sales got unique sale numbers")
+            else:
+                print("❌ Journaled sales share sale numbers")
+            
+            conn = db_manager.get_connection()
+            cursor = conn.cursor()
+            placeholders = ",".join("?" * 4)
+            cursor.execute(f'SELECT COUNT(*) FROM sales WHERE sale_number IN ({placeholders})',
+                           journaled_sales + [crashed_sale])
+            committed = cursor.fetchone()[0]
+            conn.close()
+            
+            if committed == 4:
+                print("✅ Journaled and recovered sales committed to the database")
+            else:
+                print(f"❌ Only {committed} of 4 journaled sales committed")
+            
+            if os.path.getsize(journal_path) == 0:
+                print("✅ Sale journal truncated after applying")
+            else:
+                print("❌ Sale journal not truncated after applying")
+            
+            print(f"✅ Test customer dinau balance after journaled sales: ${db_manager.get_customer_dinau_balance(test_customer_id):.2f}")
+            os.remove(journal_path)
+        
+        # Test group commit
+        print("\n11. Testing Group Commit...")
+        
+        if products and admin_user:
+            writer = GroupCommitWriter(db_manager)
+            group_items = [{'product_id': products[0][0], 'quantity': 1, 'unit_price': products[0][5]}]
+            futures = [
+                writer.submit_sale(admin_user['id'], 1, products[0][5], 'cash', group_items)
+                for _ in range(5)
+            ]
+            
+            # A sale with an unknown payment method fails on its own
+            bad_future = writer.submit_sale(admin_user['id'], 1, 1.0, 'credit', group_items)
+            results = [future.result(timeout=5) for future in futures]
+            writer.stop()
+            
+            if len({sale_id for sale_id, sale_number in results}) == 5:
+                print(f"✅ Group commit returned {len(results)} distinct sale ids")
+            else:
+                print("❌ Group commit returned duplicate sale ids")
+            
+            if bad_future.exception(timeout=5) is not None:
+                print("✅ Invalid sale rejected without affecting the rest of the batch")
+            else:
+                print("❌ Invalid sale was accepted")
+        
+        # Test background receipt writer
+        print("\n12. Testing Receipt Writer...")
+        
+        cart = [{'name': 'Coca Cola 500ml', 'unit_price': 2.50, 'quantity': 2, 'total': 5.00}]
+        record = snapshot_sale("SALETEST1", "System Administrator", "cash", 5.00, cart)
+        cart.clear()
+        
+        with tempfile.TemporaryDirectory() as receipts_dir:
+            receipt_writer = ReceiptWriter(receipts_dir)
+            receipt_writer.submit(record)
+            receipt_writer.stop()
+            
+            with open(receipt_writer.receipt_path("SALETEST1")) as f:
+                receipt_text = f.read()
+            
+            if "Coca Cola 500ml\n  $2.50 x 2 = $5.00" in receipt_text and "Payment: CASH" in receipt_text:
+                print("✅ Receipt written from the sale snapshot after the cart was cleared")
+            else:
+                print("❌ Receipt content is wrong")
+        
+        # Test receipt rendering from the database
+        print("\n13. Testing Receipt Rendering...")
+        
+        renderer = ReceiptRenderer(db_manager)
+        sales = db_manager.get_sales_report()
+        if sales:
+            receipt_text = renderer.render_sale(sales[0][0])
+            if sales[0][1] in receipt_text:
+                print(f"✅ Text receipt rendered for {sales[0][1]}")
+            else:
+                print("❌ Text receipt is missing the sale number")
+            
+            escpos = renderer.render_sale(sales[0][0], "escpos")
+            if escpos.startswith(b"\x1b@") and sales[0][1].encode() in escpos:
+                print(f"✅ ESC/POS receipt rendered ({len(escpos)} bytes)")
+            else:
+                print("❌ ESC/POS receipt is malformed")
+        
+        with tempfile.TemporaryDirectory() as template_dir:
+            template_path = os.path.join(template_dir, "receipt.txt")
+            with open(template_path, 'w') as f:
+                f.write("[header]\nNo. {sale_number}\n[line]\n{quantity} {name}\n[footer]\nTotal {total_amount:.2f}\n")
+            
+            if load_template(template_path) is load_template(template_path):
+                print("✅ Parsed receipt template is cached")
+            else:
+                print("❌ Receipt template parsed again")
+            
+            receipt_writer = ReceiptWriter(os.path.join(template_dir, "receipts"),
+                                           ReceiptRenderer(db_manager, template_path))
+            receipt_writer.submit(record)
+            receipt_writer.stop()
+            with open(receipt_writer.receipt_path("SALETEST1")) as f:
+                receipt_text = f.read()
+            if receipt_text == "No. SALETEST1\n2 Coca Cola 500ml\nTotal 5.00\n":
+                print("✅ Receipt writer lays out receipts with the store's template")
+            else:
+                print(f"❌ Receipt writer ignored the template: {receipt_text!r}")
+        
+        # Test sharded receipt store and archive compaction
+        print("\n14. Testing Receipt Store...")
+        
+        with tempfile.TemporaryDirectory() as receipts_dir:
+            store = ReceiptStore(receipts_dir)
+            old_receipts = {f"SALE20200101120000-{n}": f"Old receipt {n}\n" for n in range(1, 4)}
+            for sale_number, content in old_receipts.items():
+                store.write(sale_number, content)
+            new_sale = f"SALE{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            store.write(new_sale, "New receipt\n")
+            
+            archived = store.compact(older_than_days=30)
+            if archived == 3 and not os.path.exists(os.path.join(receipts_dir, "2020")):
+                print(f"✅ {archived} old receipts compacted into archives")
+            else:
+                print(f"❌ Compaction archived {archived} receipts")
+            
+            if all(store.read(sale_number) == content for sale_number, content in old_receipts.items()):
+                print("✅ Archived receipts read back by sale number")
+            else:
+                print("❌ Archived receipts could not be read back")
+            
+            if store.read(new_sale) == "New receipt\n" and store.read("SALE19990101000000") is None:
+                print("✅ Recent receipts stay in their day shard")
+            else:
+                print("❌ Recent receipt lookup failed")
+        
+        # Test bulk product import
+        print("\n15. Testing Bulk Product Import...")
+        
+        with tempfile.TemporaryDirectory() as import_dir:
+            price_list = os.path.join(import_dir, "price_list.csv")
+            with open(price_list, 'w') as f:
+                f.write("Barcode,Product Name,Category,Price,Cost,Qty\n")
+                f.write("9000000000001,Tinned Fish 425g,Groceries,6.50,4.80,24\n")
+                f.write("9000000000002,Sugar 1kg,Groceries,3.20,2.40,40\n")
+                f.write("1234567890123,Coca Cola 500ml,Beverages,2.80,1.90,999\n")
+                f.write(",Missing Barcode,Groceries,1.00,0.50,1\n")
+                f.write("9000000000003,Not A Price,Groceries,nan,0.50,1\n")
+                f.write("9000000000004,Endless Price,Groceries,2.00,inf,1\n")
+            
+            coke_before = db_manager.get_product_by_barcode("1234567890123")
+            result = ProductImporter(db_manager).import_file(price_list)
+            coke_after = db_manager.get_product_by_barcode("1234567890123")
+            
+            if (len(result.rejected) == 3 and result.inserted + result.updated == 3
+                    and db_manager.get_product_by_barcode("9000000000003") is None):
+                print(f"✅ Imported price list: {result.inserted} added, {result.updated} updated, {len(result.rejected)} rejected")
+            else:
+                print(f"❌ Unexpected import result: {result.inserted} added, {result.updated} updated, {len(result.rejected)} rejected")
+            
+            if coke_after[5] == 2.80 and coke_after[7] == coke_before[7]:
+                print("✅ Existing product repriced by barcode with its stock untouched")
+            else:
+                print("❌ Existing product was not upserted correctly")
+        
+        # Test stock take and goods receiving
+        print("\n16. Testing Stock Take and Receiving...")
+        
+        if admin_user:
+            bread_before = db_manager.get_product_by_barcode("2345678901234")[7]
+            
+            receiving = StockSession(db_manager, "receive")
+            for _ in range(3):
+                receiving.scan("2345678901234", 2)
+            receiving.scan("0000000000000")
+            received = receiving.apply(admin_user['id'])
+            
+            bread_after = db_manager.get_product_by_barcode("2345678901234")[7]
+            if bread_after == bread_before + 6 and received.unknown_barcodes == ["0000000000000"]:
+                print(f"✅ Received 6 units of bread ({bread_before} -> {bread_after}), unknown barcode reported")
+            else:
+                print(f"❌ Goods receiving failed: {bread_before} -> {bread_after}")
+            
+            stock_take = StockSession(db_manager, "count")
+            stock_take.set_quantity("3456789012345", 20)
+            stock_take.set_quantity("2345678901234", bread_after)
+            variance = stock_take.apply(admin_user['id'])
+            
+            milk = db_manager.get_product_by_barcode("3456789012345")
+            if milk[7] == 20 and all(line.barcode != "2345678901234" for line in variance.lines):
+                print(f"✅ Stock take applied: {len(variance.lines)} variances, {variance.total_units:+d} units (${variance.total_value:+.2f})")
+            else:
+                print("❌ Stock take variance is wrong")
+        
+        # Test product and customer updates with data versions
+        print("\n17. Testing Updates, Soft Deletes and Data Versions...")
+        
+        versions = db_manager.get_data_versions()
+        rice = db_manager.get_product_by_barcode("5678901234567")
+        updated = db_manager.update_product(rice[0], rice[1], "Jasmine Rice 2kg", rice[3], rice[4], 8.50, rice[6], rice[8])
+        taken = db_manager.update_product(rice[0], "1234567890123", rice[2], rice[3], rice[4], rice[5], rice[6], rice[8])
+        new_versions = db_manager.get_data_versions()
+        
+        rice = db_manager.get_product_by_barcode("5678901234567")
+        if (updated and not taken and rice[2] == "Jasmine Rice 2kg" and rice[5] == 8.50
+                and new_versions["catalog"] == versions["catalog"] + 1
+                and new_versions["stock"] == versions["stock"]):
+            print(f"✅ Product updated, duplicate barcode refused, catalog version {versions['catalog']} -> {new_versions['catalog']}")
+        else:
+            print("❌ Product update or catalog versioning failed")
+        
+        product_id = db_manager.add_product("9999999999999", "Discontinued Item", "", "Test", 1.00, 0.50, 3)
+        if db_manager.delete_product(product_id) and not db_manager.get_product_by_id(product_id) \
+                and not db_manager.delete_product(product_id):
+            print("✅ Product soft deleted and hidden from lookups")
+        else:
+            print("❌ Product soft delete failed")
+        
+        customers_version = db_manager.get_data_version("customers")
+        customer_id = db_manager.add_customer("Temporary Customer", "555-0000")
+        lookup = CustomerLookup(db_manager)
+        lookup.remember(db_manager.get_customer_by_id(customer_id))
+        db_manager.update_customer(customer_id, "Renamed Customer", "555-0001")
+        
+        if (db_manager.search_customers("Renamed") and not db_manager.search_customers("Temporary")
+                and lookup.start_search() == [] and db_manager.get_data_version("customers") == customers_version + 2):
+            print("✅ Customer updated and re-indexed, stale lookup cache dropped")
+        else:
+            print("❌ Customer update failed")
+        
+        if db_manager.delete_customer(customer_id) and not db_manager.search_customers("Renamed") \
+                and not db_manager.get_customer_by_id(customer_id):
+            print("✅ Customer soft deleted and removed from search")
+        else:
+            print("❌ Customer soft delete failed")
+        
+        # Test the change feed
+        print("\n18. Testing Change Feed...")
+        
+        received = []
+        frames = []
+        coalescer = EventCoalescer(received.append, schedule=frames.append)
+        db_manager.changes.subscribe(coalescer, (SaleCreated, StockChanged, ProductChanged))
+        loaded = {name: version for name, version in db_manager.get_data_versions().items()
+                  if name in ("catalog", "stock")}
+        
+        if admin_user:
+            writer = GroupCommitWriter(db_manager)
+            futures = [writer.submit_sale(admin_user['id'], 1, 2.50, "cash",
+                                          [{'product_id': 1, 'quantity': 1, 'unit_price': 2.50}])
+                       for _ in range(5)]
+            for future in futures:
+                future.result()
+            writer.stop()
+            
+            db_manager.update_product(1, "1234567890123", "Coca Cola 500ml", "Soft drink", "Beverages", 2.60, 1.80, 5)
+            
+            # All events of the burst are delivered together on one frame
+            for flush in frames:
+                flush()
+            events = received[0] if len(received) == 1 else []
+            sales = [event for event in events if isinstance(event, SaleCreated)]
+            versions = advance_versions(loaded, events)
+            
+            if len(frames) == 1 and len(sales) == 5 and versions == {
+                    name: version for name, version in db_manager.get_data_versions().items()
+                    if name in ("catalog", "stock")}:
+                print(f"✅ {len(events)} events coalesced into one delivery, versions advanced to {versions}")
+            else:
+                print(f"❌ Change events were not coalesced: {len(frames)} frames, {len(sales)} sales")
+            
+            if advance_versions(loaded, [StockChanged((1,), loaded["stock"] + 2)]) is None:
+                print("✅ A skipped version is detected and forces a reload")
+            else:
+                print("❌ Missed change went undetected")
+        
+        db_manager.changes.unsubscribe(coalescer)
+        
+        # Test startup on an existing database
+        print("\n19. Testing Schema Version Check at Startup...")
+        
+        walk_in_count = len([c for c in db_manager.get_all_customers() if c[1] == "Walk-in Customer"])
+        restarted = DatabaseManager("test_store_pos.db")
+        walk_in_after = len([c for c in restarted.get_all_customers() if c[1] == "Walk-in Customer"])
+        
+        if not restarted.schema_upgraded and walk_in_after == walk_in_count:
+            print(f"✅ Current schema skipped, no data re-seeded (startup {restarted.startup_timings['total']:.2f} ms)")
+        else:
+            print("❌ Restart re-ran schema setup or duplicated seed data")
+        
+        # Test schema migrations
+        print("\n20. Testing Schema Migrations...")
+        
+        conn = db_manager.get_connection()
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT id FROM sales WHERE DATE(created_at) BETWEEN '2025-01-01' AND '2025-01-31'
+        ''').fetchall()
+        if any("idx_sales_date" in step[-1] for step in plan):
+            print("✅ Sales by day migration applied, date range reports use the index")
+        else:
+            print("❌ Sales date index missing")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            migrated_db = DatabaseManager(os.path.join(scratch, "migrate.db"))
+            migrated_conn = migrated_db.get_connection()
+            backfill = backfill_step(100, "reset min stock", "products", '''
+                UPDATE products SET min_stock_level = 7 WHERE rowid BETWEEN :first AND :last
+            ''', batch_size=2)
+            applied = MigrationRunner(migrated_conn, MIGRATIONS + [backfill]).run()
+            again = MigrationRunner(migrated_conn, MIGRATIONS + [backfill]).run()
+            levels = {row[0] for row in migrated_conn.execute('SELECT min_stock_level FROM products')}
+            
+            if [step[0] for step in applied] == [100] and again == [] and levels == {7}:
+                print(f"✅ Backfill applied in batches ({applied[0][2]:.1f} ms) and not repeated")
+            else:
+                print(f"❌ Backfill migration failed: {applied}, {again}, {levels}")
+            
+            edited = backfill._replace(statements=("UPDATE products SET min_stock_level = 8 WHERE rowid BETWEEN :first AND :last",))
+            newer = index_step(101, "index products by category", '''
+                CREATE INDEX IF NOT EXISTS idx_products_category ON products (category)
+            ''')
+            try:
+                MigrationRunner(migrated_conn, MIGRATIONS + [edited, newer]).run()
+                print("❌ Edited migration was not detected")
+            except MigrationError as e:
+                print(f"✅ Edited migration refused: {e}")
+            migrated_conn.close()
+        
+        # Test benchmark data generator
+        print("\n21. Testing Benchmark Data Generator...")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            tiny = StoreScale(products=20, customers=30, days=5, sales_per_day=10, dinau_share=0.3)
+            fingerprints = []
+            for name in ("first.db", "second.db"):
+                store = generate_store(os.path.join(scratch, name), tiny, seed=7)
+                store_conn = DatabaseManager(store.db_path).get_connection()
+                fingerprints.append(store_conn.execute('''
+                    SELECT COUNT(*), ROUND(SUM(total_amount), 2), MIN(created_at), MAX(created_at) FROM sales
+                ''').fetchone() + store_conn.execute('''
+                    SELECT COUNT(*), ROUND(SUM(amount), 2) FROM dinau_transactions
+                ''').fetchone())
+                store_conn.close()
+            
+            if fingerprints[0] == fingerprints[1] and fingerprints[0][0] == store.sale_count > 0:
+                print(f"✅ Same seed generates the same store ({store.sale_count} sales over {tiny.days} days)")
+            else:
+                print(f"❌ Generated stores differ: {fingerprints}")
+        
+        baseline = {"results": {"lookup": {"p50_ms": 1.0}, "report": {"p50_ms": 5.0}}}
+        current = {"results": {"lookup": {"p50_ms": 1.05}, "report": {"p50_ms": 8.0}}}
+        statuses = {row[0]: row[4] for row in compare(current, baseline, threshold=0.25, min_delta_ms=0.1)}
+        if statuses == {"lookup": "ok", "report": "REGRESSION"}:
+            print("✅ Benchmark comparison flags slowed down results only")
+        else:
+            print(f"❌ Benchmark comparison wrong: {statuses}")
+        
+        # Test query timing and slow query log
+        print("\n22. Testing Query Timing and Slow Query Log...")
+        
+        db_manager.stats = QueryStats(slow_query_ms=0)
+        products = db_manager.search_products("Bread")
+        db_manager.get_sales_report("2025-01-01", "2025-01-31")
+        snapshot = db_manager.stats.snapshot()
+        
+        search = snapshot["methods"].get("search_products", {})
+        statement_rows = sum(stats["rows"] for sql, stats in snapshot["statements"].items() if "LIKE" in sql)
+        if search.get("count") == 1 and search.get("rows") == len(products) == statement_rows and snapshot["connect"]["count"] == 2:
+            print(f"✅ Method, statement and connection timings recorded ({search['total_ms']:.2f} ms search)")
+        else:
+            print(f"❌ Query timings wrong: {search}, {statement_rows}, {snapshot['connect']}")
+        
+        report_query = [entry for entry in db_manager.stats.slow_queries if entry.method == "get_sales_report"]
+        if report_query and any("idx_sales_date" in step for step in report_query[0].plan):
+            print(f"✅ Slow query logged with its plan: {report_query[0].plan[0]}")
+        else:
+            print(f"❌ Slow query log missing the report query: {list(db_manager.stats.slow_queries)}")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            stats_path = os.path.join(scratch, "query_stats.json")
+            db_manager.stats.dump(stats_path)
+            if os.path.getsize(stats_path) > 0 and "search_products" in db_manager.stats.report():
+                print("✅ Query stats dumped and reported")
+            else:
+                print("❌ Query stats dump failed")
+        db_manager.stats = QueryStats()
+        
+        # Test UI profiler
+        print("\n23. Testing UI Profiler...")
+        
+        class ProfiledScreen:
+            def refresh(self, pause):
+                self.redraw(pause)
+            
+            def redraw(self, pause):
+                time.sleep(pause)
+        
+        profiler = UIProfiler(slow_handler_ms=20, long_frame_ms=50)
+        profiler.instrument(ProfiledScreen)
+        profiled = ProfiledScreen()
+        profiled.refresh(0)
+        profiler.on_frame(1 / 60)
+        profiled.refresh(0.03)
+        profiler.on_frame(0.1)
+        
+        events = [event["type"] for event in profiler.events]
+        long_frame = profiler.events[-1]
+        if (profiler.handlers["ProfiledScreen.refresh"].count == 2 and events == ["slow_handler", "long_frame"]
+                and long_frame["handlers"][0][0] == "ProfiledScreen.refresh" and profiler.dropped_frames == 5):
+            print(f"✅ Long frame attributed to {long_frame['handlers'][0][0]} ({long_frame['dropped']} frames dropped)")
+        else:
+            print(f"❌ UI profiler wrong: {list(profiler.events)}, {profiler.dropped_frames}")
+        
+        # Test password hashing and PIN quick switch
+        print("\n24. Testing Password Hashing and PIN Quick Switch...")
+        
+        conn = db_manager.get_connection()
+        conn.execute("UPDATE users SET password_hash = ? WHERE username = 'cashier'",
+                     (hashlib.sha256("cashier123".encode()).hexdigest(),))
+        conn.commit()
+        cashier = db_manager.authenticate_user("cashier", "cashier123")
+        stored = conn.execute("SELECT password_hash FROM users WHERE username = 'cashier'").fetchone()[0]
+        conn.close()
+        
+        if cashier and stored.startswith("pbkdf2_sha256$") and db_manager.authenticate_user("cashier", "cashier123"):
+            print(f"✅ Legacy password hash upgraded at login ({stored.split('$')[1]} iterations)")
+        else:
+            print(f"❌ Legacy password hash not upgraded: {stored}")
+        
+        db_manager.set_user_pin(cashier['id'], "4321")
+        db_manager.sessions.clear()
+        no_session = db_manager.switch_user("cashier", "4321")
+        db_manager.authenticate_user("cashier", "cashier123")
+        first = db_manager.switch_user("cashier", "4321")
+        started = time.perf_counter()
+        cached = db_manager.switch_user("cashier", "4321")
+        cached_ms = (time.perf_counter() - started) * 1000
+        
+        if no_session is None and first and cached and cached['id'] == cashier['id']:
+            print(f"✅ PIN switch needs a password login first, then takes {cached_ms:.3f} ms")
+        else:
+            print(f"❌ PIN switch wrong: {no_session}, {first}, {cached}")
+        
+        for _ in range(db_manager.sessions.max_pin_failures):
+            db_manager.switch_user("cashier", "0000")
+        if db_manager.switch_user("cashier", "4321") is None:
+            print("✅ Too many wrong PINs end the session")
+        else:
+            print("❌ Session survived repeated wrong PINs")
+        
+        # A numeric password is tried as a PIN only for a user with a session and a PIN
+        conn = db_manager.get_connection()
+        conn.execute("INSERT INTO users (username, password_hash, role, full_name) VALUES ('digits', ?, 'cashier', 'Digits')",
+                     (db_manager.passwords.hash("246813"),))
+        conn.commit()
+        conn.close()
+        digits = db_manager.login("digits", "246813")
+        no_pin = [db_manager.login("digits", "246813") for _ in range(db_manager.sessions.max_pin_failures)]
+        db_manager.set_user_pin(digits['id'], "1357")
+        by_password = [db_manager.login("digits", "246813") for _ in range(db_manager.sessions.max_pin_failures)]
+        by_pin = db_manager.login("digits", "1357")
+        for _ in range(db_manager.sessions.max_pin_failures):
+            db_manager.login("digits", "999999")
+        if all(no_pin + by_password) and by_pin and db_manager.switch_user("digits", "1357") is None:
+            print("✅ A numeric password is not counted as a wrong PIN, a wrong password is")
+        else:
+            print(f"❌ Numeric password login wrong: {no_pin}, {by_password}, {by_pin}")
+        
+        conn.close()
+        
+        # Test multi-till stock reservation
+        print("\n25. Testing Multi-Till Stock Reservation...")
+        
+        last_item = db_manager.add_product("9900000000025", "Last Item", None, "Test", 5.0, 2.0, 3)
+        try:
+            db_manager.create_sale(1, 1, 20.0, 'cash', [{'product_id': last_item, 'quantity': 4, 'unit_price': 5.0}])
+            print("❌ Sale of more than the stock left was saved")
+        except InsufficientStockError as e:
+            if e.shortages[0].available == 3 and db_manager.get_product_by_id(last_item)[7] == 3:
+                print(f"✅ Oversell refused without touching stock: {e}")
+            else:
+                print(f"❌ Oversell refused with wrong details: {e.shortages}")
+        
+        cart = [{'product_id': last_item, 'quantity': 2, 'unit_price': 5.0}]
+        db_manager.reserve_stock(cart)
+        try:
+            db_manager.reserve_stock(cart)
+            second_till = "reserved"
+        except InsufficientStockError:
+            second_till = "refused"
+        reserved_journal = SaleJournal(db_manager, journal_path="test_reserved_sales.journal")
+        reserved_journal.start()
+        reserved_journal.record_sale(1, 1, 10.0, 'cash', cart, stock_reserved=True)
+        reserved_journal.wait_until_applied(timeout=10)
+        reserved_journal.stop()
+        os.remove("test_reserved_sales.journal")
+        
+        if second_till == "refused" and db_manager.get_product_by_id(last_item)[7] == 1:
+            print("✅ Reserved stock cannot be sold twice and is taken only once")
+        else:
+            print(f"❌ Reservation wrong: second till {second_till}, "
+                  f"stock {db_manager.get_product_by_id(last_item)[7]}")
+        
+        # A reserved sale the database refuses gives its stock back
+        rejected_journal = SaleJournal(db_manager, journal_path="test_reserved_sales.journal")
+        rejected_journal.start()
+        db_manager.reserve_stock([{'product_id': last_item, 'quantity': 1, 'unit_price': 5.0}])
+        rejected_journal.record_sale(1, 1, 5.0, 'cheque', [{'product_id': last_item, 'quantity': 1, 'unit_price': 5.0}],
+                                     stock_reserved=True)
+        rejected_journal.wait_until_applied(timeout=10)
+        rejected_journal.stop()
+        with open(rejected_journal.rejected_path, encoding="utf-8") as f:
+            set_aside = [json.loads(line) for line in f]
+        os.remove("test_reserved_sales.journal")
+        os.remove(rejected_journal.rejected_path)
+        if (db_manager.get_product_by_id(last_item)[7] == 1 and len(set_aside) == 1
+                and set_aside[0]['stock_reserved'] is False):
+            print("✅ Rejected reserved sale puts its stock back")
+        else:
+            print(f"❌ Rejected sale kept its stock: {db_manager.get_product_by_id(last_item)[7]} left, {set_aside}")
+        
+        # A crash before the journal is emptied replays the rejected entry: its stock goes back once
+        db_manager.reserve_stock([{'product_id': last_item, 'quantity': 1, 'unit_price': 5.0}])
+        replayed_line = json.dumps({'sale_number': db_manager.generate_sale_number(), 'user_id': 1, 'customer_id': 1,
+                                    'total_amount': 5.0, 'payment_method': 'cheque', 'created_at': None,
+                                    'stock_reserved': True,
+                                    'items': [{'product_id': last_item, 'quantity': 1, 'unit_price': 5.0}]}) + "\n"
+        replayed_journal = SaleJournal(db_manager, journal_path="test_replayed_sales.journal")
+        left_after_replay = []
+        for _ in range(2):
+            with open("test_replayed_sales.journal", "w", encoding="utf-8") as f:
+                f.write(replayed_line)
+            replayed_journal.recover()
+            left_after_replay.append(db_manager.get_product_by_id(last_item)[7])
+        replayed_journal.stop()
+        os.remove("test_replayed_sales.journal")
+        os.remove(replayed_journal.rejected_path)
+        if left_after_replay == [1, 1]:
+            print("✅ A rejected reserved sale replayed twice puts its stock back once")
+        else:
+            print(f"❌ Replayed rejection released stock again: {left_after_replay}")
+        
+        # Checkout only reads the stock, counting sales journaled but not saved yet
+        held_journal = SaleJournal(db_manager, journal_path="test_held_sales.journal")
+        held_journal.record_sale(1, 1, 5.0, 'cash', [{'product_id': last_item, 'quantity': 1, 'unit_price': 5.0}])
+        held = held_journal.pending_quantities()
+        one = [{'product_id': last_item, 'quantity': 1, 'unit_price': 5.0}]
+        free_check = db_manager.check_stock(one)
+        held_check = db_manager.check_stock(one, held)
+        held_journal.stop()
+        os.remove("test_held_sales.journal")
+        if (held == {last_item: 1} and free_check == [] and held_check and held_check[0].available == 0
+                and db_manager.get_product_by_id(last_item)[7] == 1):
+            print(f"✅ Checkout stock check counts journaled sales and writes nothing ({held_check[0]})")
+        else:
+            print(f"❌ Checkout stock check wrong: {held}, {free_check}, {held_check}")
+        
+        till_manager = DatabaseManager("test_store_pos.db", till_id=2)
+        till_sale_id, till_sale_number = till_manager.create_sale(
+            1, 1, 5.0, 'cash', [{'product_id': last_item, 'quantity': 1, 'unit_price': 5.0}]
+        )
+        if "-T2" in till_sale_number:
+            print(f"✅ Sale numbers carry the till: {till_sale_number}")
+        else:
+            print(f"❌ Sale number without till id: {till_sale_number}")
+        
+        stale = db_manager.update_product_stock(last_item, 10, 1, "Count", expected_quantity=1)
+        fresh = db_manager.update_product_stock(last_item, 10, 1, "Count", expected_quantity=0)
+        if stale is False and fresh is True and db_manager.get_product_by_id(last_item)[7] == 10:
+            print("✅ Stock update based on a stale quantity is refused")
+        else:
+            print(f"❌ Optimistic stock update wrong: {stale}, {fresh}")
+        
+        try:
+            db_manager.update_product_stock(10 ** 9, 1, 1, "Count")
+            print("❌ Stock update of a missing product succeeded")
+        except ValueError as missing:
+            # The failed update must not keep the write lock while the error is around
+            quick = DatabaseManager("test_store_pos.db")
+            quick.busy_timeout = 0.2
+            if quick.update_product_stock(last_item, 11, 1, "Count", expected_quantity=10):
+                print(f"✅ Failed stock update releases the write lock ({missing})")
+            else:
+                print("❌ Stock update after a failed one was refused")
+        
+        # Test sync between a till and the store hub
+        print("\n26. Testing Store Sync...")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            hub = DatabaseManager(os.path.join(scratch, "hub.db"))
+            till = DatabaseManager(os.path.join(scratch, "till.db"), till_id=7)
+            server = SyncServer(hub, "127.0.0.1", 0, key="secret")
+            server.start()
+            url = f"http://127.0.0.1:{server.address[1]}"
+            client = SyncClient(till, url, key="secret")
+            
+            try:
+                cola = hub.add_product("9900000000026", "Sync Cola", None, "Drinks", 3.0, 1.5, 50)
+                first = client.sync()
+                synced = till.get_product_by_id(cola)
+                # The first pull brings the hub's whole catalog, sample products included
+                if (first['products'] == len(hub.get_all_products()) and synced and synced[2] == "Sync Cola"
+                        and synced[7] == 50):
+                    print("✅ Till pulled the new product from the hub")
+                else:
+                    print(f"❌ Product not pulled: {first}, {synced}")
+                
+                sale_id, sale_number = till.create_sale(1, 1, 9.0, 'cash',
+                                                        [{'product_id': cola, 'quantity': 3, 'unit_price': 3.0}])
+                till.update_product_stock(1, till.get_product_by_id(1)[7] + 5, 1, "Delivery")
+                hub_stock_before = hub.get_product_by_id(1)[7]
+                second = client.sync()
+                hub_conn = hub.get_connection()
+                at_hub = hub_conn.execute('SELECT COUNT(*) FROM sales WHERE sale_number = ?', (sale_number,)).fetchone()[0]
+                hub_conn.close()
+                
+                if (second['sales'] == 1 and second['movements'] == 1 and at_hub == 1
+                        and hub.get_product_by_id(cola)[7] == 47 == till.get_product_by_id(cola)[7]
+                        and hub.get_product_by_id(1)[7] == hub_stock_before + 5):
+                    print(f"✅ Sale {sale_number} and stock delivery pushed to the hub")
+                else:
+                    print(f"❌ Push wrong: {second}, {at_hub} sales at hub")
+                
+                sales, movements = client._unpushed()
+                hub_conn = hub.get_connection()
+                walk_in_uid = hub_conn.execute('SELECT uid FROM customers WHERE id = 1').fetchone()[0]
+                hub_conn.close()
+                replay = server.push({'terminal': 7, 'sales': [{'sale_number': sale_number, 'user_id': 1,
+                                                                 'customer_id': 1, 'customer_uid': walk_in_uid,
+                                                                 'total_amount': 9.0, 'payment_method': 'cash',
+                                                                 'items': []}],
+                                      'movements': [{'id': 1, 'product_id': 1, 'movement_type': 'adjustment',
+                                                     'quantity': 5, 'reason': "Delivery", 'user_id': 1,
+                                                     'created_at': None}]})
+                sent = client.bytes_sent + client.bytes_received
+                client.sync()
+                idle_bytes = client.bytes_sent + client.bytes_received - sent
+                if not sales and not movements and replay['sales'] == 0 and replay['movements'] == 0:
+                    print(f"✅ Resent batches are skipped, an idle sync costs {idle_bytes} bytes")
+                else:
+                    print(f"❌ Resent batch applied again: {replay}")
+                
+                # The hub sold out meanwhile: the till's sale still happened and is booked
+                hub.update_product_stock(cola, 1, 1, "Count")
+                till.create_sale(1, 1, 6.0, 'cash', [{'product_id': cola, 'quantity': 2, 'unit_price': 3.0}])
+                oversold = client.sync()
+                if oversold['sales'] == 1 and oversold['rejected'] == 0 and hub.get_product_by_id(cola)[7] == -1:
+                    print("✅ A pushed sale is booked even past the hub's stock")
+                else:
+                    print(f"❌ Pushed sale refused at the hub: {oversold}, stock {hub.get_product_by_id(cola)[7]}")
+                
+                bad_lengths = []
+                for length in ("-5", "many"):
+                    connection = http.client.HTTPConnection("127.0.0.1", server.address[1], timeout=5)
+                    connection.putrequest("POST", "/pull")
+                    connection.putheader("X-Sync-Key", "secret")
+                    connection.putheader("Content-Length", length)
+                    connection.endheaders()
+                    bad_lengths.append(connection.getresponse().status)
+                    connection.close()
+                if bad_lengths == [400, 400]:
+                    print("✅ Hub answers 400 to a negative or unreadable Content-Length")
+                else:
+                    print(f"❌ Bad Content-Length answered with {bad_lengths}")
+                
+                made = till.add_product("9900000000028", "Till Made", None, "Drinks", 2.0, 1.0, 8)
+                regular = till.add_customer("Sync Regular", "555-0261")
+                hub_conn = hub.get_connection()
+                hub_regular = hub_conn.execute('SELECT name FROM customers WHERE id = ?', (regular,)).fetchone()
+                hub_conn.close()
+                try:
+                    ProductImporter(till).import_rows([{"barcode": "9900000000030", "name": "Local", "price": 1}])
+                    imported = True
+                except ValueError:
+                    imported = False
+                if (made and hub.get_product_by_id(made)[2] == "Till Made" == till.get_product_by_id(made)[2]
+                        and hub_regular == ("Sync Regular",)
+                        and regular in [customer[0] for customer in till.search_customers("Sync Regular")]
+                        and not imported):
+                    print("✅ Sync tills add products and customers at the hub, with the hub's ids")
+                else:
+                    print(f"❌ Till added rows of its own: {made}, {regular}, {hub_regular}, import {imported}")
+                
+                # Edits on a till are made at the hub, so the next pull does not revert them
+                edited = till.update_product(made, "9900000000028", "Till Made Lemon", None, "Drinks", 2.5, 1.0, 5)
+                moved = till.update_customer(regular, "Sync Regular", "555-0264")
+                dropped = till.delete_product(made)
+                client.sync()
+                till_conn = till.get_connection()
+                till_made = till_conn.execute('SELECT name, price, is_active FROM products WHERE id = ?',
+                                              (made,)).fetchone()
+                till_regular = till_conn.execute('SELECT phone FROM customers WHERE id = ?', (regular,)).fetchone()
+                till_conn.close()
+                hub_conn = hub.get_connection()
+                hub_made = hub_conn.execute('SELECT name, price, is_active FROM products WHERE id = ?',
+                                            (made,)).fetchone()
+                hub_conn.close()
+                if (edited and moved and dropped and till_made == hub_made == ("Till Made Lemon", 2.5, 0)
+                        and till_regular == ("555-0264",)):
+                    print("✅ Till edits and deletes are made at the hub and survive the next pull")
+                else:
+                    print(f"❌ Till edit reverted: {edited}, {moved}, {dropped}, {till_made}, {hub_made}, {till_regular}")
+                
+                # A till with rows of its own from before it synced, with ids the hub uses for other rows
+                old_till = DatabaseManager(os.path.join(scratch, "old_till.db"), till_id=8)
+                own_customer = old_till.add_customer("Till Own Customer", "555-0263")
+                own_product = old_till.add_product("9900000000029", "Till Own Product", None, "Test", 2.0, 1.0, 10)
+                old_client = SyncClient(old_till, url, key="secret")
+                hub_cola_stock = hub.get_product_by_id(cola)[7]
+                joined = old_client.sync()
+                own_sale = old_till.create_sale(1, own_customer, 2.0, 'cash',
+                                                [{'product_id': own_product, 'quantity': 1, 'unit_price': 2.0}])[1]
+                later = old_client.sync()
+                hub_conn = hub.get_connection()
+                at_hub = hub_conn.execute('SELECT COUNT(*) FROM sales WHERE sale_number = ?', (own_sale,)).fetchone()[0]
+                hub_conn.close()
+                with open(old_client.conflicts_path, encoding="utf-8") as f:
+                    conflicts = [json.loads(line) for line in f]
+                old_conn = old_till.get_connection()
+                old_made = old_conn.execute('SELECT name, is_active FROM products WHERE id = ?', (made,)).fetchone()
+                old_conn.close()
+                if (own_customer == regular and own_product == cola and joined['conflicts'] == 2 == len(conflicts)
+                        and old_till.get_product_by_id(own_product)[2] == "Till Own Product"
+                        and old_till.get_product_by_id(own_product)[7] == 9
+                        and later['rejected'] == 1 and at_hub == 0 and old_made == ("Till Made Lemon", 0)
+                        and hub.get_product_by_id(cola)[7] == hub_cola_stock):
+                    print("✅ Hub rows clashing with a till's own rows are not merged, and its sales are refused")
+                else:
+                    print(f"❌ Clashing ids merged or booked: {joined}, {later}, {at_hub} sales at hub, {conflicts}")
+                
+                try:
+                    SyncClient(till, url, key="wrong").pull()
+                    print("❌ Hub accepted a wrong sync key")
+                except SyncError:
+                    print("✅ Hub refuses terminals without the sync key")
+                
+                try:
+                    SyncServer(hub, "0.0.0.0", 0)._httpd.server_close()
+                    print("❌ Hub listened on the LAN without a key")
+                except ValueError:
+                    print("✅ Hub refuses to listen on the LAN without a key")
+            finally:
+                server.stop()
+        
+        # Test delta catalog sync
+        print("\n27. Testing Delta Catalog Sync...")
+        
+        catalog_before = db_manager.get_data_version("catalog")
+        customers_before = db_manager.get_data_version("customers")
+        delta_product = db_manager.add_product("9900000000027", "Delta Tea", None, "Drinks", 4.0, 2.0, 12)
+        db_manager.update_product(delta_product, "9900000000027", "Delta Tea", None, "Drinks", 4.5, 2.0, 5)
+        delta_customer = db_manager.add_customer("Delta Customer", "555-0270")
+        db_manager.delete_customer(delta_customer)
+        
+        products_delta = db_manager.changes_since("products", catalog_before)
+        customers_delta = db_manager.changes_since("customers", customers_before)
+        price = products_delta['columns'].index("price")
+        if ([row[0] for row in products_delta['rows']] == [delta_product] and products_delta['rows'][0][price] == 4.5
+                and [row[0] for row in customers_delta['rows']] == [delta_customer]
+                and products_delta['version'] == db_manager.get_data_version("catalog")):
+            print("✅ Changes since a version hold only the changed rows, latest state")
+        else:
+            print(f"❌ Wrong delta: {products_delta}, {customers_delta}")
+        
+        full = db_manager.changes_since("products", 0)
+        paged, version, pages = [], 0, 0
+        while True:
+            page = db_manager.changes_since("products", version, limit=3)
+            paged.extend(page['rows'])
+            version, pages = page['version'], pages + 1
+            if not page['more']:
+                break
+        if sorted(paged) == sorted(full['rows']) and pages > 1 and version == full['version']:
+            print(f"✅ Paged delta ({pages} pages) matches the full delta of {len(full['rows'])} products")
+        else:
+            print(f"❌ Paged delta differs: {len(paged)} vs {len(full['rows'])} rows")
+        
+        plan_conn = db_manager.get_connection()
+        plan = " ".join(row[-1] for row in plan_conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM products WHERE version > ? ORDER BY version, id", (0,)
+        ).fetchall())
+        plan_conn.close()
+        if "idx_products_version" in plan:
+            print("✅ Delta query uses the version index")
+        else:
+            print(f"❌ Delta query does not use the version index: {plan}")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            replica = DatabaseManager(os.path.join(scratch, "replica.db"))
+            merged = replica.apply_changes([full, db_manager.changes_since("customers", 0)]).merged
+            replica.apply_changes([products_delta])
+            copied = replica.get_product_by_id(delta_product)
+            if (merged['products'] == len(full['rows']) and copied and copied[5] == 4.5 and copied[7] == 12
+                    and delta_customer not in [customer[0] for customer in replica.search_customers("Delta Customer")]):
+                print(f"✅ Deltas merged into another database ({merged})")
+            else:
+                print(f"❌ Merge wrong: {merged}, {copied}")
+            
+            clash = dict(products_delta, rows=[[10**6, "c1a5" * 8, "9900000000027", "Clash", None, None, 1.0, 1.0,
+                                                0, 5, 1]])
+            result = replica.apply_changes([db_manager.changes_since("customers", 0), clash])
+            if ([conflict.id for conflict in result.conflicts] == [10**6] and result.merged['products'] == 0
+                    and result.merged['customers'] and not replica.get_product_by_id(10**6)):
+                print(f"✅ Delta row with a taken barcode refused, the rest merged ({result.conflicts[0].reason})")
+            else:
+                print(f"❌ Clashing delta row merged: {result}")
+            
+            outdated = dict(products_delta, columns=products_delta['columns'][:-1])
+            catalog_version = replica.get_data_version("catalog")
+            customers_version = replica.get_data_version("customers")
+            try:
+                replica.apply_changes([db_manager.changes_since("customers", 0), outdated])
+                print("❌ Delta with other columns was merged")
+            except ValueError:
+                if (replica.get_data_version("catalog") == catalog_version
+                        and replica.get_data_version("customers") == customers_version):
+                    print("✅ A failing delta leaves the database untouched")
+                else:
+                    print("❌ Failed merge left partial changes")
+            
+            # Rows from before versioning (version 0) must still reach a new till
+            old_hub = DatabaseManager(os.path.join(scratch, "old_hub.db"))
+            conn = old_hub.get_connection()
+            conn.execute('UPDATE products SET version = 0')
+            conn.execute('UPDATE customers SET version = 0')
+            # A hub from before migration 8
+            conn.execute('DELETE FROM schema_migrations WHERE version >= 8')
+            conn.commit()
+            applied = MigrationRunner(conn, [migration for migration in MIGRATIONS if migration.version <= 8]).run()
+            product_count = conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+            customer_count = conn.execute('SELECT COUNT(*) FROM customers').fetchone()[0]
+            conn.close()
+            pulled_products = old_hub.changes_since("products", 0)
+            pulled_customers = old_hub.changes_since("customers", 0)
+            if ([version for version, name, duration_ms in applied] == [8]
+                    and len(pulled_products['rows']) == product_count
+                    and len(pulled_customers['rows']) == customer_count
+                    and pulled_products['version'] == old_hub.get_data_version("catalog")):
+                print(f"✅ Unversioned rows are versioned and pulled by a new till ({product_count} products)")
+            else:
+                print(f"❌ Unversioned rows missing from the first pull: {len(pulled_products['rows'])}/{product_count}")
+        
+        # Test online backup
+        print("\n28. Testing Online Backup...")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            backups = BackupManager(db_manager, scratch, pages_per_step=4, pause=0, keep_last=2, keep_days=0)
+            
+            # Keep selling while the backup runs
+            selling = threading.Event()
+            def sell():
+                while not selling.is_set():
+                    db_manager.create_sale(1, 1, 2.5, 'cash', [{'product_id': 1, 'quantity': 1, 'unit_price': 2.5}])
+            seller = threading.Thread(target=sell)
+            seller.start()
+            try:
+                result = backups.backup()
+            finally:
+                selling.set()
+                seller.join()
+            
+            restored_path = os.path.join(scratch, "restored.db")
+            BackupManager.verify(result.path)
+            BackupManager.restore(result.path, restored_path)
+            restored = sqlite3.connect(restored_path)
+            restored_products = restored.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+            restored.close()
+            if restored_products and result.compressed_size < result.size:
+                print(f"✅ Backup taken during sales, verified and restored ({result.pages} pages, "
+                      f"{result.size // 1024} KB -> {result.compressed_size // 1024} KB, {result.restarts} restarts)")
+            else:
+                print(f"❌ Backup wrong: {result}")
+            
+            for _ in range(2):
+                backups.backup()
+            kept = backups.list_backups()
+            if len(kept) == 2 and not os.path.exists(result.path) and not os.path.exists(result.path + ".sha256"):
+                print("✅ Old backups are pruned by the retention policy")
+            else:
+                print(f"❌ Retention wrong: {kept}")
+            
+            with open(kept[0][1], "r+b") as f:
+                f.seek(40)
+                f.write(b"damaged")
+            try:
+                BackupManager.verify(kept[0][1])
+                print("❌ Damaged backup passed verification")
+            except BackupError:
+                print("✅ Damaged backup fails verification")
+        
+        # Test sales archival
+        print("\n29. Testing Sales Archival...")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            store = DatabaseManager(os.path.join(scratch, "store.db"))
+            product = store.add_product("9900000000034", "Archive Product", None, "Test", 2.0, 1.0, 100)
+            paid_up = store.add_customer("Archive Paid Up")
+            owing = store.add_customer("Archive Owing")
+            item = [{'product_id': product, 'quantity': 1, 'unit_price': 2.0}]
+            old_sales = store.create_sales([
+                {'sale_number': "ARC-1", 'user_id': 1, 'customer_id': paid_up, 'total_amount': 2.0,
+                 'payment_method': 'cash', 'items': item, 'created_at': "2023-03-05 10:00:00"},
+                {'sale_number': "ARC-2", 'user_id': 1, 'customer_id': paid_up, 'total_amount': 2.0,
+                 'payment_method': 'dinau', 'items': item, 'created_at': "2023-03-06 10:00:00"},
+                {'sale_number': "ARC-3", 'user_id': 1, 'customer_id': owing, 'total_amount': 2.0,
+                 'payment_method': 'dinau', 'items': item, 'created_at': "2023-03-07 10:00:00"},
+                {'sale_number': "ARC-4", 'user_id': 1, 'customer_id': owing, 'total_amount': 2.0,
+                 'payment_method': 'cash', 'items': item, 'created_at': "2024-08-01 10:00:00"}
+            ])
+            store.create_sale(1, paid_up, 2.0, 'cash', item)
+            # The paid up customer settled the loan back in 2023
+            store.process_dinau_payment(paid_up, 2.0, 1)
+            conn = store.get_connection()
+            conn.execute("UPDATE dinau_transactions SET created_at = '2023-04-01 10:00:00' WHERE transaction_type = 'payment'")
+            conn.commit()
+            conn.close()
+            
+            report_before = store.get_sales_report()
+            history_before = store.get_customer_purchase_history(paid_up)
+            moved = store.archive.archive(before="2025-01-01")
+            
+            conn = store.get_connection()
+            live_sales = [row[0] for row in conn.execute('SELECT sale_number FROM sales ORDER BY id').fetchall()]
+            conn.close()
+            if (moved['sales'] == 3 and moved['dinau_transactions'] == 2 and store.archive.years() == [2023, 2024]
+                    and live_sales[0] == "ARC-3" and len(live_sales) == 2):
+                print(f"✅ Closed sales moved to yearly archives, open loans kept live ({moved})")
+            else:
+                print(f"❌ Archive moved the wrong rows: {moved}, live {live_sales}")
+            
+            if (store.get_sales_report() == report_before
+                    and store.get_customer_purchase_history(paid_up) == history_before
+                    and store.get_sale_details(old_sales[0])[1] == [("Archive Product", 1, 2.0, 2.0)]
+                    and len(store.get_customer_dinau_history(paid_up)) == 2
+                    and store.get_customer_dinau_balances([paid_up, owing]) == {paid_up: 0.0, owing: 2.0}):
+                print("✅ Reports, history and balances read across the archives")
+            else:
+                print("❌ Reports changed after archiving")
+            
+            # A move interrupted after the copy leaves the sale in both files
+            sale_id = store.create_sales([
+                {'sale_number': "ARC-5", 'user_id': 1, 'customer_id': owing, 'total_amount': 2.0,
+                 'payment_method': 'cash', 'items': item, 'created_at': "2024-09-01 10:00:00"}
+            ])[0]
+            conn = store.get_connection()
+            conn.execute('ATTACH DATABASE ? AS archive_2024', (store.archive.archive_path(2024),))
+            conn.execute('INSERT INTO archive_2024.sales SELECT * FROM main.sales WHERE id = ?', (sale_id,))
+            conn.execute('INSERT INTO archive_2024.sale_items SELECT * FROM main.sale_items WHERE sale_id = ?', (sale_id,))
+            conn.commit()
+            conn.close()
+            moved = store.archive.archive(before="2024-01-01")
+            conn = store.get_connection(history=True)
+            copies = conn.execute("SELECT COUNT(*) FROM all_sales WHERE sale_number = 'ARC-5'").fetchone()[0]
+            items = conn.execute('SELECT COUNT(*) FROM all_sale_items WHERE sale_id = ?', (sale_id,)).fetchone()[0]
+            conn.close()
+            if copies == 1 and items == 1 and not any(moved.values()):
+                print("✅ An interrupted move is finished by the next run")
+            else:
+                print(f"❌ Interrupted move left {copies} copies and {items} items")
+            
+            backups = BackupManager(store, os.path.join(scratch, "backups"), pause=0, keep_last=1, keep_days=0)
+            first = backups.backup()
+            second = backups.backup()
+            restored_path = os.path.join(scratch, "restored_archive.db")
+            BackupManager.verify(first.archives[0].path)
+            BackupManager.restore(first.archives[0].path, restored_path)
+            restored = sqlite3.connect(restored_path)
+            restored_sales = restored.execute('SELECT sale_number FROM sales ORDER BY id').fetchall()
+            restored.close()
+            if (len(first.archives) == 2 and not second.archives and restored_sales == [("ARC-1",), ("ARC-2",)]
+                    and all(os.path.exists(archive.path) for archive in first.archives)):
+                print("✅ Sales archives are backed up with the database, and only again once changed")
+            else:
+                print(f"❌ Archive backups wrong: {first.archives}, then {second.archives}")
+            
+            # Another till archives a new year: the cached years of this one follow
+            other_till = DatabaseManager(store.db_path)
+            other_till.create_sales([
+                {'sale_number': "ARC-6", 'user_id': 1, 'customer_id': paid_up, 'total_amount': 2.0,
+                 'payment_method': 'cash', 'items': item, 'created_at': "2022-05-01 10:00:00"}
+            ])
+            other_till.archive.archive(before="2023-01-01")
+            conn = store.get_connection(history=True)
+            found = conn.execute("SELECT COUNT(*) FROM all_sales WHERE sale_number = 'ARC-6'").fetchone()[0]
+            conn.close()
+            if store.archive.years() == [2022, 2023, 2024] and found == 1:
+                print("✅ Archive years are cached and pick up archives made elsewhere")
+            else:
+                print(f"❌ Archive years stale: {store.archive.years()}")
+        
+        # Test scheduled maintenance
+        print("\n30. Testing Database Maintenance...")
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            store = DatabaseManager(os.path.join(scratch, "store.db"))
+            conn = store.get_connection()
+            conn.executemany('''
+                INSERT INTO inventory_movements (product_id, movement_type, quantity, reason, user_id)
+                VALUES (1, 'in', 1, ?, 1)
+            ''', [("x" * 500,) for _ in range(3000)])
+            conn.commit()
+            conn.execute('DELETE FROM inventory_movements')
+            conn.commit()
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.close()
+            
+            log_path = os.path.join(scratch, "maintenance.log")
+            maintenance = MaintenanceScheduler(store, log_path, idle_after=0, slice_ms=1, vacuum_pages=32)
+            runs, slices = [], 0
+            while slices < 1000 and (maintenance._current or maintenance.due_tasks()):
+                runs.extend(maintenance.run_slice())
+                slices += 1
+            
+            conn = store.get_connection()
+            remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            analyzed = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0]
+            conn.close()
+            by_task = {run.task: run for run in runs}
+            # ANALYZE reuses a few of the free pages for its statistics table
+            if (list(by_task) == ["analyze", "vacuum", "check"] and by_task['vacuum'].pages_freed > free_pages // 2
+                    and by_task['vacuum'].slices > 1 and remaining == 0 and analyzed and by_task['check'].result == "ok"):
+                print(f"✅ Maintenance ran in {slices} slices and freed {by_task['vacuum'].pages_freed} pages")
+            else:
+                print(f"❌ Maintenance wrong: {runs}, {remaining} free pages left")
+            
+            with open(log_path, encoding='utf-8') as f:
+                logged = f.read().splitlines()
+            if len(logged) == 3 and not maintenance.due_tasks() and maintenance.run_slice() == []:
+                print("✅ Finished tasks are logged and not due again")
+            else:
+                print(f"❌ Maintenance log or schedule wrong: {logged}")
+            
+            busy = MaintenanceScheduler(store, idle_after=0, can_run=lambda: False, intervals={"check": 0})
+            waiting = MaintenanceScheduler(store, idle_after=60, intervals={"check": 0})
+            waiting.touch()
+            if busy.run_slice() == [] and waiting.run_slice() == [] and busy.due_tasks() == ["check"]:
+                print("✅ Maintenance waits while a sale is open or the till is in use")
+            else:
+                print("❌ Maintenance ran while the till was busy")
+        
         print("\n" + "=" * 60)
         print("DATABASE FUNCTIONALITY TEST COMPLETED SUCCESSFULLY! ✅")
         print("=" * 60)
         print("\nCore Features Tested:")
-        print("• User Authentication (Admin & Cashier)")
-        print("• Product Management (Search, Lookup, Stock)")
-        print("• Customer Management (Add, Search)")
-        print("• Sales Processing (Create, Retrieve)")
-        print("• Inventory Tracking (Stock Updates)")
-        print("• Reporting (Sales Reports)")
+        print("• User Authentication (Admin & Cashier, Salted Hashes, PIN Quick Switch)")
+        print("• Product Management (Search, Lookup, Update, Delete, Stock, Bulk Import, Delta Sync)")
+        print("• Customer Management (Add, Update, Delete, Search, Purchase History, Lookup)")
+        print("• Sales Processing (Create, Retrieve, Journal, Multi-Till Stock Reservation, Hub Sync)")
+        print("• Inventory Tracking (Stock Updates, Stock Take, Receiving)")
+        print("• Reporting (Sales Reports, Yearly Sales Archives)")
+        print("• Backups (Online, Verified, Compressed, Retention)")
+        print("• Maintenance (Idle-Time Analyze, Incremental Vacuum, Quick Check)")
+        print("• Change Feed (Sale, Stock, Product and Customer Events)")
+        print("• Schema Versioning (Startup Check, Migrations, Backfills)")
+        print("• Query Timing (Method & Statement Latency, Slow Query Log)")
+        print("• UI Profiling (Handler Durations, Dropped Frames)")
+        print("• Receipts (Background Writer, Text & ESC/POS Rendering, Archives)")
         print("\nThe database layer is fully functional and ready for GUI integration!")
         
     except Exception as e:
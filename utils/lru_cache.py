@@ -0,0 +1,49 @@
+from collections import OrderedDict
+import threading
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache"""
+    
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """Get a cached value and mark it as recently used"""
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+    
+    def put(self, key, value):
+        """Cache a value, evicting the least recently used one when full"""
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        """Remove a value from the cache"""
+        with self._lock:
+            return self._items.pop(key, default)
+    
+    def clear(self):
+        """Remove all cached values"""
+        with self._lock:
+            self._items.clear()
+    
+    def values(self):
+        """Get the cached values, most recently used first"""
+        with self._lock:
+            return list(reversed(self._items.values()))
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
@@ -0,0 +1,219 @@
+import io
+import os
+from functools import lru_cache
+from .receipt_writer import (
+    DEFAULT_TEMPLATE, ReceiptLine, ReceiptRecord, ReceiptTemplate, receipt_fields, render_receipt
+)
+
+# ESC/POS printer commands
+ESC_INIT = b"\x1b@"
+ESC_ALIGN_LEFT = b"\x1ba\x00"
+ESC_ALIGN_CENTER = b"\x1ba\x01"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+ESC_DOUBLE_ON = b"\x1d!\x11"
+ESC_DOUBLE_OFF = b"\x1d!\x00"
+ESC_FEED_AND_CUT = b"\n\n\n\x1dVB\x00"
+
+# 80 mm roll paper for PDF receipts, in points
+PDF_PAGE_WIDTH = 226
+PDF_LINE_HEIGHT = 11
+
+@lru_cache(maxsize=16)
+def _parse_template_file(path, mtime):
+    """Parse a template file; cached until the file changes"""
+    sections = {}
+    current = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped in ("[header]", "[line]", "[footer]"):
+                current = stripped[1:-1]
+                sections[current] = []
+            elif current:
+                sections[current].append(line)
+    
+    missing = {"header", "line", "footer"} - set(sections)
+    if missing:
+        raise ValueError(f"Receipt template {path} is missing sections: {', '.join(sorted(missing))}")
+    
+    return ReceiptTemplate(**{name: "".join(lines) for name, lines in sections.items()})
+
+def load_template(path):
+    """Load a receipt template file with [header], [line] and [footer] sections"""
+    return _parse_template_file(path, os.path.getmtime(path))
+
+@lru_cache(maxsize=4)
+def _escpos_logo(path, max_width):
+    """Convert a logo image into an ESC/POS raster command, once per logo"""
+    from PIL import Image
+    
+    image = Image.open(path).convert("L")
+    if image.width > max_width:
+        image = image.resize((max_width, image.height * max_width // image.width))
+    image = image.convert("1")
+    
+    width_bytes = (image.width + 7) // 8
+    if image.width % 8:
+        padded = Image.new("1", (width_bytes * 8, image.height), 1)
+        padded.paste(image, (0, 0))
+        image = padded
+    
+    # Pillow packs white pixels as 1 bits, the printer expects black as 1
+    raster = bytes(byte ^ 0xFF for byte in image.tobytes())
+    return (b"\x1dv0\x00"
+            + bytes([width_bytes % 256, width_bytes // 256, image.height % 256, image.height // 256])
+            + raster)
+
+_pdf_fonts = set()
+
+def _pdf_font(font_path):
+    """Register a TrueType font with reportlab once and return its name"""
+    if not font_path:
+        return "Courier"
+    
+    font_name = os.path.splitext(os.path.basename(font_path))[0]
+    if font_name not in _pdf_fonts:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        pdfmetrics.registerFont(TTFont(font_name, font_path))
+        _pdf_fonts.add(font_name)
+    return font_name
+
+@lru_cache(maxsize=4)
+def _pdf_logo(path):
+    """Load a logo for PDF receipts, once per logo"""
+    from reportlab.lib.utils import ImageReader
+    return ImageReader(path)
+
+def record_from_details(sale_info, sale_items):
+    """Build a receipt record from get_sale_details rows"""
+    sale_number, total_amount, payment_method, created_at, cashier_name, customer_name = sale_info
+    return ReceiptRecord(
+        sale_number=sale_number,
+        created_at=created_at,
+        cashier_name=cashier_name,
+        payment_method=payment_method,
+        total_amount=total_amount,
+        lines=tuple(
+            ReceiptLine(name, unit_price, quantity, total_price)
+            for name, quantity, unit_price, total_price in sale_items
+        ),
+        customer_name=customer_name
+    )
+
+class ReceiptRenderer:
+    """Render saved sales as text, ESC/POS bytes or PDF
+    
+    Templates, fonts and logos are loaded once and shared by every receipt,
+    so reprints and batch renders only pay for the formatting itself.
+    reportlab (PDF) and Pillow (ESC/POS logo) are imported on first use.
+    """
+    
+    def __init__(self, db_manager, template_path=None, logo_path=None, font_path=None, line_width=32):
+        self.db_manager = db_manager
+        self.template_path = template_path
+        self.logo_path = logo_path
+        self.font_path = font_path
+        self.line_width = line_width
+    
+    @property
+    def template(self):
+        """Get the receipt template, reloaded only when its file changes"""
+        if self.template_path:
+            return load_template(self.template_path)
+        return DEFAULT_TEMPLATE
+    
+    def get_record(self, sale_id):
+        """Get the receipt record of a saved sale"""
+        sale_info, sale_items = self.db_manager.get_sale_details(sale_id)
+        if not sale_info:
+            raise ValueError(f"Sale {sale_id} not found")
+        return record_from_details(sale_info, sale_items)
+    
+    def get_records_for_day(self, date):
+        """Get receipt records for every sale of a day (YYYY-MM-DD) with two queries"""
+        sales = self.db_manager.get_sales_report(date, date)
+        items = self.db_manager.get_sale_items_for_sales([sale[0] for sale in sales])
+        return [record_from_details(sale[1:], items[sale[0]]) for sale in sales]
+    
+    def render_text(self, record):
+        """Render a receipt record as text"""
+        return render_receipt(record, self.template)
+    
+    def render_escpos(self, record):
+        """Render a receipt record as an ESC/POS byte stream for a thermal printer"""
+        fields = receipt_fields(record)
+        width = self.line_width
+        out = io.BytesIO()
+        
+        out.write(ESC_INIT + ESC_ALIGN_CENTER)
+        if self.logo_path:
+            out.write(_escpos_logo(self.logo_path, width * 12) + b"\n")
+        out.write(ESC_BOLD_ON + ESC_DOUBLE_ON + b"STORE POS SYSTEM\n" + ESC_DOUBLE_OFF + ESC_BOLD_OFF)
+        
+        out.write(ESC_ALIGN_LEFT)
+        out.write(self._encode(
+            f"Sale: {record.sale_number}\n"
+            f"Date: {record.created_at}\n"
+            f"Cashier: {record.cashier_name}\n"
+            + "-" * width + "\n"
+        ))
+        out.write(self._encode("".join(
+            f"{line.name[:width]}\n" + self._columns(f"  {line.quantity} x ${line.unit_price:.2f}", f"${line.total:.2f}")
+            for line in record.lines
+        )))
+        out.write(self._encode("-" * width + "\n"))
+        out.write(ESC_BOLD_ON + self._encode(self._columns("TOTAL", f"${record.total_amount:.2f}")) + ESC_BOLD_OFF)
+        out.write(self._encode(self._columns("Payment", fields['payment_method'])))
+        
+        out.write(ESC_ALIGN_CENTER + self._encode("\nThank you for your business!\n"))
+        out.write(ESC_FEED_AND_CUT)
+        return out.getvalue()
+    
+    def render_pdf(self, record, output=None):
+        """Render a receipt record as a PDF on roll paper; returns the bytes when no output is given"""
+        from reportlab.pdfgen import canvas
+        
+        lines = self.render_text(record).strip("\n").split("\n")
+        logo_height = 60 if self.logo_path else 0
+        page_height = (len(lines) + 4) * PDF_LINE_HEIGHT + logo_height
+        
+        target = output or io.BytesIO()
+        pdf = canvas.Canvas(target, pagesize=(PDF_PAGE_WIDTH, page_height))
+        y = page_height - 2 * PDF_LINE_HEIGHT
+        
+        if self.logo_path:
+            y -= logo_height
+            pdf.drawImage(_pdf_logo(self.logo_path), (PDF_PAGE_WIDTH - logo_height) / 2, y + PDF_LINE_HEIGHT,
+                          width=logo_height, height=logo_height, preserveAspectRatio=True, mask="auto")
+        
+        text = pdf.beginText(10, y)
+        text.setFont(_pdf_font(self.font_path), 8, leading=PDF_LINE_HEIGHT)
+        for line in lines:
+            text.textLine(line)
+        pdf.drawText(text)
+        pdf.showPage()
+        pdf.save()
+        
+        if output is None:
+            return target.getvalue()
+        return output
+    
+    def render_sale(self, sale_id, output_format="text"):
+        """Render a saved sale as 'text', 'escpos' or 'pdf'"""
+        record = self.get_record(sale_id)
+        if output_format == "escpos":
+            return self.render_escpos(record)
+        if output_format == "pdf":
+            return self.render_pdf(record)
+        return self.render_text(record)
+    
+    def _columns(self, left, right):
+        """Lay out a left and a right aligned column on one receipt line"""
+        return left[:self.line_width - len(right) - 1].ljust(self.line_width - len(right)) + right + "\n"
+    
+    @staticmethod
+    def _encode(text):
+        """Encode receipt text for the printer's code page"""
+        return text.encode("cp437", errors="replace")
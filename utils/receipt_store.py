@@ -0,0 +1,190 @@
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+# Shared zlib dictionary so each small receipt compresses well on its own.
+# Archived receipts can only be read back with this exact dictionary: never change it.
+ARCHIVE_ZDICT = (
+    b"STORE POS SYSTEM\n================\n\nSale Number: SALE2025\nDate: 2025-01-01 00:00:00\n"
+    b"Cashier: System Administrator Sample Cashier\n\nItems:\n------\n  $0.00 x 1 = $0.00\n"
+    b"\n------\nTotal: $0.00\nPayment: CASH EFTPOS DINAU\n\nThank you for your business!\n"
+)
+
+SALE_DATE_PATTERN = re.compile(r"SALE(\d{4})(\d{2})(\d{2})")
+
+class ReceiptStore:
+    """Receipt files sharded by date, with old days compacted into archives
+    
+    New receipts are plain files under <root>/YYYY/MM/DD/. compact() moves
+    days older than a cutoff into one append-only archive per month
+    (<root>/archive/YYYY-MM.receipts), each receipt compressed on its own,
+    and records its offset in a SQLite index so any sale number can still
+    be read back with a single seek.
+    """
+    
+    def __init__(self, root=os.path.join("assets", "receipts")):
+        self.root = root
+        self.archive_dir = os.path.join(root, "archive")
+        self.index_path = os.path.join(self.archive_dir, "index.db")
+        self._lock = threading.Lock()
+    
+    def receipt_path(self, sale_number, date=None):
+        """Get the file path of a receipt in its day shard"""
+        year, month, day = self._shard_date(sale_number, date)
+        return os.path.join(self.root, year, month, day, f"receipt_{sale_number}.txt")
+    
+    def write(self, sale_number, content, date=None):
+        """Save a receipt into its day shard"""
+        path = self.receipt_path(sale_number, date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+        return path
+    
+    def read(self, sale_number):
+        """Get a receipt's text from its shard or its archive, or None if unknown"""
+        # Day shard first, then the old flat layout, then the archives
+        for path in (self.receipt_path(sale_number), os.path.join(self.root, f"receipt_{sale_number}.txt")):
+            try:
+                with open(path, 'r') as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+        
+        if not os.path.exists(self.index_path):
+            return None
+        
+        conn = self._index_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT archive, offset, length FROM archived_receipts
+            WHERE sale_number = ?
+        ''', (sale_number,))
+        location = cursor.fetchone()
+        conn.close()
+        
+        if not location:
+            return None
+        
+        archive, offset, length = location
+        with open(os.path.join(self.archive_dir, archive), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        
+        decompressor = zlib.decompressobj(zdict=ARCHIVE_ZDICT)
+        return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
+    
+    def migrate_flat_files(self):
+        """Move receipts saved in the old flat directory layout into day shards"""
+        moved = 0
+        for name in os.listdir(self.root):
+            if name.startswith("receipt_") and name.endswith(".txt"):
+                sale_number = name[len("receipt_"):-len(".txt")]
+                source = os.path.join(self.root, name)
+                date = datetime.fromtimestamp(os.path.getmtime(source))
+                target = self.receipt_path(sale_number, date)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+                moved += 1
+        return moved
+    
+    def compact(self, older_than_days=30):
+        """Move receipts of days before the cutoff into monthly archives"""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime('%Y%m%d')
+        
+        with self._lock:
+            self.migrate_flat_files()
+            os.makedirs(self.archive_dir, exist_ok=True)
+            conn = self._index_connection()
+            archived = 0
+            
+            try:
+                for year, month, day, day_dir in self._day_shards():
+                    if year + month + day >= cutoff:
+                        continue
+                    archived += self._archive_day(conn, f"{year}-{month}.receipts", day_dir)
+            finally:
+                conn.close()
+        
+        return archived
+    
+    def _archive_day(self, conn, archive, day_dir):
+        """Append one day's receipts to an archive, index them, then delete the files"""
+        names = sorted(name for name in os.listdir(day_dir) if name.endswith(".txt"))
+        entries = []
+        
+        with open(os.path.join(self.archive_dir, archive), 'ab') as f:
+            for name in names:
+                with open(os.path.join(day_dir, name), 'rb') as receipt:
+                    compressor = zlib.compressobj(9, zdict=ARCHIVE_ZDICT)
+                    data = compressor.compress(receipt.read()) + compressor.flush()
+                
+                offset = f.tell()
+                f.write(data)
+                entries.append((name[len("receipt_"):-len(".txt")], archive, offset, len(data)))
+            
+            f.flush()
+            os.fsync(f.fileno())
+        
+        # The archive is durable before the index points at it, and the
+        # index is committed before the original files go away
+        conn.executemany('''
+            INSERT OR REPLACE INTO archived_receipts (sale_number, archive, offset, length)
+            VALUES (?, ?, ?, ?)
+        ''', entries)
+        conn.commit()
+        
+        for name in names:
+            os.remove(os.path.join(day_dir, name))
+        self._remove_empty_dirs(day_dir)
+        return len(entries)
+    
+    def _day_shards(self):
+        """List (year, month, day, path) for every day shard directory"""
+        shards = []
+        for year in sorted(os.listdir(self.root)):
+            year_dir = os.path.join(self.root, year)
+            if not (year.isdigit() and os.path.isdir(year_dir)):
+                continue
+            for month in sorted(os.listdir(year_dir)):
+                month_dir = os.path.join(year_dir, month)
+                for day in sorted(os.listdir(month_dir)):
+                    shards.append((year, month, day, os.path.join(month_dir, day)))
+        return shards
+    
+    def _remove_empty_dirs(self, day_dir):
+        """Remove a day shard and its month and year directories once empty"""
+        path = day_dir
+        while os.path.abspath(path) != os.path.abspath(self.root):
+            if os.listdir(path):
+                break
+            os.rmdir(path)
+            path = os.path.dirname(path)
+    
+    def _index_connection(self):
+        """Open the archive index, creating it if needed"""
+        conn = sqlite3.connect(self.index_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archived_receipts (
+                sale_number TEXT PRIMARY KEY,
+                archive TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        return conn
+    
+    @staticmethod
+    def _shard_date(sale_number, date=None):
+        """Get the (year, month, day) shard of a receipt, from its sale number when possible"""
+        match = SALE_DATE_PATTERN.match(sale_number)
+        if match:
+            return match.groups()
+        date = date or datetime.now()
+        return date.strftime('%Y'), date.strftime('%m'), date.strftime('%d')
@@ -0,0 +1,124 @@
+import io
+import os
+import queue
+import threading
+from collections import namedtuple
+from datetime import datetime
+from .receipt_store import ReceiptStore
+
+# Immutable snapshot of a completed sale, safe to hand to another thread
+ReceiptLine = namedtuple("ReceiptLine", ["name", "unit_price", "quantity", "total"])
+ReceiptRecord = namedtuple("ReceiptRecord", [
+    "sale_number", "created_at", "cashier_name", "payment_method", "total_amount", "lines", "customer_name"
+], defaults=[None])
+
+# Receipt template, split once into header, per-item line and footer format strings
+ReceiptTemplate = namedtuple("ReceiptTemplate", ["header", "line", "footer"])
+
+DEFAULT_TEMPLATE = ReceiptTemplate(
+    header="""
+STORE POS SYSTEM
+================
+
+Sale Number: {sale_number}
+Date: {created_at}
+Cashier: {cashier_name}
+
+Items:
+------
+""",
+    line="{name}\n  ${unit_price:.2f} x {quantity} = ${total:.2f}\n",
+    footer="""
+------
+Total: ${total_amount:.2f}
+Payment: {payment_method}
+
+Thank you for your business!
+"""
+)
+
+def snapshot_sale(sale_number, cashier_name, payment_method, total_amount, cart_items, created_at=None):
+    """Copy a sale and its cart into an immutable receipt record"""
+    return ReceiptRecord(
+        sale_number=sale_number,
+        created_at=created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        cashier_name=cashier_name,
+        payment_method=payment_method,
+        total_amount=total_amount,
+        lines=tuple(
+            ReceiptLine(item['name'], item['unit_price'], item['quantity'], item['total'])
+            for item in cart_items
+        )
+    )
+
+def receipt_fields(record):
+    """Get the sale-level fields available to receipt templates"""
+    fields = record._asdict()
+    fields['payment_method'] = record.payment_method.upper()
+    fields['customer_name'] = record.customer_name or "Walk-in"
+    return fields
+
+def render_receipt(record, template=DEFAULT_TEMPLATE):
+    """Render a receipt record as text"""
+    fields = receipt_fields(record)
+    out = io.StringIO()
+    out.write(template.header.format(**fields))
+    out.write("".join(template.line.format(**line._asdict()) for line in record.lines))
+    out.write(template.footer.format(**fields))
+    return out.getvalue()
+
+class ReceiptWriter:
+    """Background writer that renders and saves receipts off the checkout path
+    
+    Receipts are formatted by renderer (a ReceiptRenderer, which applies the
+    store's template file) when one is given, else with the default template.
+    """
+    
+    def __init__(self, receipts_dir=os.path.join("assets", "receipts"), renderer=None):
+        self.store = ReceiptStore(receipts_dir)
+        self.renderer = renderer
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="receipt-writer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, record):
+        """Queue a receipt record to be rendered and saved"""
+        self._queue.put(record)
+    
+    def schedule_compaction(self, older_than_days=30):
+        """Queue compaction of old receipts into archives, behind pending receipts"""
+        self._queue.put(lambda: self.store.compact(older_than_days))
+    
+    def wait_until_written(self):
+        """Block until every queued receipt has been saved"""
+        self._queue.join()
+    
+    def stop(self, timeout=None):
+        """Save the queued receipts and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+    
+    def receipt_path(self, sale_number):
+        """Get the file path of a sale's receipt"""
+        return self.store.receipt_path(sale_number)
+    
+    def write_receipt(self, record):
+        """Render a receipt record and save it to the receipt store"""
+        text = self.renderer.render_text(record) if self.renderer else render_receipt(record)
+        self.store.write(record.sale_number, text)
+    
+    def _run(self):
+        """Writer thread: save receipts and run maintenance in the order queued"""
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                if callable(task):
+                    task()
+                else:
+                    self.write_receipt(task)
+            except Exception as e:
+                print(f"Error generating receipt: {e}")
+            finally:
+                self._queue.task_done()
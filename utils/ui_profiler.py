@@ -0,0 +1,161 @@
+import functools
+import inspect
+import json
+import time
+from collections import deque
+from datetime import datetime
+from database.query_stats import LatencyHistogram
+
+class UIProfiler:
+    """Time screen event handlers and Kivy frames to find what freezes the UI
+    
+    Screen classes passed to instrument() have their methods timed; a
+    per-frame Clock callback measures frame times and counts dropped
+    frames. A long frame is attributed to the handlers that ran during it.
+    Slow handlers and long frames are appended to log_path as JSON lines,
+    and an overlay (toggled with F12) shows the current numbers on screen.
+    """
+    
+    # Kivy draws at most 60 frames per second by default
+    frame_budget_ms = 1000 / 60
+    # F12 shows and hides the overlay
+    overlay_key = 293
+    
+    def __init__(self, log_path=None, slow_handler_ms=50, long_frame_ms=100, log_size=200):
+        self.log_path = log_path
+        self.slow_handler_ms = slow_handler_ms
+        self.long_frame_ms = long_frame_ms
+        self.handlers = {}
+        self.frames = LatencyHistogram()
+        self.dropped_frames = 0
+        self.events = deque(maxlen=log_size)
+        self.overlay = None
+        self._instrumented = set()
+        self._depth = 0
+        self._frame_handlers = []
+        self._started = False
+    
+    def instrument(self, screen_class):
+        """Time the methods a screen class defines itself; call before building the screen"""
+        if screen_class in self._instrumented:
+            return screen_class
+        self._instrumented.add(screen_class)
+        
+        for name, function in list(vars(screen_class).items()):
+            if name.startswith("_") or not inspect.isfunction(function):
+                continue
+            setattr(screen_class, name, self._timed(f"{screen_class.__name__}.{name}", function))
+        return screen_class
+    
+    def _timed(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self._depth += 1
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._depth -= 1
+                self.record_handler(name, (time.perf_counter() - started) * 1000, self._depth == 0)
+        return wrapper
+    
+    def record_handler(self, name, duration_ms, outermost=True):
+        """Record a handler call; handlers called from other handlers only count in their histogram"""
+        self.handlers.setdefault(name, LatencyHistogram()).add(duration_ms)
+        if not outermost:
+            return
+        
+        self._frame_handlers.append((name, duration_ms))
+        if duration_ms >= self.slow_handler_ms:
+            self._log({"type": "slow_handler", "handler": name, "duration_ms": round(duration_ms, 1)})
+    
+    def on_frame(self, dt):
+        """Clock callback run once per frame with the time since the previous frame"""
+        frame_ms = dt * 1000
+        self.frames.add(frame_ms)
+        
+        dropped = int(frame_ms / self.frame_budget_ms + 0.5) - 1
+        if dropped > 0:
+            self.dropped_frames += dropped
+        
+        if frame_ms >= self.long_frame_ms:
+            slowest = sorted(self._frame_handlers, key=lambda handler: -handler[1])[:3]
+            self._log({
+                "type": "long_frame",
+                "frame_ms": round(frame_ms, 1),
+                "dropped": max(dropped, 0),
+                "handlers": [[name, round(duration_ms, 1)] for name, duration_ms in slowest]
+            })
+        self._frame_handlers = []
+    
+    def _log(self, event):
+        """Keep an event and append it to the log file"""
+        event = dict(event, at=datetime.now().isoformat(timespec="milliseconds"))
+        self.events.append(event)
+        
+        if self.log_path:
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(event) + "\n")
+            except OSError as e:
+                print(f"Error writing UI profile log: {e}")
+    
+    def slowest_handlers(self, limit=5):
+        """Handlers by 95th percentile duration, slowest first, as (name, histogram)"""
+        ranked = sorted(self.handlers.items(), key=lambda item: (-item[1].percentile(0.95), -item[1].max_ms))
+        return ranked[:limit]
+    
+    def summary(self):
+        """All recorded numbers as a dict"""
+        return {
+            "frames": self.frames.as_dict(),
+            "dropped_frames": self.dropped_frames,
+            "handlers": {name: histogram.as_dict() for name, histogram in self.slowest_handlers(len(self.handlers))},
+            "events": list(self.events)
+        }
+    
+    def dump(self, path):
+        """Write the summary to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+    
+    def overlay_text(self):
+        """Text shown in the debug overlay"""
+        frames = self.frames
+        fps = 1000 / (frames.total_ms / frames.count) if frames.count and frames.total_ms else 0
+        lines = [f"{fps:.0f} fps  frame p95 {frames.percentile(0.95):.0f} ms  dropped {self.dropped_frames}"]
+        for name, histogram in self.slowest_handlers(3):
+            lines.append(f"{name}  p95 {histogram.percentile(0.95):.0f} ms  max {histogram.max_ms:.0f} ms")
+        return "\n".join(lines)
+    
+    def start(self):
+        """Start measuring frames and add the overlay to the window"""
+        if self._started:
+            return
+        self._started = True
+        
+        from kivy.clock import Clock
+        from kivy.core.window import Window
+        from kivy.uix.label import Label
+        
+        Clock.schedule_interval(self.on_frame, 0)
+        
+        self.overlay = Label(
+            text="", font_size="12sp", halign="left", valign="top", color=(1, 0.2, 0.2, 1),
+            size_hint=(None, None), size=(Window.width, 90), pos=(8, Window.height - 98)
+        )
+        self.overlay.bind(size=self.overlay.setter("text_size"))
+        Window.add_widget(self.overlay)
+        Window.bind(on_keyboard=self._on_keyboard)
+        Window.bind(size=lambda window, size: setattr(self.overlay, "pos", (8, size[1] - 98)))
+        Clock.schedule_interval(self._refresh_overlay, 0.5)
+    
+    def _refresh_overlay(self, dt):
+        if self.overlay.opacity:
+            self.overlay.text = self.overlay_text()
+    
+    def _on_keyboard(self, window, key, *args):
+        if key == self.overlay_key:
+            self.overlay.opacity = 0 if self.overlay.opacity else 1
+            return True
+        return False